@@ -0,0 +1,376 @@
+"""
+ann_backend.py — Búsqueda aproximada (ANN) sobre el índice de embeddings
+
+Backends (config.ANN_BACKEND):
+  exacto : producto matricial contra toda la matriz (NumPy). Siempre disponible
+           y usado como respaldo cuando el backend ANN no está listo.
+  ivf    : índice invertido en NumPy — centroides k-means + lista por cluster.
+           Solo se comparan los temas de los config.ANN_IVF_NPROBE clusters más
+           cercanos. Los archivos .npy se abren con mmap al arrancar.
+  hnsw   : grafo HNSW con hnswlib (opcional: pip install hnswlib). hnswlib
+           carga el archivo completo en memoria (no admite mmap).
+  auto   : hnsw si hnswlib está instalado, si no ivf; pero solo desde
+           config.ANN_AUTO_MIN_TEMAS temas y solo para los tamaños de lote en
+           que el ANN midió ser más rápido que el exacto (calibrar(): con pocos
+           temas, o con lotes grandes, una multiplicación de matrices gana).
+
+Los índices se guardan en config.ANN_DIR junto con un meta.json (backend,
+cantidad de temas y hash de los slugs). Si no coincide con lo cargado de la
+DB, se reconstruyen. registrar_tema los actualiza de forma incremental; el
+IVF reentrena sus centroides cuando el índice crece config.ANN_IVF_REENTRENAR
+veces respecto a los temas con que se entrenó.
+
+Evaluación: `python run.py --eval-ann` compara recall@k contra la búsqueda exacta.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_slugs(slugs: list[str]) -> str:
+    return hashlib.sha1("\n".join(slugs).encode("utf-8")).hexdigest()
+
+
+def top_k_exacto(matriz: np.ndarray, vecs: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k exacto por producto punto. Retorna (posiciones, similitudes) ordenadas desc."""
+    sims = vecs @ matriz.T
+    k = min(k, sims.shape[1])
+    part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    part_sims = np.take_along_axis(sims, part, axis=1)
+    orden = np.argsort(-part_sims, axis=1)
+    return np.take_along_axis(part, orden, axis=1), np.take_along_axis(part_sims, orden, axis=1)
+
+
+class BackendANN:
+    """Interfaz común. `index` es el EmbeddingIndex dueño de la matriz."""
+
+    nombre = "exacto"
+
+    def __init__(self, directorio: Path):
+        self.directorio = directorio
+        self.listo = False
+        self.auto = False          # elegido por config.ANN_BACKEND=auto: se usa solo donde rinde
+        self.lote_max = 0          # consultas por lote hasta las que el ANN ganó al exacto (calibrar)
+        self._n_calibrado = 0
+
+    # Ciclo de vida
+    def abrir(self, index) -> None: ...
+    def agregar(self, index, pos: int) -> None: ...
+
+    def buscar(self, index, vecs: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        return top_k_exacto(index.matriz, vecs, k)
+
+    def usar_para(self, m: int) -> bool:
+        """True si un lote de `m` consultas debe ir por el ANN y no por la búsqueda exacta."""
+        return self.listo and (not self.auto or m <= self.lote_max)
+
+    def calibrar(self, index, lotes: tuple[int, ...] = (1, 8, 32)):
+        """
+        Con auto, mide contra la búsqueda exacta (matriz × vectores + argmax,
+        lo que hace EmbeddingIndex sin ANN) para cada tamaño de lote y deja en
+        lote_max el mayor en que el ANN fue más rápido (0 = nunca). Se repite
+        cada vez que el índice duplica los temas de la última medición.
+        """
+        self._n_calibrado = index.n
+        if not self.auto or not self.listo:
+            return
+        if index.n < config.ANN_AUTO_MIN_TEMAS:
+            self.lote_max = 0
+            return
+        rng = np.random.default_rng(0)
+        consultas = index.matriz[rng.choice(index.n, size=max(lotes), replace=False)]
+        consultas = consultas + 0.05 * rng.standard_normal(consultas.shape).astype(np.float32)
+        consultas /= np.linalg.norm(consultas, axis=1, keepdims=True)
+        self.lote_max = 0
+        for m in lotes:
+            q = consultas[:m]
+            inicio = time.perf_counter()
+            np.argmax(q @ index.matriz.T, axis=1)
+            exacto = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            self.buscar(index, q, config.ANN_K)
+            if time.perf_counter() - inicio < exacto:
+                self.lote_max = m
+        logger.info(f"ANN {self.nombre} calibrado con {index.n} temas: se usa en lotes de hasta {self.lote_max} consultas")
+
+    def _recalibrar_si_crecio(self, index):
+        if self.auto and index.n >= 2 * max(self._n_calibrado, 1):
+            self.calibrar(index)
+
+    # Metadatos para detectar índices desactualizados
+    def _meta_path(self) -> Path:
+        return self.directorio / f"{self.nombre}_meta.json"
+
+    def _leer_meta(self) -> dict:
+        try:
+            return json.loads(self._meta_path().read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _meta_valida(self, index) -> bool:
+        meta = self._leer_meta()
+        return meta.get("n") == index.n and meta.get("slugs") == _hash_slugs(index.slugs)
+
+    def _guardar_meta(self, index, **extra):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._meta_path().write_text(
+            json.dumps({"backend": self.nombre, "n": index.n, "slugs": _hash_slugs(index.slugs), **extra}),
+            encoding="utf-8",
+        )
+
+
+# ---------------------------------------------------------------------------
+# IVF en NumPy
+# ---------------------------------------------------------------------------
+
+class BackendIVF(BackendANN):
+
+    nombre = "ivf"
+
+    def __init__(self, directorio: Path, nlist: int | None = None, nprobe: int | None = None):
+        super().__init__(directorio)
+        self.nlist = nlist or config.ANN_IVF_NLIST
+        self.nprobe = nprobe or config.ANN_IVF_NPROBE
+        self.centroides: np.ndarray | None = None
+        self.asignacion = np.zeros(0, dtype=np.int32)
+        self._listas: list[np.ndarray] = []   # posiciones por cluster
+        self.n_entrenado = 0                  # temas con que se calcularon los centroides
+
+    def _rutas(self) -> tuple[Path, Path]:
+        return self.directorio / "ivf_centroides.npy", self.directorio / "ivf_asignacion.npy"
+
+    def abrir(self, index):
+        ruta_c, ruta_a = self._rutas()
+        entrenado = self._leer_meta().get("entrenado", 0)
+        if (ruta_c.exists() and ruta_a.exists() and self._meta_valida(index)
+                and not self._desactualizado(index.n, entrenado)):
+            self.centroides = np.load(ruta_c, mmap_mode="r")
+            self.asignacion = np.array(np.load(ruta_a, mmap_mode="r"))
+            self.n_entrenado = entrenado
+            self._armar_listas()
+            self.listo = True
+            logger.info(f"Índice IVF abierto (mmap): {len(self.centroides)} clusters, {index.n} temas")
+            self.calibrar(index)
+            return
+        self.construir(index)
+
+    @staticmethod
+    def _desactualizado(n: int, entrenado: int) -> bool:
+        """True si el índice creció lo bastante desde el entrenamiento para recalcular los centroides."""
+        return n >= config.ANN_IVF_REENTRENAR * max(entrenado, 1)
+
+    def construir(self, index):
+        n = index.n
+        minimo = max(self.nlist * 8, config.ANN_AUTO_MIN_TEMAS if self.auto else 0)
+        if n < minimo:
+            logger.debug(f"IVF: {n} temas son pocos (mínimo {minimo}); se usa búsqueda exacta")
+            self.listo = False
+            return
+        inicio = time.monotonic()
+        self.centroides = self._kmeans(index.matriz)
+        self.asignacion = np.argmax(index.matriz @ self.centroides.T, axis=1).astype(np.int32)
+        self.n_entrenado = n
+        self._armar_listas()
+        self._guardar(index)
+        self.listo = True
+        logger.info(f"Índice IVF construido: {self.nlist} clusters, {n} temas en {time.monotonic() - inicio:.1f}s")
+        self.calibrar(index)
+
+    def _kmeans(self, matriz: np.ndarray, iteraciones: int = 12) -> np.ndarray:
+        """k-means esférico sobre una muestra (vectores ya normalizados)."""
+        rng = np.random.default_rng(0)
+        muestra = matriz[rng.choice(len(matriz), size=min(len(matriz), self.nlist * 64), replace=False)]
+        centroides = muestra[rng.choice(len(muestra), size=self.nlist, replace=False)].copy()
+        for _ in range(iteraciones):
+            asign = np.argmax(muestra @ centroides.T, axis=1)
+            for c in range(self.nlist):
+                miembros = muestra[asign == c]
+                if len(miembros):
+                    centroides[c] = miembros.mean(axis=0)
+            centroides /= np.maximum(np.linalg.norm(centroides, axis=1, keepdims=True), 1e-12)
+        return centroides.astype(np.float32)
+
+    def _armar_listas(self):
+        orden = np.argsort(self.asignacion, kind="stable")
+        cortes = np.searchsorted(self.asignacion[orden], np.arange(len(self.centroides) + 1))
+        self._listas = [orden[cortes[c]:cortes[c + 1]].astype(np.int64) for c in range(len(self.centroides))]
+
+    def _guardar(self, index, centroides: bool = True):
+        """
+        Escritura atómica (archivo nuevo + rename): otro proceso que tenga los
+        centroides mapeados con mmap sigue viendo su versión. Los centroides
+        solo se escriben al construir.
+        """
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta_c, ruta_a = self._rutas()
+        archivos = [(ruta_a, self.asignacion)]
+        if centroides:
+            archivos.append((ruta_c, np.asarray(self.centroides)))
+        for ruta, arr in archivos:
+            tmp = ruta.with_suffix(".tmp.npy")
+            np.save(tmp, arr)
+            tmp.replace(ruta)
+        self._guardar_meta(index, entrenado=self.n_entrenado)
+
+    def agregar(self, index, pos: int):
+        if not self.listo or self._desactualizado(index.n, self.n_entrenado):
+            self.construir(index)  # puede que ya alcance para entrenar, o que toque reentrenar
+            return
+        c = int(np.argmax(np.asarray(self.centroides) @ index.matriz[pos]))
+        if pos < len(self.asignacion):
+            viejo = int(self.asignacion[pos])
+            if viejo != c:
+                self._listas[viejo] = self._listas[viejo][self._listas[viejo] != pos]
+                self._listas[c] = np.append(self._listas[c], pos)
+            self.asignacion[pos] = c
+        else:
+            self.asignacion = np.append(self.asignacion, np.int32(c))
+            self._listas[c] = np.append(self._listas[c], pos)
+        self._guardar(index, centroides=False)
+        self._recalibrar_si_crecio(index)
+
+    def buscar(self, index, vecs: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        m = len(vecs)
+        cercanos = np.argsort(-(vecs @ np.asarray(self.centroides).T), axis=1)[:, :self.nprobe]
+        posiciones = np.full((m, k), -1, dtype=np.int64)
+        sims = np.full((m, k), -np.inf, dtype=np.float32)
+        for i in range(m):
+            candidatos = np.concatenate([self._listas[c] for c in cercanos[i]])
+            if not len(candidatos):
+                continue
+            s = index.matriz[candidatos] @ vecs[i]
+            kk = min(k, len(candidatos))
+            top = np.argpartition(-s, kk - 1)[:kk]
+            top = top[np.argsort(-s[top])]
+            posiciones[i, :kk] = candidatos[top]
+            sims[i, :kk] = s[top]
+        return posiciones, sims
+
+
+# ---------------------------------------------------------------------------
+# HNSW (hnswlib, opcional)
+# ---------------------------------------------------------------------------
+
+class BackendHNSW(BackendANN):
+
+    nombre = "hnsw"
+
+    def __init__(self, directorio: Path):
+        super().__init__(directorio)
+        import hnswlib  # noqa: F401 — falla temprano si no está instalado
+        self._hnsw = None
+
+    def _ruta(self) -> Path:
+        return self.directorio / "hnsw.bin"
+
+    def abrir(self, index):
+        import hnswlib
+        self._hnsw = hnswlib.Index(space="ip", dim=index.dimension)
+        if self._ruta().exists() and self._meta_valida(index):
+            self._hnsw.load_index(str(self._ruta()), max_elements=max(index.n * 2, 1024))
+            self._hnsw.set_ef(config.ANN_HNSW_EF)
+            self.listo = True
+            logger.info(f"Índice HNSW cargado: {index.n} temas")
+            self.calibrar(index)
+            return
+        self.construir(index)
+
+    def construir(self, index):
+        import hnswlib
+        inicio = time.monotonic()
+        self._hnsw = hnswlib.Index(space="ip", dim=index.dimension)
+        self._hnsw.init_index(max_elements=max(index.n * 2, 1024), M=config.ANN_HNSW_M,
+                              ef_construction=config.ANN_HNSW_EF_CONSTRUCCION)
+        if index.n:
+            self._hnsw.add_items(index.matriz, np.arange(index.n))
+        self._hnsw.set_ef(config.ANN_HNSW_EF)
+        self._guardar(index)
+        self.listo = True
+        logger.info(f"Índice HNSW construido: {index.n} temas en {time.monotonic() - inicio:.1f}s")
+        self.calibrar(index)
+
+    def _guardar(self, index):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._hnsw.save_index(str(self._ruta()))
+        self._guardar_meta(index)
+
+    def agregar(self, index, pos: int):
+        if self._hnsw.get_current_count() + 1 > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(self._hnsw.get_max_elements() * 2)
+        self._hnsw.add_items(index.matriz[pos:pos + 1], np.array([pos]))  # mismo label = reemplazo
+        self._guardar(index)
+        self._recalibrar_si_crecio(index)
+
+    def buscar(self, index, vecs: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, index.n)
+        labels, distancias = self._hnsw.knn_query(vecs, k=k)
+        return labels.astype(np.int64), (1.0 - distancias).astype(np.float32)  # "ip": d = 1 - <a,b>
+
+
+# ---------------------------------------------------------------------------
+# Selección y evaluación
+# ---------------------------------------------------------------------------
+
+def crear_backend(nombre: str | None = None) -> BackendANN:
+    nombre = (nombre or config.ANN_BACKEND).lower()
+    auto = nombre == "auto"
+    directorio = Path(config.ANN_DIR)
+    backend: BackendANN | None = None
+    if nombre in ("hnsw", "auto"):
+        try:
+            backend = BackendHNSW(directorio)
+        except ImportError:
+            if nombre == "hnsw":
+                logger.warning("hnswlib no instalado; se usa IVF en NumPy")
+            nombre = "ivf"
+    if backend is None:
+        backend = BackendIVF(directorio) if nombre == "ivf" else BackendANN(directorio)
+    backend.auto = auto
+    return backend
+
+
+def evaluar_recall(index, consultas: int = 200, k: int = 10, ruido: float = 0.05) -> dict:
+    """
+    Recall@k del backend ANN del índice contra la búsqueda exacta. Las consultas
+    son temas del índice con algo de ruido (títulos parecidos a uno publicado).
+    """
+    if index.n == 0:
+        return {"backend": index.backend.nombre, "temas": 0}
+    rng = np.random.default_rng(0)
+    base = index.matriz[rng.choice(index.n, size=min(consultas, index.n), replace=False)]
+    vecs = base + ruido * rng.standard_normal(base.shape).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    inicio = time.perf_counter()
+    exactos, _ = top_k_exacto(index.matriz, vecs, k)
+    ms_exacto = 1000 * (time.perf_counter() - inicio) / len(vecs)
+
+    resultado = {"backend": index.backend.nombre, "temas": index.n, "consultas": len(vecs), "k": k,
+                 "ms_exacto_por_consulta": round(ms_exacto, 3)}
+    if index.backend.auto:
+        resultado["auto_lote_max"] = index.backend.lote_max
+    if not index.backend.listo:
+        resultado["nota"] = "backend ANN no listo (pocos temas o sin índice); se usa búsqueda exacta"
+        return resultado
+
+    inicio = time.perf_counter()
+    aprox, _ = index.backend.buscar(index, vecs, k)
+    ms_ann = 1000 * (time.perf_counter() - inicio) / len(vecs)
+
+    aciertos = sum(len(set(a[a >= 0]) & set(e)) for a, e in zip(aprox, exactos))
+    top1 = float(np.mean(aprox[:, 0] == exactos[:, 0]))
+    resultado.update({
+        f"recall@{k}": round(aciertos / (len(vecs) * exactos.shape[1]), 4),
+        "recall@1": round(top1, 4),
+        "ms_ann_por_consulta": round(ms_ann, 3),
+    })
+    return resultado
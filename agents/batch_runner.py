@@ -0,0 +1,330 @@
+"""
+batch_runner.py — Modo batch del run diario (python run.py --batch)
+
+En vez de llamar a Claude en tiempo real, envía todas las peticiones de
+escritura como un único Message Batch, espera a que termine, mapea los
+resultados a sus temas y repite lo mismo con la verificación. La Batches API
+cobra la mitad por token y no compite por rate limit con el uso interactivo
+de la API de revisión.
+
+Fases (cada una se persiste en agents/batches/<run_id>.json):
+  1. temas       → ingesta + SEO (igual que el modo normal, guardados en run_state)
+  2. escritura   → batch de writers; resultados guardados uno a uno
+  3. verificacion→ batch de verificación de los artículos escritos
+  4. guardado    → inserción en la cola por lotes
+
+Si el proceso muere, `run.py --resume <run_id>` retoma desde la última fase
+completada: no regenera temas ni reenvía un batch que ya fue aceptado por la
+API. Las peticiones que el batch devolvió con error o expiradas se reenvían
+en un batch nuevo al reanudar (los temas quedan en 'failed' mientras tanto).
+El estado de cada tema se marca también en run_state.py.
+
+Para probar sin gastar tokens: levantar batch_stub_server.py y definir
+ANTHROPIC_BASE_URL=http://localhost:8002 en .env.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+import anthropic
+
+import config
+from llm_cache import clave_request, get_llm_cache
+
+logger = logging.getLogger(__name__)
+
+BATCHES_DIR = Path(__file__).parent / "batches"
+
+
+# ---------------------------------------------------------------------------
+# Estado persistido
+# ---------------------------------------------------------------------------
+
+class EstadoBatch:
+
+    def __init__(self, path: Path, data: dict | None = None):
+        self.path = path
+        self.data = data or {
+            "escritura":    {"requests": {}, "batch_id": None, "resultados": {}},
+            "articulos":    {},   # custom_id → artículo parseado
+            "verificacion": {"requests": {}, "batch_id": None, "resultados": {}},
+            "guardados":    {},   # custom_id → id en la cola
+        }
+
+    @classmethod
+    def cargar(cls, run_id: str) -> "EstadoBatch":
+        path = BATCHES_DIR / f"{run_id}.json"
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            logger.info(f"Retomando estado batch desde {path}")
+            return cls(path, data)
+        return cls(path)
+
+    def guardar(self):
+        """Escritura atómica: un crash a mitad no corrompe el estado anterior."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+class BatchRunner:
+
+    def __init__(self, orchestrator):
+        from llm_client import get_llm_client
+        self.orch = orchestrator
+        self.run_state = orchestrator.run_state
+        self.client = get_llm_client().client
+        self.estado = EstadoBatch.cargar(self.run_state.run_id)
+        self.temas: dict[str, dict] = {}   # custom_id (tema_id) → tema
+
+    # ------------------------------------------------------------------
+    # Batches API
+    # ------------------------------------------------------------------
+
+    async def _reintentando(self, llamada, *args):
+        """
+        Llamada a la Batches API con backoff ante errores transitorios (conexión,
+        429, 5xx): el cliente tiene max_retries=0 y un corte al consultar el
+        estado no debe abortar un run que puede llevar horas esperando.
+        """
+        for intento in range(config.LLM_MAX_REINTENTOS + 1):
+            try:
+                return await llamada(*args)
+            except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
+                status = getattr(e, "status_code", None)
+                if intento == config.LLM_MAX_REINTENTOS or (status is not None and status < 500 and status != 429):
+                    raise
+                espera = min(config.LLM_BACKOFF_MAX_SEG, config.LLM_BACKOFF_BASE_SEG * 2 ** intento)
+                logger.warning(f"Batches API: {e} — reintento {intento + 1} en {espera:.1f}s")
+                await asyncio.sleep(espera)
+
+    async def _esperar(self, fase: str, batch_id: str):
+        """Espera a que el batch termine y guarda sus resultados."""
+        while True:
+            batch = await self._reintentando(self.client.messages.batches.retrieve, batch_id)
+            c = batch.request_counts
+            logger.info(
+                f"Batch {fase} {batch.processing_status}: {c.processing} procesando, "
+                f"{c.succeeded} ok, {c.errored} error, {c.expired} expirados"
+            )
+            if batch.processing_status == "ended":
+                break
+            await asyncio.sleep(config.BATCH_POLL_SEG)
+        # Los ya guardados se saltan: si la lectura se corta, reintentarla no duplica nada
+        await self._reintentando(self._recoger, fase, batch_id)
+
+    async def _recoger(self, fase: str, batch_id: str):
+        datos = self.estado.data[fase]
+        cache = get_llm_cache()
+        async for r in await self.client.messages.batches.results(batch_id):
+            if r.custom_id in datos["resultados"] or r.custom_id not in datos["requests"]:
+                continue
+            if r.result.type == "succeeded":
+                msg = r.result.message
+                if cache:
+                    cache.put(clave_request(datos["requests"][r.custom_id]), msg.model_dump(mode="json"))
+                datos["resultados"][r.custom_id] = {
+                    "ok":            True,
+                    "texto":         msg.content[0].text,
+                    "input_tokens":  msg.usage.input_tokens,
+                    "output_tokens": msg.usage.output_tokens,
+                    "cache_write_tokens": msg.usage.cache_creation_input_tokens or 0,
+                    "cache_read_tokens":  msg.usage.cache_read_input_tokens or 0,
+                }
+            else:
+                logger.warning(f"Batch {fase}: {r.custom_id} terminó como {r.result.type}")
+                datos["resultados"][r.custom_id] = {"ok": False, "tipo": r.result.type}
+            self.estado.guardar()
+
+    async def _ejecutar_fase(self, fase: str):
+        """
+        Envía (si hace falta) el batch de la fase, espera y recoge resultados.
+        Al reanudar, primero se recogen los resultados del batch ya aceptado;
+        las peticiones con error o expiradas, y las que no iban en él, salen
+        en un batch nuevo.
+        """
+        datos = self.estado.data[fase]
+        if datos["batch_id"]:
+            logger.info(f"Batch de {fase} ya enviado: {datos['batch_id']}, esperando resultados")
+            await self._esperar(fase, datos["batch_id"])
+
+        fallidos = [cid for cid, r in datos["resultados"].items() if not r["ok"]]
+        for cid in fallidos:
+            del datos["resultados"][cid]
+        if fallidos:
+            logger.info(f"Batch de {fase}: {len(fallidos)} peticiones con error o expiradas se reintentan")
+        pendientes = {
+            cid: params for cid, params in datos["requests"].items()
+            if cid not in datos["resultados"]
+        }
+        # Peticiones ya respondidas en runs anteriores: se sirven desde la caché
+        cache = get_llm_cache()
+        if cache:
+            for cid in list(pendientes):
+                data = cache.get(clave_request(pendientes[cid]))
+                if data is not None:
+                    datos["resultados"][cid] = {
+                        "ok": True, "texto": data["content"][0]["text"],
+                        "input_tokens": 0, "output_tokens": 0,
+                    }
+                    del pendientes[cid]
+        self.estado.guardar()
+        if not pendientes:
+            return
+
+        # create no se reintenta: un corte tras aceptarlo enviaría el batch dos veces
+        batch = await self.client.messages.batches.create(requests=[
+            {"custom_id": cid, "params": params} for cid, params in pendientes.items()
+        ])
+        datos["batch_id"] = batch.id
+        self.estado.guardar()
+        logger.info(f"Batch de {fase} enviado: {batch.id} ({len(pendientes)} peticiones)")
+        await self._esperar(fase, batch.id)
+
+    # ------------------------------------------------------------------
+    # Fases
+    # ------------------------------------------------------------------
+
+    async def _fase_temas(self):
+        from writer_agents import get_writer
+
+        ingesta, items = await self.orch._preparar()
+        self.temas = {i["tema_id"]: i["tema"] for i in items}
+
+        # Al reanudar se agregan los temas sin petición y se rearman las de los fallidos
+        requests = self.estado.data["escritura"]["requests"]
+        writers = {}
+        for item in items:
+            if item["estado"] == "queued" or (item["tema_id"] in requests and item["estado"] != "failed"):
+                continue
+            cat = item["tema"].get("categoria", "noticias")
+            writer = writers.setdefault(cat, get_writer(cat))
+            requests[item["tema_id"]] = writer.build_request(item["tema"], ingesta)
+        self.estado.guardar()
+
+    async def _fase_escritura(self):
+        from writer_agents import get_writer
+
+        await self._ejecutar_fase("escritura")
+
+        for cid, res in self.estado.data["escritura"]["resultados"].items():
+            if cid in self.estado.data["articulos"]:
+                continue
+            if not res["ok"]:
+                self.run_state.marcar(cid, "failed", error=f"batch: {res.get('tipo')}")
+                continue
+            tema = self.temas[cid]
+            articulo = get_writer(tema.get("categoria", "noticias"))._parse_article(res["texto"], tema)
+            self.estado.data["articulos"][cid] = articulo
+            self.run_state.marcar(cid, "written", articulo=articulo)
+        self.estado.guardar()
+
+    async def _fase_verificacion(self):
+        from verificacion_agent import VerificacionAgent
+        verificador = VerificacionAgent()
+
+        requests = self.estado.data["verificacion"]["requests"]
+        resultados = self.estado.data["verificacion"]["resultados"]
+        # Artículos largos: un request por fragmento (<cid>-p1, <cid>-p2, ...). Al reanudar
+        # solo se agregan los artículos escritos después (p. ej. escrituras reintentadas)
+        for cid, articulo in self.estado.data["articulos"].items():
+            if cid in requests or f"{cid}-p1" in requests:
+                continue
+            pre, omitir = verificador.preverificar(articulo)
+            if omitir:
+                # Resultado local: se registra como ya respondido y no se envía
+                requests[cid] = {}
+                resultados[cid] = {"ok": True, "input_tokens": 0, "output_tokens": 0, "texto": json.dumps(
+                    verificador.resultado_preverificacion(pre, articulo), ensure_ascii=False)}
+                continue
+            fragmentos = verificador.build_requests(articulo, pre)
+            if len(fragmentos) == 1:
+                requests[cid] = fragmentos[0]
+            else:
+                for k, params in enumerate(fragmentos, 1):
+                    requests[f"{cid}-p{k}"] = params
+        self.estado.guardar()
+
+        await self._ejecutar_fase("verificacion")
+
+    def _verificacion_de(self, cid: str) -> dict:
+        from verificacion_agent import VerificacionAgent
+        datos = self.estado.data["verificacion"]
+        cids = [cid] if cid in datos["requests"] else sorted(
+            (c for c in datos["requests"] if c.startswith(f"{cid}-p")), key=lambda c: int(c.rsplit("-p", 1)[1])
+        )
+        resultados = [datos["resultados"].get(c) for c in cids]
+        if not resultados or not all(r and r["ok"] for r in resultados):
+            return {
+                "aprobado": True,
+                "nivel_riesgo": "medio",
+                "observaciones": ["Verificación batch no disponible para este artículo"],
+                "requiere_revision_urgente": False,
+                "sugerencias": ["Revisar manualmente"],
+            }
+        return VerificacionAgent()._resultado_desde_texto(
+            [r["texto"] for r in resultados], self.estado.data["articulos"][cid]
+        )
+
+    async def _fase_guardado(self):
+        guardados = self.estado.data["guardados"]
+        pendientes = []
+        for cid, art in self.estado.data["articulos"].items():
+            if guardados.get(cid) is not None:
+                continue
+            verificacion = self._verificacion_de(cid)
+            self.run_state.marcar(cid, "verified", verificacion=verificacion)
+            pendientes.append({"cid": cid, "tema": self.temas[cid], "articulo": art, "verificacion": verificacion})
+
+        for k in range(0, len(pendientes), config.PIPELINE_LOTE_DB):
+            lote = pendientes[k:k + config.PIPELINE_LOTE_DB]
+            ids = await asyncio.to_thread(self.orch._guardar_lote_en_db, lote)
+            for item in lote:
+                art_id = ids.get(item["articulo"].get("slug", ""))
+                if art_id is None:
+                    continue  # queda en "verified"; se reintenta al reanudar
+                guardados[item["cid"]] = art_id
+                self.run_state.marcar(item["cid"], "queued", articulo_id=art_id)
+            self.estado.guardar()
+
+    def _acumular_tokens(self):
+        """Los contadores batch se recalculan desde el estado (incluye intentos anteriores)."""
+        totales = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
+        for fase in ("escritura", "verificacion"):
+            for res in self.estado.data[fase]["resultados"].values():
+                if res["ok"]:
+                    totales["input"]       += res["input_tokens"]
+                    totales["output"]      += res["output_tokens"]
+                    totales["cache_write"] += res.get("cache_write_tokens", 0)
+                    totales["cache_read"]  += res.get("cache_read_tokens", 0)
+        for campo, valor in totales.items():
+            setattr(self.orch, f"tokens_{campo}_batch", valor)
+        self.orch._checkpoint_tokens()
+
+    # ------------------------------------------------------------------
+    # run()
+    # ------------------------------------------------------------------
+
+    async def run(self):
+        """Los resultados quedan en el run_state del orquestador (temas en 'queued')."""
+        if not config.ANTHROPIC_API_KEY:
+            # Sin API key no se envía nada: los temas serían los de demo
+            await self.orch._preparar()
+            logger.info("[SIN API KEY] No se envían batches")
+            return
+
+        await self._fase_temas()
+        await self._fase_escritura()
+        await self._fase_verificacion()
+        await self._fase_guardado()
+        self._acumular_tokens()
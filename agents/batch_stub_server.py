@@ -0,0 +1,161 @@
+"""
+batch_stub_server.py — Servidor local que imita la Message Batches API
+
+Permite probar `run.py --batch` de punta a punta sin gastar tokens.
+Implementa solo lo que usa batch_runner.py:
+
+  POST /v1/messages/batches              → crear batch
+  GET  /v1/messages/batches/{id}         → estado (termina tras STUB_BATCH_DEMORA_SEG)
+  GET  /v1/messages/batches/{id}/results → resultados .jsonl
+
+Las respuestas son artículos y verificaciones de relleno con el formato que
+esperan los writers y VerificacionAgent. Un 10% de las peticiones puede
+marcarse como errored con STUB_BATCH_ERRORES=1 para probar fallos parciales.
+
+Uso:
+  python batch_stub_server.py                      # puerto 8002
+  # en .env:
+  ANTHROPIC_BASE_URL=http://localhost:8002
+  ANTHROPIC_API_KEY=sk-ant-REDACTED
+  BATCH_POLL_SEG=2
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+DEMORA_SEG = float(os.getenv("STUB_BATCH_DEMORA_SEG", "5"))
+CON_ERRORES = os.getenv("STUB_BATCH_ERRORES", "0") == "1"
+
+app = FastAPI(title="Stub Message Batches API")
+
+_batches: dict[str, dict] = {}
+
+
+# ---------------------------------------------------------------------------
+# Respuestas de relleno
+# ---------------------------------------------------------------------------
+
+def _texto_respuesta(params: dict) -> str:
+    system = params.get("system", "")
+    if not isinstance(system, str):
+        system = " ".join(b.get("text", "") for b in system)
+    contenido = params["messages"][-1]["content"]
+    if not isinstance(contenido, str):
+        contenido = " ".join(b.get("text", "") for b in contenido)
+
+    if "verificación de hechos" in system:
+        return json.dumps({
+            "aprobado": True,
+            "nivel_riesgo": "bajo",
+            "observaciones": [],
+            "requiere_revision_urgente": False,
+            "sugerencias": [],
+        })
+
+    m = re.search(r"^Título\s*:\s*(.+)$", contenido, re.MULTILINE)
+    titulo = m.group(1).strip() if m else "Artículo de prueba"
+    return (
+        f"---\ntitle: \"{titulo}\"\nexcerpt: \"Artículo generado por el stub de batches.\"\n---\n\n"
+        f"## Contexto\n\nTexto de relleno para {titulo}.\n"
+    )
+
+
+def _mensaje(params: dict) -> dict:
+    texto = _texto_respuesta(params)
+    return {
+        "id": f"msg_stub_{uuid.uuid4().hex[:12]}",
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "stub"),
+        "content": [{"type": "text", "text": texto}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": len(json.dumps(params, ensure_ascii=False)) // 4,
+            "output_tokens": len(texto) // 4,
+        },
+    }
+
+
+def _batch_json(batch: dict, request: Request) -> dict:
+    terminado = time.time() - batch["creado"] >= DEMORA_SEG
+    n = len(batch["requests"])
+    errores = sum(1 for r in batch["requests"] if r["errored"]) if terminado else 0
+    creado = datetime.fromtimestamp(batch["creado"], tz=timezone.utc)
+    return {
+        "id": batch["id"],
+        "type": "message_batch",
+        "processing_status": "ended" if terminado else "in_progress",
+        "request_counts": {
+            "processing": 0 if terminado else n,
+            "succeeded": n - errores if terminado else 0,
+            "errored": errores,
+            "canceled": 0,
+            "expired": 0,
+        },
+        "created_at": creado.isoformat(),
+        "expires_at": (creado + timedelta(days=1)).isoformat(),
+        "ended_at": (creado + timedelta(seconds=DEMORA_SEG)).isoformat() if terminado else None,
+        "archived_at": None,
+        "cancel_initiated_at": None,
+        "results_url": (
+            f"{str(request.base_url).rstrip('/')}/v1/messages/batches/{batch['id']}/results"
+            if terminado else None
+        ),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@app.post("/v1/messages/batches")
+async def crear_batch(request: Request):
+    body = await request.json()
+    batch_id = f"msgbatch_stub_{uuid.uuid4().hex[:16]}"
+    _batches[batch_id] = {
+        "id": batch_id,
+        "creado": time.time(),
+        "requests": [
+            {**r, "errored": CON_ERRORES and i % 10 == 9}
+            for i, r in enumerate(body.get("requests", []))
+        ],
+    }
+    return _batch_json(_batches[batch_id], request)
+
+
+@app.get("/v1/messages/batches/{batch_id}")
+def estado_batch(batch_id: str, request: Request):
+    batch = _batches.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="batch no encontrado")
+    return _batch_json(batch, request)
+
+
+@app.get("/v1/messages/batches/{batch_id}/results")
+def resultados_batch(batch_id: str):
+    batch = _batches.get(batch_id)
+    if not batch or time.time() - batch["creado"] < DEMORA_SEG:
+        raise HTTPException(status_code=404, detail="resultados no disponibles")
+    lineas = []
+    for r in batch["requests"]:
+        if r["errored"]:
+            result = {"type": "errored", "error": {
+                "type": "error", "error": {"type": "api_error", "message": "stub"}}}
+        else:
+            result = {"type": "succeeded", "message": _mensaje(r["params"])}
+        lineas.append(json.dumps({"custom_id": r["custom_id"], "result": result}, ensure_ascii=False))
+    return PlainTextResponse("\n".join(lineas) + "\n", media_type="application/x-jsonl")
+
+
+if __name__ == "__main__":
+    import uvicorn
+    print("Stub de Message Batches API en http://localhost:8002")
+    uvicorn.run(app, host="127.0.0.1", port=8002)
@@ -2,6 +2,7 @@
 config.py — Carga de variables de entorno con python-dotenv
 """
 import os
+from datetime import date
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -33,6 +34,138 @@ CLAUDE_MODEL: str = "claude-sonnet-4-6"
 # Precios por token (USD) — claude-sonnet-4-6
 PRICE_INPUT_PER_TOKEN: float = 0.000003
 PRICE_OUTPUT_PER_TOKEN: float = 0.000015
+PRICE_CACHE_WRITE_PER_TOKEN: float = 0.00000375   # escritura de prompt cache (1.25× entrada)
+PRICE_CACHE_READ_PER_TOKEN: float = 0.0000003     # lectura de prompt cache (0.1× entrada)
+
+# Concurrencia de llamadas a Claude (llm_client.py)
+LLM_MAX_CONCURRENCIA: int = int(os.getenv("LLM_MAX_CONCURRENCIA", "16"))
+LLM_CONCURRENCIA_CATEGORIA: dict[str, int] = {
+    "seo":          2,
+    "dedup":        4,
+    "verificacion": 8,
+    "perfiles":     6,
+    "debates":      6,
+    "noticias":     6,
+    "analisis":     4,
+    "faq":          6,
+}
+
+# Límites de tasa de la API (rate_limiter.py) — ajustar al tier de la cuenta
+LLM_RPM: int = int(os.getenv("LLM_RPM", "50"))             # requests por minuto
+LLM_TPM: int = int(os.getenv("LLM_TPM", "400000"))         # tokens por minuto (entrada + salida)
+LLM_MAX_REINTENTOS: int = int(os.getenv("LLM_MAX_REINTENTOS", "5"))
+LLM_BACKOFF_BASE_SEG: float = 2.0
+LLM_BACKOFF_MAX_SEG: float = 60.0
+
+# Caché persistente de respuestas de Claude (llm_cache.py)
+LLM_CACHE_ACTIVO: bool = os.getenv("LLM_CACHE_ACTIVO", "1") == "1"   # run.py --no-cache lo desactiva
+LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", str(Path(__file__).parent / "llm_cache.db"))
+LLM_CACHE_TTL_HORAS: float = float(os.getenv("LLM_CACHE_TTL_HORAS", "72"))
+LLM_CACHE_MAX_MB: float = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+
+# Caché persistente de embeddings de títulos (embedding_cache.py)
+EMBEDDING_MODEL: str = "paraphrase-multilingual-MiniLM-L12-v2"
+# Los backends dan vectores distintos: la caché los separa (embedding_cache.id_modelo_embeddings), pero
+# los vectores de temas_publicados no guardan el backend — usar el mismo en todos los procesos que publican
+EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "torch")      # torch | int8 | onnx (embedding_model.py)
+EMBEDDING_ONNX_ARCHIVO: str = os.getenv("EMBEDDING_ONNX_ARCHIVO", "")  # p. ej. onnx/model_qint8_avx2.onnx
+EMBEDDING_HILOS: int = int(os.getenv("EMBEDDING_HILOS", str(os.cpu_count() or 1)))
+
+# Servicio de embeddings fuera del proceso (embedding_service.py): local | auto | proceso
+EMBEDDING_SERVICIO: str = os.getenv("EMBEDDING_SERVICIO", "auto")
+EMBED_SOCKET_PATH: str = os.getenv("EMBED_SOCKET_PATH", str(Path(__file__).parent / "embeddings.sock"))
+EMBED_SERVICIO_MAX_LOTE: int = 256      # textos por micro-lote
+EMBED_SERVICIO_ESPERA_MS: float = 5.0   # espera para juntar pedidos concurrentes
+EMBED_SERVICIO_ARRANQUE_SEG: float = 60.0
+EMBED_CACHE_PATH: str = os.getenv("EMBED_CACHE_PATH", str(Path(__file__).parent / "embedding_cache.db"))
+EMBED_CACHE_MEM_MAX: int = int(os.getenv("EMBED_CACHE_MEM_MAX", "20000"))      # vectores en la LRU de memoria
+EMBED_CACHE_MAX_FILAS: int = int(os.getenv("EMBED_CACHE_MAX_FILAS", "500000"))  # vectores en disco
+
+# Formato de los embeddings en temas_publicados (embedding_storage.py): float32 | float16 | int8
+EMBEDDING_FORMATO: str = os.getenv("EMBEDDING_FORMATO", "float16")
+EMBED_SIDECAR: bool = os.getenv("EMBED_SIDECAR", "1") == "1"   # matriz .npy con mmap en ANN_DIR
+
+# Reformulación de temas "actualizable" en el SEO (dedup_service.sugerir_angulos_lote)
+REFORMULACION_LOTE: int = 15   # temas por llamada a Claude
+
+# Auditoría de duplicados por bloques (dedup_audit.py, run.py --audit)
+AUDITORIA_K: int = 5                       # vecinos por tema
+AUDITORIA_SIM_MIN: float = 0.80            # umbral si no se filtra por categoría
+AUDITORIA_BLOQUE_FILAS: int = 1024
+AUDITORIA_BLOQUE_COLUMNAS: int = 16384     # memoria por bloque: filas × columnas × 4 bytes
+AUDITORIA_DIR: str = os.getenv("AUDITORIA_DIR", str(Path(__file__).parent / "auditorias"))
+
+# Caché HTTP condicional de feeds RSS (feed_cache.py)
+FEED_CACHE_PATH: str = os.getenv("FEED_CACHE_PATH", str(Path(__file__).parent / "feed_cache.db"))
+
+# Registro de artículos ya descargados en la ingesta (url_store.py)
+URL_STORE_PATH: str = os.getenv("URL_STORE_PATH", str(Path(__file__).parent / "url_store.db"))
+URL_STORE_TTL_HORAS: float = float(os.getenv("URL_STORE_TTL_HORAS", "48"))   # se vuelve a descargar después
+URL_STORE_RETENCION_DIAS: int = 30
+INGESTA_CONCURRENCIA: int = 20   # conexiones simultáneas en total
+
+# Planificador de descargas de la ingesta (fetch_scheduler.py)
+INGESTA_MAX_POR_HOST: int = 4
+INGESTA_REINTENTOS: int = 2             # reintentos ante 5xx, timeouts y errores de conexión
+INGESTA_BACKOFF_BASE_SEG: float = 0.5
+INGESTA_BACKOFF_MAX_SEG: float = 8.0
+INGESTA_PLAZO_SEG: float = float(os.getenv("INGESTA_PLAZO_SEG", "90"))   # plazo global de la ingesta
+INGESTA_HOSTS: dict[str, dict] = {
+    # El portal del JNE suele ser lento o no responder: un pedido a la vez, timeout corto, sin reintentos
+    "declara.jne.gob.pe": {"concurrencia": 1, "timeout": 8.0, "reintentos": 0},
+}
+
+# Extracción de HTML fuera del event loop (extraccion_html.py)
+EXTRACCION_PROCESOS: int = int(os.getenv("EXTRACCION_PROCESOS", str(min(4, os.cpu_count() or 1))))   # 0 = hilo
+SELECTORES_PATH: str = os.getenv("SELECTORES_PATH", str(Path(__file__).parent / "selectores.db"))
+
+# Checkpoints de runs para --resume (run_state.py)
+RUNS_DB_PATH: str = os.getenv("RUNS_DB_PATH", str(Path(__file__).parent / "runs.db"))
+
+# Búsqueda aproximada de duplicados (ann_backend.py): exacto | ivf | hnsw | auto
+ANN_BACKEND: str = os.getenv("ANN_BACKEND", "auto")
+ANN_DIR: str = os.getenv("ANN_DIR", str(Path(__file__).parent / "ann_index"))
+ANN_K: int = 10                       # vecinos pedidos al backend antes de filtrar por fecha
+# auto: por debajo, búsqueda exacta (medido: con 20k temas un lote de consultas exacto ya iguala al IVF)
+ANN_AUTO_MIN_TEMAS: int = int(os.getenv("ANN_AUTO_MIN_TEMAS", "20000"))
+ANN_IVF_REENTRENAR: float = 2.0       # recalcula centroides cuando el índice duplica los temas de entrenamiento
+ANN_IVF_NLIST: int = 256
+ANN_IVF_NPROBE: int = 16
+ANN_HNSW_M: int = 16
+ANN_HNSW_EF_CONSTRUCCION: int = 200
+ANN_HNSW_EF: int = 64
+
+# Verificación incremental tras ediciones (PUT /queue/{id}): párrafos de
+# contexto que se envían a cada lado de un párrafo editado
+VERIFICACION_VENTANA_CONTEXTO: int = 1
+
+# Pre-verificación local por reglas (pre_verificacion.py)
+CALENDARIO_ELECTORAL: dict[str, date] = {
+    "primera_vuelta": date(2026, 4, 12),
+    "segunda_vuelta": date(2026, 6, 7),
+}
+PREVERIFICACION_ACTIVA: bool = os.getenv("PREVERIFICACION_ACTIVA", "1") == "1"
+# Categorías de bajo riesgo que, si pasan la pre-verificación sin observaciones, no van a Claude.
+# Las reglas no detectan sesgo ni difamación: no agregar categorías de análisis u opinión.
+PREVERIFICACION_OMITIR_CATEGORIAS: tuple[str, ...] = tuple(
+    c.strip() for c in os.getenv("PREVERIFICACION_OMITIR_CATEGORIAS", "faq").split(",") if c.strip()
+)
+
+# Artículos más largos se verifican en fragmentos paralelos (por secciones H2)
+VERIFICACION_MAX_CHARS_FRAGMENTO: int = 6000
+
+# Modo batch (batch_runner.py): la Message Batches API cobra 50% por token
+BATCH_PRICE_FACTOR: float = 0.5
+BATCH_POLL_SEG: float = float(os.getenv("BATCH_POLL_SEG", "60"))
+
+# Pipeline write → verify → persist (orchestrator.py / pipeline.py)
+PIPELINE_WORKERS: dict[str, int] = {
+    "escritura":    int(os.getenv("PIPELINE_WORKERS_ESCRITURA", "8")),
+    "verificacion": int(os.getenv("PIPELINE_WORKERS_VERIFICACION", "4")),
+    "persistencia": 1,
+}
+PIPELINE_COLA_MAX: int = int(os.getenv("PIPELINE_COLA_MAX", "8"))   # backpressure entre etapas
+PIPELINE_LOTE_DB: int = int(os.getenv("PIPELINE_LOTE_DB", "10"))    # artículos por insert en Supabase
 
 if __name__ == "__main__":
     print("=== config.py ===")
@@ -41,5 +174,6 @@ if __name__ == "__main__":
     print(f"  CMS_URL           : {CMS_URL}")
     print(f"  DB_PATH           : {DB_PATH}")
     print(f"  MAX_ARTICULOS_DIA : {MAX_ARTICULOS_DIA}")
+    print(f"  LLM_MAX_CONCURRENCIA : {LLM_MAX_CONCURRENCIA}")
     print(f"  CONTENT_DIR       : {CONTENT_DIR}")
     print(f"  PROJECT_ROOT      : {PROJECT_ROOT}")
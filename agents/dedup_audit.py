@@ -0,0 +1,179 @@
+"""
+dedup_audit.py — Auditoría de duplicados entre todos los temas publicados
+
+En vez de correr check_duplicate por cada tema (encode + búsqueda por tema),
+compara la matriz de embeddings del índice contra sí misma por bloques:
+
+  para cada bloque de config.AUDITORIA_BLOQUE_FILAS temas
+    para cada bloque de config.AUDITORIA_BLOQUE_COLUMNAS temas
+      sims = filas @ columnas.T  → top-k parcial, fusionado con el acumulado
+
+La memoria queda acotada por filas × columnas (no n × n) y no se usa el
+modelo. Cada par (a, b) se reporta una vez, ordenado por similitud. Con
+por_categoria=True solo quedan los pares sobre el umbral "duplicado" de
+dedup_service.UMBRALES (el más estricto de las dos categorías); si no, los
+que superen `sim_min`.
+
+El reporte se escribe en CSV y JSON en config.AUDITORIA_DIR.
+"""
+
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CAMPOS = [
+    "similitud", "umbral",
+    "slug_a", "titulo_a", "categoria_a", "publicado_a",
+    "slug_b", "titulo_b", "categoria_b", "publicado_b",
+    "dias_entre",
+]
+
+
+def top_k_por_bloques(
+    matriz: np.ndarray,
+    k: int,
+    bloque_filas: int | None = None,
+    bloque_columnas: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k vecinos de cada fila de `matriz` (L2-normalizada) contra todas las
+    demás, excluyéndose a sí misma. Retorna (posiciones, similitudes) n × k,
+    ordenadas de mayor a menor; -1 / -inf donde hay menos de k vecinos.
+    """
+    bloque_filas = bloque_filas or config.AUDITORIA_BLOQUE_FILAS
+    bloque_columnas = bloque_columnas or config.AUDITORIA_BLOQUE_COLUMNAS
+    n = len(matriz)
+    k = max(1, min(k, n - 1)) if n > 1 else 1
+    posiciones = np.full((n, k), -1, dtype=np.int64)
+    similitudes = np.full((n, k), -np.inf, dtype=np.float32)
+
+    for i0 in range(0, n, bloque_filas):
+        filas = matriz[i0:i0 + bloque_filas]
+        m = len(filas)
+        mejores_pos = np.full((m, k), -1, dtype=np.int64)
+        mejores_sim = np.full((m, k), -np.inf, dtype=np.float32)
+        for j0 in range(0, n, bloque_columnas):
+            sims = filas @ matriz[j0:j0 + bloque_columnas].T
+            # Excluir la diagonal (cada tema consigo mismo)
+            diag = np.arange(max(i0, j0), min(i0 + m, j0 + sims.shape[1]))
+            sims[diag - i0, diag - j0] = -np.inf
+
+            kk = min(k, sims.shape[1])
+            parcial = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            cand_sim = np.concatenate([mejores_sim, np.take_along_axis(sims, parcial, axis=1)], axis=1)
+            cand_pos = np.concatenate([mejores_pos, parcial + j0], axis=1)
+            elegidos = np.argpartition(-cand_sim, k - 1, axis=1)[:, :k]
+            mejores_sim = np.take_along_axis(cand_sim, elegidos, axis=1)
+            mejores_pos = np.take_along_axis(cand_pos, elegidos, axis=1)
+
+        orden = np.argsort(-mejores_sim, axis=1)
+        similitudes[i0:i0 + m] = np.take_along_axis(mejores_sim, orden, axis=1)
+        posiciones[i0:i0 + m] = np.take_along_axis(mejores_pos, orden, axis=1)
+
+    posiciones[~np.isfinite(similitudes)] = -1
+    return posiciones, similitudes
+
+
+def auditar_duplicados(
+    index,
+    k: int | None = None,
+    por_categoria: bool = True,
+    sim_min: float | None = None,
+) -> list[dict]:
+    """Pares de temas publicados sospechosos de duplicado, de mayor a menor similitud."""
+    from dedup_service import UMBRALES
+
+    k = k or config.AUDITORIA_K
+    sim_min = config.AUDITORIA_SIM_MIN if sim_min is None else sim_min
+    with index._lock:
+        matriz = index.matriz.copy()
+        fechas = index.fechas.copy()
+        slugs, titulos, categorias = list(index.slugs), list(index.titulos), list(index.categorias)
+    n = len(matriz)
+    if n < 2:
+        return []
+
+    inicio = time.monotonic()
+    vecinos, sims = top_k_por_bloques(matriz, k)
+
+    a = np.repeat(np.arange(n), vecinos.shape[1])
+    b = vecinos.ravel()
+    s = sims.ravel()
+    validos = b >= 0
+    a, b, s = a[validos], b[validos], s[validos]
+    # Cada par una sola vez: (min, max)
+    a, b = np.minimum(a, b), np.maximum(a, b)
+    _, unicos = np.unique(a * n + b, return_index=True)
+    a, b, s = a[unicos], b[unicos], s[unicos]
+
+    if por_categoria:
+        umbral_cat = np.array([UMBRALES.get(c, UMBRALES["noticias"])["duplicado"] for c in categorias])
+        umbral = np.maximum(umbral_cat[a], umbral_cat[b])
+    else:
+        umbral = np.full(len(a), sim_min, dtype=np.float32)
+    marcados = s >= umbral
+    a, b, s, umbral = a[marcados], b[marcados], s[marcados], umbral[marcados]
+    orden = np.argsort(-s, kind="stable")
+
+    dias = np.abs((fechas[a] - fechas[b]) // np.timedelta64(1, "D")).astype(int)
+    pares = [
+        {
+            "similitud": round(float(s[i]), 4),
+            "umbral": round(float(umbral[i]), 4),
+            "slug_a": slugs[a[i]], "titulo_a": titulos[a[i]], "categoria_a": categorias[a[i]],
+            "publicado_a": fechas[a[i]].astype(datetime).isoformat(),
+            "slug_b": slugs[b[i]], "titulo_b": titulos[b[i]], "categoria_b": categorias[b[i]],
+            "publicado_b": fechas[b[i]].astype(datetime).isoformat(),
+            "dias_entre": int(dias[i]),
+        }
+        for i in orden
+    ]
+    logger.info(
+        f"Auditoría por bloques: {n} temas, top-{vecinos.shape[1]} en "
+        f"{time.monotonic() - inicio:.2f}s → {len(pares)} pares sobre umbral"
+    )
+    return pares
+
+
+def escribir_reporte(pares: list[dict], directorio: str | None = None) -> tuple[Path, Path]:
+    """Escribe el ranking en CSV y JSON. Retorna (ruta_csv, ruta_json)."""
+    directorio = Path(directorio or config.AUDITORIA_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    base = directorio / f"duplicados-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}"
+    ruta_csv, ruta_json = base.with_suffix(".csv"), base.with_suffix(".json")
+    with open(ruta_csv, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=CAMPOS)
+        escritor.writeheader()
+        escritor.writerows(pares)
+    ruta_json.write_text(json.dumps(pares, ensure_ascii=False, indent=2), encoding="utf-8")
+    return ruta_csv, ruta_json
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    from ann_backend import top_k_exacto
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    rng = np.random.default_rng(0)
+    matriz = rng.standard_normal((5_000, 384)).astype(np.float32)
+    matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+
+    inicio = time.perf_counter()
+    pos, sims = top_k_por_bloques(matriz, 5, bloque_filas=700, bloque_columnas=1_100)
+    print(f"  5000 temas por bloques en {time.perf_counter() - inicio:.2f}s")
+
+    esperado, _ = top_k_exacto(matriz, matriz, 6)   # incluye a sí mismo
+    coincide = np.mean([set(p) == set(e[e != i][:5]) for i, (p, e) in enumerate(zip(pos, esperado))])
+    print(f"[OK] coincide con la búsqueda completa: {coincide:.3f}")
@@ -5,18 +5,32 @@ Modelo: paraphrase-multilingual-MiniLM-L12-v2
   - Multilingüe, funciona bien con español peruano
   - Vectores de 384 dimensiones
   - Ligero (~120 MB), rápido en CPU
+
+Los embeddings publicados se consultan en memoria (embedding_index.py):
+una búsqueda es un producto matriz-vector, sin leer la DB.
+
+Los vectores de títulos pasan por la caché persistente (embedding_cache.py):
+el SEO, el publisher y la auditoría no vuelven a correr el modelo para un
+título ya visto. El modelo es uno solo por proceso y se carga recién cuando
+hace falta (embedding_model.py); usar get_dedup_service().
 """
 
-import io
+import asyncio
+import json
 import logging
+import re
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
 
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from sqlalchemy.orm import Session
 
 import config
+from embedding_cache import get_embedding_cache
+from embedding_index import get_embedding_index
+from embedding_model import get_proveedor_embeddings
+from embedding_storage import serializar
 from revision_queue import SessionLocal, TemaPublicado, init_db
 
 logger = logging.getLogger(__name__)
@@ -33,18 +47,18 @@ UMBRALES = {
     "analisis":  {"duplicado": 0.85, "actualizable": 0.65},
 }
 
-VENTANA_DIAS = 60          # días atrás para buscar duplicados
+VENTANA_DIAS = 60          # solo cuenta como duplicado/actualizable lo publicado en estos días
 VENTANA_REFRESCO_DIAS = 14  # si fue publicado hace +14 días, bajamos umbral
 
 
 class DeduplicationService:
 
     def __init__(self, db_path: str = config.DB_PATH):
-        from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
         self.db_path = db_path
         init_db()
-        logger.info("Modelo cargado correctamente")
+        self.embeddings = get_proveedor_embeddings()   # el modelo se carga en el primer encode
+        self.index = get_embedding_index()
+        self.cache = get_embedding_cache()
 
     # ------------------------------------------------------------------
     # Vectorización
@@ -52,16 +66,50 @@ class DeduplicationService:
 
     def get_embedding(self, texto: str) -> np.ndarray:
         """Retorna vector de 384 dimensiones para el texto dado."""
-        return self.model.encode(texto, convert_to_numpy=True)
+        return self.get_embeddings([texto])[0]
 
-    def _serialize(self, vec: np.ndarray) -> bytes:
-        buf = io.BytesIO()
-        np.save(buf, vec)
-        return buf.getvalue()
+    def _sin_encode(self, textos: list[str]) -> tuple[list[np.ndarray | None], list[str]]:
+        """
+        Vectores que no necesitan el modelo: caché de embeddings y títulos ya
+        indexados. Retorna (vectores con None donde falta, textos únicos a codificar).
+        """
+        vecs = self.cache.get_many(textos)
+        faltan = [i for i, v in enumerate(vecs) if v is None]
+
+        # Títulos publicados antes de la caché: su vector ya está en el índice. Solo se usa en
+        # esta llamada: viene cuantizado (float16/int8) y de un backend que el índice no
+        # registra, así que no se guarda en la caché bajo el id_modelo actual
+        for i in faltan:
+            vecs[i] = self.index.vector_de_titulo(textos[i])
+
+        return vecs, list(dict.fromkeys(textos[i] for i in faltan if vecs[i] is None))
+
+    def _completar(self, textos: list[str], vecs: list, unicos: list[str], nuevos: np.ndarray) -> np.ndarray:
+        if unicos:
+            # Si el backend pedido cayó a torch, sus vectores no van a la caché de ese backend
+            if getattr(self.embeddings, "id_modelo", self.cache.modelo) == self.cache.modelo:
+                self.cache.put_many(unicos, nuevos)
+            por_texto = dict(zip(unicos, nuevos))
+            vecs = [por_texto[t] if v is None else v for t, v in zip(textos, vecs)]
+        if not textos:
+            return np.zeros((0, self.index.dimension), dtype=np.float32)
+        return np.stack(vecs).astype(np.float32, copy=False)
+
+    def get_embeddings(self, textos: list[str]) -> np.ndarray:
+        """
+        Vectores (n × 384) para varios textos. Primero la caché de embeddings,
+        luego los títulos ya indexados; solo lo que falta pasa por el modelo,
+        en una sola llamada por lotes.
+        """
+        vecs, unicos = self._sin_encode(textos)
+        nuevos = self.embeddings.encode(unicos) if unicos else None
+        return self._completar(textos, vecs, unicos, nuevos)
 
-    def _deserialize(self, blob: bytes) -> np.ndarray:
-        buf = io.BytesIO(blob)
-        return np.load(buf)
+    async def get_embeddings_async(self, textos: list[str]) -> np.ndarray:
+        """get_embeddings sin bloquear el event loop: el encode corre en el servicio o en un executor."""
+        vecs, unicos = self._sin_encode(textos)
+        nuevos = await self.embeddings.encode_async(unicos) if unicos else None
+        return self._completar(textos, vecs, unicos, nuevos)
 
     # ------------------------------------------------------------------
     # Chequeo de duplicados
@@ -69,7 +117,9 @@ class DeduplicationService:
 
     def check_duplicate(self, titulo: str, categoria: str) -> dict:
         """
-        Compara el título contra temas publicados en los últimos 60 días.
+        Compara el título contra los temas publicados en los últimos
+        VENTANA_DIAS días (el ANN recorre todo el archivo y filtra por fecha:
+        un tema más viejo no vuelve "actualizable" al nuevo).
 
         Retorna:
           {
@@ -79,101 +129,132 @@ class DeduplicationService:
             "dias_desde_publicacion": int | None
           }
         """
-        umbrales = UMBRALES.get(categoria, UMBRALES["noticias"])
-        umbral_dup = umbrales["duplicado"]
-        umbral_act = umbrales["actualizable"]
-
-        vec_nuevo = self.get_embedding(titulo)
-        ventana = datetime.utcnow() - timedelta(days=VENTANA_DIAS)
-
-        db: Session = SessionLocal()
-        try:
-            temas = (
-                db.query(TemaPublicado)
-                .filter(TemaPublicado.publicado_en >= ventana)
-                .all()
-            )
-        finally:
-            db.close()
-
-        if not temas:
-            return {"status": "nuevo", "similitud": 0.0, "articulo_similar": None, "dias_desde_publicacion": None}
+        return self.check_duplicates_batch([titulo], [categoria])[0]
+
+    def check_duplicates_batch(
+        self,
+        titulos: list[str],
+        categorias: list[str],
+        vecs: np.ndarray | None = None,
+    ) -> list[dict]:
+        """
+        check_duplicate para muchos títulos a la vez: un solo encode por lotes
+        y una sola multiplicación contra el índice. Los umbrales por categoría
+        y la regla de VENTANA_REFRESCO_DIAS se aplican vectorizados.
+        `vecs` permite pasar embeddings ya calculados de los títulos.
+        Retorna una lista con el mismo formato que check_duplicate.
+        """
+        if not titulos:
+            return []
+        ahora = datetime.utcnow()
+        if vecs is None:
+            vecs = self.get_embeddings(titulos)
+        posiciones, sims = self.index.buscar_lote(vecs, desde=ahora - timedelta(days=VENTANA_DIAS))
+
+        umbral_dup = np.array([UMBRALES.get(c, UMBRALES["noticias"])["duplicado"] for c in categorias])
+        umbral_act = np.array([UMBRALES.get(c, UMBRALES["noticias"])["actualizable"] for c in categorias])
+        encontrados = (posiciones >= 0) & (sims > 0.0)
+        fechas = self.index.fechas[np.where(encontrados, posiciones, 0)] if self.index.n else None
+        dias = (
+            ((np.datetime64(ahora, "s") - fechas) // np.timedelta64(1, "D")).astype(int)
+            if fechas is not None else np.zeros(len(titulos), dtype=int)
+        )
 
-        max_sim = 0.0
-        mejor_tema = None
+        # Regla temporal: si fue publicado hace +14 días, "duplicado" baja a "actualizable"
+        status = np.where(
+            sims >= umbral_dup,
+            np.where(dias > VENTANA_REFRESCO_DIAS, "actualizable", "duplicado"),
+            np.where(sims >= umbral_act, "actualizable", "nuevo"),
+        )
 
-        for tema in temas:
-            if not tema.embedding:
+        resultados = []
+        for i in range(len(titulos)):
+            if not encontrados[i]:
+                resultados.append({"status": "nuevo", "similitud": 0.0, "articulo_similar": None,
+                                   "dias_desde_publicacion": None})
                 continue
-            vec_existente = self._deserialize(tema.embedding)
-            sim = float(cosine_similarity([vec_nuevo], [vec_existente])[0][0])
-            if sim > max_sim:
-                max_sim = sim
-                mejor_tema = tema
-
-        if mejor_tema is None:
-            return {"status": "nuevo", "similitud": 0.0, "articulo_similar": None, "dias_desde_publicacion": None}
-
-        dias = (datetime.utcnow() - mejor_tema.publicado_en).days if mejor_tema.publicado_en else 0
-
-        articulo_similar = {
-            "titulo": mejor_tema.titulo,
-            "slug": mejor_tema.slug,
-            "publicado_en": mejor_tema.publicado_en.isoformat() if mejor_tema.publicado_en else None,
-        }
-
-        # Regla temporal: si fue publicado hace +14 días, bajamos "duplicado" a "actualizable"
-        if max_sim >= umbral_dup:
-            if dias > VENTANA_REFRESCO_DIAS:
-                status = "actualizable"
-            else:
-                status = "duplicado"
-        elif max_sim >= umbral_act:
-            status = "actualizable"
-        else:
-            status = "nuevo"
-
-        return {
-            "status": status,
-            "similitud": round(max_sim, 4),
-            "articulo_similar": articulo_similar,
-            "dias_desde_publicacion": dias,
-        }
+            tema = self.index.tema(int(posiciones[i]))
+            resultados.append({
+                "status": str(status[i]),
+                "similitud": round(float(sims[i]), 4),
+                "articulo_similar": {
+                    "titulo": tema["titulo"],
+                    "slug": tema["slug"],
+                    "publicado_en": tema["publicado_en"].isoformat(),
+                },
+                "dias_desde_publicacion": int(dias[i]),
+            })
+        return resultados
 
     # ------------------------------------------------------------------
     # Sugerencia de ángulo nuevo
     # ------------------------------------------------------------------
 
-    def sugerir_angulo_nuevo(self, titulo: str, articulo_existente: dict) -> str:
+    async def sugerir_angulo_nuevo(self, titulo: str, articulo_existente: dict) -> str:
         """
         Llama a Claude para reformular el tema con un ángulo diferente.
-        Retorna el título reformulado.
+        Retorna el título reformulado (el original si Claude no devolvió uno).
         """
-        import anthropic
-
-        client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
-        prompt = (
-            f"Tengo este artículo ya publicado: \"{articulo_existente.get('titulo', '')}\" "
-            f"(publicado hace {articulo_existente.get('dias', 'varios')} días).\n\n"
-            f"Quiero publicar un nuevo artículo sobre: \"{titulo}\"\n\n"
-            f"Dame UN título alternativo que cubra el mismo tema pero con un ángulo diferente, "
-            f"actualización o enfoque noticioso distinto. Responde solo con el título, sin comillas ni explicaciones."
-        )
+        return (await self.sugerir_angulos_lote([(titulo, articulo_existente)]))[0] or titulo
 
-        msg = client.messages.create(
-            model=config.CLAUDE_MODEL,
-            max_tokens=150,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return msg.content[0].text.strip()
+    async def sugerir_angulos_lote(self, pedidos: list[tuple[str, dict]]) -> list[str | None]:
+        """
+        Reformula varios temas "actualizable" a la vez. `pedidos` es una lista
+        de (título, artículo existente). Se agrupan de a config.REFORMULACION_LOTE
+        por llamada a Claude (las llamadas corren concurrentes) y cada una
+        responde un array JSON [{"i", "titulo"}]. Retorna los títulos nuevos en
+        el mismo orden; None donde Claude no devolvió uno.
+        """
+        from llm_client import get_llm_client
+
+        async def _lote(inicio: int, lote: list[tuple[str, dict]]) -> dict[int, str]:
+            lineas = [
+                f'{inicio + j}. Nuevo tema: "{titulo}" — ya publicado: "{existente.get("titulo", "")}" '
+                f'(hace {existente.get("dias", "varios")} días)'
+                for j, (titulo, existente) in enumerate(lote)
+            ]
+            prompt = (
+                "Para cada tema, ya existe un artículo publicado muy parecido. Dame UN título "
+                "alternativo que cubra el mismo tema pero con un ángulo diferente, actualización "
+                "o enfoque noticioso distinto.\n\n"
+                + "\n".join(lineas)
+                + '\n\nResponde SOLO con un array JSON: [{"i": <número>, "titulo": "<título nuevo>"}, ...]'
+            )
+            try:
+                msg = await get_llm_client().create(
+                    "dedup",
+                    model=config.CLAUDE_MODEL,
+                    max_tokens=80 * len(lote) + 100,
+                    messages=[{"role": "user", "content": prompt}],
+                )
+                texto = msg.content[0].text
+                match = re.search(r"\[.*\]", texto, re.DOTALL)
+                items = json.loads(match.group()) if match else []
+            except Exception as e:
+                logger.warning(f"Reformulación por lote fallida ({len(lote)} temas): {e}")
+                return {}
+            return {
+                int(it["i"]): str(it["titulo"]).strip().strip('"')
+                for it in items
+                if isinstance(it, dict) and str(it.get("i", "")).isdigit() and it.get("titulo")
+            }
+
+        tam = config.REFORMULACION_LOTE
+        partes = await asyncio.gather(*[
+            _lote(inicio, pedidos[inicio:inicio + tam]) for inicio in range(0, len(pedidos), tam)
+        ])
+        titulos = {i: t for parte in partes for i, t in parte.items()}
+        return [titulos.get(i) for i in range(len(pedidos))]
 
     # ------------------------------------------------------------------
     # Registro de nuevo tema publicado
     # ------------------------------------------------------------------
 
-    def registrar_tema(self, titulo: str, slug: str, keyword: str, categoria: str):
-        """Guarda o actualiza el tema en temas_publicados con su embedding."""
-        embedding_blob = self._serialize(self.get_embedding(titulo))
+    def registrar_tema(self, titulo: str, slug: str, keyword: str, categoria: str, vec: np.ndarray | None = None):
+        """Guarda o actualiza el tema en temas_publicados con su embedding (`vec` si ya se calculó)."""
+        if vec is None:
+            vec = self.get_embedding(titulo)
+        embedding_blob, embedding_version = serializar(vec)
         db: Session = SessionLocal()
         try:
             existente = db.query(TemaPublicado).filter(TemaPublicado.slug == slug).first()
@@ -182,6 +263,7 @@ class DeduplicationService:
                 existente.keyword = keyword
                 existente.categoria = categoria
                 existente.embedding = embedding_blob
+                existente.embedding_version = embedding_version
                 existente.actualizado_en = datetime.utcnow()
                 existente.veces_publicado += 1
             else:
@@ -191,13 +273,36 @@ class DeduplicationService:
                     keyword=keyword,
                     categoria=categoria,
                     embedding=embedding_blob,
+                    embedding_version=embedding_version,
                 )
                 db.add(nuevo)
             db.commit()
+            publicado_en = (existente or nuevo).publicado_en
+            self.index.agregar(slug, titulo, categoria, vec, fecha=publicado_en)
             logger.info(f"Tema registrado: {slug}")
         finally:
             db.close()
 
+    async def registrar_tema_async(self, titulo: str, slug: str, keyword: str, categoria: str):
+        vec = (await self.get_embeddings_async([titulo]))[0]
+        self.registrar_tema(titulo, slug, keyword, categoria, vec=vec)
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_dedup_service: DeduplicationService | None = None
+_dedup_lock = threading.Lock()
+
+
+def get_dedup_service() -> DeduplicationService:
+    global _dedup_service
+    with _dedup_lock:
+        if _dedup_service is None:
+            _dedup_service = DeduplicationService()
+    return _dedup_service
+
 
 # ---------------------------------------------------------------------------
 # Test básico
@@ -205,8 +310,7 @@ class DeduplicationService:
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
-    svc = DeduplicationService()
-    print("Modelo cargado correctamente")
+    svc = get_dedup_service()
 
     # Test de vectorización
     vec = svc.get_embedding("Keiko Fujimori propuestas económicas 2026")
@@ -0,0 +1,208 @@
+"""
+embedding_cache.py — Caché persistente de embeddings de títulos
+
+La clave es un hash SHA-256 del id del modelo (nombre + backend, ver
+id_modelo_embeddings) más el texto normalizado
+(Unicode NFC, espacios colapsados): el mismo título produce el mismo vector
+sin volver a pasar por el modelo, aunque lo pida el SEOAgent, el publisher
+(registrar_tema) o la auditoría de duplicados, en el mismo proceso o en
+otro run.
+
+Dos niveles:
+  - memoria: LRU de config.EMBED_CACHE_MEM_MAX vectores
+  - disco:   SQLite en config.EMBED_CACHE_PATH, hasta config.EMBED_CACHE_MAX_FILAS
+             (al superarlo se eliminan los menos usados recientemente)
+
+Los vectores se guardan como bytes float32 crudos.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def normalizar_texto(texto: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", texto or "").split())
+
+
+def id_modelo_embeddings(modelo: str | None = None, backend: str | None = None) -> str:
+    """
+    Id de los vectores: los backends int8 y onnx dan vectores distintos a los de
+    torch, así que cada uno tiene su propio espacio de claves en la caché.
+    """
+    modelo = modelo or config.EMBEDDING_MODEL
+    backend = backend or config.EMBEDDING_BACKEND
+    if backend == "onnx":
+        return f"{modelo}+onnx:{config.EMBEDDING_ONNX_ARCHIVO or 'model.onnx'}"
+    if backend != "torch":
+        return f"{modelo}+{backend}"
+    return modelo   # torch: mismas claves que antes de los backends alternativos
+
+
+def clave_embedding(texto: str, modelo: str) -> str:
+    return hashlib.sha256(f"{modelo}\n{normalizar_texto(texto)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+
+    def __init__(
+        self,
+        modelo: str | None = None,
+        path: str | None = None,
+        max_memoria: int | None = None,
+        max_filas: int | None = None,
+    ):
+        self.modelo = modelo or id_modelo_embeddings()
+        self.path = path or config.EMBED_CACHE_PATH
+        self.max_memoria = max_memoria or config.EMBED_CACHE_MEM_MAX
+        self.max_filas = max_filas or config.EMBED_CACHE_MAX_FILAS
+        self._memoria: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                clave    TEXT PRIMARY KEY,
+                modelo   TEXT NOT NULL,
+                vector   BLOB NOT NULL,
+                accedido REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_accedido ON embeddings(accedido)")
+        self._conn.commit()
+
+        # Métricas
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # get / put
+    # ------------------------------------------------------------------
+
+    def _recordar(self, clave: str, vec: np.ndarray):
+        """Inserta en la LRU de memoria (con lock tomado)."""
+        self._memoria[clave] = vec
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def get_many(self, textos: list[str]) -> list[np.ndarray | None]:
+        """Vectores cacheados para cada texto (None si no está)."""
+        claves = [clave_embedding(t, self.modelo) for t in textos]
+        resultado: list[np.ndarray | None] = [None] * len(textos)
+        faltan: dict[str, list[int]] = {}
+
+        with self._lock:
+            for i, clave in enumerate(claves):
+                vec = self._memoria.get(clave)
+                if vec is not None:
+                    self._memoria.move_to_end(clave)
+                    resultado[i] = vec
+                    self.hits_memoria += 1
+                else:
+                    faltan.setdefault(clave, []).append(i)
+
+            if faltan:
+                lista = list(faltan)
+                filas = []
+                for k in range(0, len(lista), 500):   # límite de parámetros de SQLite
+                    parte = lista[k:k + 500]
+                    filas += self._conn.execute(
+                        f"SELECT clave, vector FROM embeddings WHERE clave IN ({','.join('?' * len(parte))})",
+                        parte,
+                    ).fetchall()
+                ahora = time.time()
+                for clave, blob in filas:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    self._recordar(clave, vec)
+                    for i in faltan.pop(clave):
+                        resultado[i] = vec
+                        self.hits_disco += 1
+                if filas:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET accedido = ? WHERE clave = ?", [(ahora, c) for c, _ in filas]
+                    )
+                    self._conn.commit()
+                self.misses += sum(len(v) for v in faltan.values())
+        return resultado
+
+    def put_many(self, textos: list[str], vecs: np.ndarray):
+        ahora = time.time()
+        filas = []
+        with self._lock:
+            for texto, vec in zip(textos, vecs):
+                vec = np.ascontiguousarray(vec, dtype=np.float32)
+                clave = clave_embedding(texto, self.modelo)
+                self._recordar(clave, vec)
+                filas.append((clave, self.modelo, vec.tobytes(), ahora))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (clave, modelo, vector, accedido) VALUES (?, ?, ?, ?)", filas
+            )
+            self._conn.commit()
+            self._evictar_si_excede()
+
+    def _evictar_si_excede(self):
+        """Deja el disco en el 90% de max_filas borrando las menos usadas (con lock tomado)."""
+        total = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if total <= self.max_filas:
+            return
+        sobran = total - int(self.max_filas * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE clave IN "
+            "(SELECT clave FROM embeddings ORDER BY accedido ASC LIMIT ?)", (sobran,)
+        )
+        self._conn.commit()
+        logger.debug(f"Caché de embeddings: {sobran} vectores eliminados por tamaño")
+
+    def resumen(self) -> dict:
+        total = self.hits_memoria + self.hits_disco + self.misses
+        return {
+            "embed_hits_memoria": self.hits_memoria,
+            "embed_hits_disco": self.hits_disco,
+            "embed_misses": self.misses,
+            "embed_hit_rate": round((total - self.misses) / total, 3) if total else 0.0,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_embedding_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(path=f"{tmp}/emb.db", max_memoria=2, max_filas=10)
+        textos = ["Keiko Fujimori  perfil", "Debate JNE", "Encuesta Ipsos"]
+        print(f"  vacío: {cache.get_many(textos)}")
+        cache.put_many(textos, np.eye(3, 384, dtype=np.float32))
+        # "Keiko Fujimori perfil" normaliza igual; la LRU de 2 ya lo sacó de memoria → disco
+        vecs = cache.get_many(["Keiko Fujimori perfil", "Encuesta Ipsos", "otro"])
+        print(f"  tras put: {[None if v is None else int(v.argmax()) for v in vecs]}")
+        cache.put_many([f"relleno {i}" for i in range(20)], np.zeros((20, 384), dtype=np.float32))
+        print(f"[OK] {cache.resumen()}")
@@ -0,0 +1,306 @@
+"""
+embedding_index.py — Índice en memoria de embeddings de temas publicados
+
+Una matriz float32 (n × 384) con los embeddings L2-normalizados de todos los
+temas_publicados, más arrays paralelos de slug, título, categoría y fecha de
+publicación. Se carga una vez por proceso desde SQLite y registrar_tema la
+actualiza en el lugar, así que una consulta es un solo producto
+matriz-vector con máscara de fechas, sin leer la DB ni deserializar blobs:
+la latencia se mantiene plana con decenas de miles de temas.
+
+Con un backend ANN (ann_backend.py, config.ANN_BACKEND) las consultas piden
+los config.ANN_K vecinos aproximados y filtran por fecha; si ninguno cae en
+la ventana, esa consulta se resuelve con la búsqueda exacta.
+
+Con el sidecar de embedding_storage.py la matriz se abre con mmap al cargar,
+sin decodificar un blob por tema.
+
+Uso:
+  index = get_embedding_index()
+  pos, sim = index.buscar(vec, desde=datetime.utcnow() - timedelta(days=60))
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import func
+
+import config
+from ann_backend import BackendANN, crear_backend
+from embedding_cache import normalizar_texto
+from embedding_storage import deserializar
+
+logger = logging.getLogger(__name__)
+
+DIMENSION = 384
+
+
+def normalizar(vecs: np.ndarray) -> np.ndarray:
+    """L2-normaliza filas (o un vector) en float32; el producto punto pasa a ser coseno."""
+    vecs = np.asarray(vecs, dtype=np.float32)
+    normas = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    return vecs / np.maximum(normas, 1e-12)
+
+
+class EmbeddingIndex:
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self._matriz = np.zeros((0, dimension), dtype=np.float32)   # capacidad reservada
+        self.n = 0
+        self.slugs: list[str] = []
+        self.titulos: list[str] = []
+        self.categorias: list[str] = []
+        self._fechas = np.zeros(0, dtype="datetime64[s]")
+        self._pos_slug: dict[str, int] = {}
+        self._pos_titulo: dict[str, int] = {}   # título normalizado → posición
+        self.backend: BackendANN = crear_backend("exacto")
+
+    # ------------------------------------------------------------------
+    # Carga y actualización
+    # ------------------------------------------------------------------
+
+    def cargar(self):
+        """
+        Lee todos los temas_publicados con embedding (una sola vez por proceso).
+        Si el sidecar .npy coincide con la DB, la matriz se abre con mmap y no
+        se decodifica ningún blob.
+        """
+        from revision_queue import SessionLocal, TemaPublicado
+        from embedding_storage import cargar_sidecar, firma_indice, guardar_sidecar
+
+        inicio = time.monotonic()
+        con_embedding = TemaPublicado.embedding.isnot(None)
+        db = SessionLocal()
+        try:
+            filas = (
+                db.query(TemaPublicado.slug, TemaPublicado.titulo, TemaPublicado.categoria,
+                         TemaPublicado.publicado_en)
+                .filter(con_embedding)
+                .order_by(TemaPublicado.id)   # orden estable: las posiciones son los ids del ANN
+                .all()
+            )
+            ultima = db.query(func.max(TemaPublicado.actualizado_en)).filter(con_embedding).scalar()
+            firma = firma_indice([f[0] for f in filas], ultima)
+            matriz = cargar_sidecar(firma, self.dimension)
+            blobs = None
+            if matriz is None or len(matriz) != len(filas):
+                matriz = None
+                blobs = (
+                    db.query(TemaPublicado.embedding, TemaPublicado.embedding_version)
+                    .filter(con_embedding)
+                    .order_by(TemaPublicado.id)
+                    .all()
+                )
+        finally:
+            db.close()
+
+        with self._lock:
+            if matriz is not None:
+                # mmap copy-on-write: el primer agregar() que crezca la matriz la copia a memoria
+                self._matriz = matriz
+                self._fechas = np.zeros(len(filas), dtype="datetime64[s]")
+                vacio = np.zeros(0, dtype=np.float32)
+                for slug, titulo, categoria, publicado_en in filas:
+                    self._upsert(slug, titulo, categoria, publicado_en, vacio)
+            else:
+                self._reservar(len(filas))
+                for (slug, titulo, categoria, publicado_en), (blob, version) in zip(filas, blobs):
+                    self._upsert(slug, titulo, categoria, publicado_en, normalizar(deserializar(blob, version)))
+                guardar_sidecar(self.matriz, firma)
+            self.backend = crear_backend()
+            self.backend.abrir(self)
+        logger.info(
+            f"Índice de embeddings: {self.n} temas cargados en {time.monotonic() - inicio:.2f}s "
+            f"({'sidecar mmap' if matriz is not None else 'blobs de la DB'}; backend: {self.backend.nombre}"
+            f"{'' if self.backend.listo else ', exacto hasta tener datos'})"
+        )
+
+    def _reservar(self, extra: int):
+        """Crece la capacidad al doble (amortizado) cuando no alcanza (con lock tomado)."""
+        requerida = self.n + extra
+        if requerida <= len(self._matriz):
+            return
+        capacidad = max(requerida, 2 * len(self._matriz), 256)
+        matriz = np.zeros((capacidad, self.dimension), dtype=np.float32)
+        matriz[:self.n] = self._matriz[:self.n]
+        fechas = np.zeros(capacidad, dtype="datetime64[s]")
+        fechas[:self.n] = self._fechas[:self.n]
+        self._matriz, self._fechas = matriz, fechas
+
+    def _upsert(self, slug: str, titulo: str, categoria: str, fecha: datetime | None, vec: np.ndarray):
+        pos = self._pos_slug.get(slug)
+        if pos is None:
+            self._reservar(1)
+            pos = self.n
+            self.n += 1
+            self._pos_slug[slug] = pos
+            self.slugs.append(slug)
+            self.titulos.append(titulo)
+            self.categorias.append(categoria)
+        else:
+            self.titulos[pos] = titulo
+            self.categorias[pos] = categoria
+        self._pos_titulo[normalizar_texto(titulo)] = pos
+        if vec.size:
+            self._matriz[pos] = vec
+        self._fechas[pos] = np.datetime64(fecha or datetime.utcnow(), "s")
+
+    def agregar(self, slug: str, titulo: str, categoria: str, vec: np.ndarray, fecha: datetime | None = None):
+        """Inserta o reemplaza (por slug) un tema; la fecha es la de primera publicación."""
+        with self._lock:
+            pos = self._pos_slug.get(slug)
+            if pos is not None and fecha is None:
+                fecha = self._fechas[pos].astype(datetime)
+            self._upsert(slug, titulo, categoria, fecha, normalizar(vec))
+            self.backend.agregar(self, self._pos_slug[slug])
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @property
+    def matriz(self) -> np.ndarray:
+        return self._matriz[:self.n]
+
+    @property
+    def fechas(self) -> np.ndarray:
+        return self._fechas[:self.n]
+
+    def buscar(self, vec: np.ndarray, desde: datetime | None = None) -> tuple[int, float] | None:
+        """
+        Tema más similar a `vec` publicado desde `desde`.
+        Retorna (posición, similitud coseno) o None si no hay candidatos.
+        """
+        posiciones, sims = self.buscar_lote(vec, desde)
+        if posiciones[0] < 0:
+            return None
+        return int(posiciones[0]), float(sims[0])
+
+    def buscar_lote(
+        self,
+        vecs: np.ndarray,
+        desde: datetime | None = None,
+        exacto: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Versión por lotes de buscar(). Sin backend ANN listo, con exacto=True o
+        con un lote para el que auto midió que el exacto es más rápido, es una
+        sola multiplicación (m × d) · (d × n).
+        Retorna (posiciones, similitudes) de largo m; posición -1 si no hay candidatos.
+        """
+        vecs = normalizar(np.atleast_2d(vecs))
+        m = len(vecs)
+        with self._lock:
+            if self.n == 0:
+                return np.full(m, -1), np.zeros(m, dtype=np.float32)
+            if self.backend.usar_para(m) and not exacto:
+                pos, mejores = self._buscar_ann(vecs, desde)
+                faltan = pos < 0
+                if faltan.any() and (desde is None or (self.fechas >= np.datetime64(desde, "s")).any()):
+                    pos_e, sims_e = self._buscar_exacto(vecs[faltan], desde)
+                    pos[faltan], mejores[faltan] = pos_e, sims_e
+            else:
+                pos, mejores = self._buscar_exacto(vecs, desde)
+        validos = pos >= 0
+        return np.where(validos, pos, -1), np.where(validos, mejores, 0.0).astype(np.float32)
+
+    def _buscar_ann(self, vecs: np.ndarray, desde: datetime | None) -> tuple[np.ndarray, np.ndarray]:
+        """Primer vecino ANN dentro de la ventana de fechas (con lock tomado)."""
+        vecinos, sims = self.backend.buscar(self, vecs, config.ANN_K)
+        validos = (vecinos >= 0) & np.isfinite(sims)
+        if desde is not None:
+            validos &= self.fechas[np.where(vecinos >= 0, vecinos, 0)] >= np.datetime64(desde, "s")
+        # Los vecinos vienen ordenados por similitud: el primero válido es el mejor
+        primero = np.argmax(validos, axis=1)
+        filas = np.arange(len(vecs))
+        hay = validos[filas, primero]
+        return (
+            np.where(hay, vecinos[filas, primero], -1),
+            np.where(hay, sims[filas, primero], -np.inf).astype(np.float32),
+        )
+
+    def _buscar_exacto(self, vecs: np.ndarray, desde: datetime | None) -> tuple[np.ndarray, np.ndarray]:
+        """Mejor tema por producto matricial completo (con lock tomado)."""
+        sims = vecs @ self.matriz.T
+        if desde is not None:
+            sims[:, self.fechas < np.datetime64(desde, "s")] = -np.inf
+        pos = np.argmax(sims, axis=1)
+        mejores = sims[np.arange(len(vecs)), pos]
+        return np.where(np.isfinite(mejores), pos, -1), mejores
+
+    def vector_de_titulo(self, titulo: str) -> np.ndarray | None:
+        """Embedding ya indexado de un título publicado (None si no está)."""
+        with self._lock:
+            pos = self._pos_titulo.get(normalizar_texto(titulo))
+            if pos is None or normalizar_texto(self.titulos[pos]) != normalizar_texto(titulo):
+                return None
+            return self._matriz[pos].copy()
+
+    def tema(self, pos: int) -> dict:
+        fecha = self._fechas[pos].astype(datetime)
+        return {
+            "titulo": self.titulos[pos],
+            "slug": self.slugs[pos],
+            "categoria": self.categorias[pos],
+            "publicado_en": fecha,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_index: EmbeddingIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_embedding_index() -> EmbeddingIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = EmbeddingIndex()
+            index.cargar()
+            _index = index
+    return _index
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    from datetime import timedelta
+    from ann_backend import evaluar_recall
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    rng = np.random.default_rng(0)
+    ahora = datetime.utcnow()
+    n = 50_000
+    # Vectores agrupados (como títulos sobre pocos temas), no ruido uniforme
+    centros = rng.standard_normal((500, DIMENSION)).astype(np.float32)
+    vecs = centros[rng.integers(0, 500, n)] + 0.5 * rng.standard_normal((n, DIMENSION)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.ANN_DIR = tmp
+        for nombre in ("exacto", "ivf", "auto"):
+            index = EmbeddingIndex()
+            for i in range(n):
+                index._upsert(f"tema-{i}", f"Tema {i}", "noticias", ahora - timedelta(days=i % 120), normalizar(vecs[i]))
+            index.backend = crear_backend(nombre)
+            index.backend.abrir(index)
+
+            consulta = vecs[123] + 0.1 * rng.standard_normal(DIMENSION).astype(np.float32)
+            inicio = time.perf_counter()
+            pos, sim = index.buscar(consulta)
+            print(f"  [{nombre}] {n} temas: mejor={index.slugs[pos]} sim={sim:.3f} "
+                  f"en {1000 * (time.perf_counter() - inicio):.1f} ms")
+            print(f"  [{nombre}] fuera de ventana excluido: "
+                  f"{index.buscar(vecs[61], desde=ahora - timedelta(days=60))[0] != 61}")
+            print(f"  [{nombre}] {evaluar_recall(index)}")
+        print("[OK]")
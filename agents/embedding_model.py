@@ -0,0 +1,176 @@
+"""
+embedding_model.py — Modelo de embeddings compartido por proceso
+
+El SEOAgent, el publisher, la auditoría y el test de dedup_service usaban
+cada uno su propio SentenceTransformer. Ahora hay un solo proveedor por
+proceso, que carga el modelo recién en el primer encode. Si todos los
+títulos salen de la caché de embeddings, el modelo no se carga nunca.
+
+Backends (config.EMBEDDING_BACKEND):
+  torch : SentenceTransformer en PyTorch (por defecto)
+  int8  : el mismo modelo con cuantización dinámica int8 de las capas
+          Linear (torch.quantization.quantize_dynamic). Sin dependencias
+          extra; más rápido y liviano en CPU
+  onnx  : backend ONNX Runtime de sentence-transformers (pip install
+          sentence-transformers[onnx]); config.EMBEDDING_ONNX_ARCHIVO elige
+          una variante, p. ej. onnx/model_qint8_avx2.onnx
+Si el backend pedido no se puede cargar, se usa torch.
+
+Cada backend produce vectores distintos: la caché de embeddings usa un id por
+backend (id_modelo) y el índice de temas publicados debe generarse siempre con
+el mismo backend.
+
+Los hilos de cómputo de PyTorch se fijan a config.EMBEDDING_HILOS (por
+defecto, los núcleos de la máquina). encode_async corre el encode en un
+executor para no bloquear el event loop. La carga y el warm-up se registran
+con su tiempo y el pico de memoria del proceso.
+
+Con config.EMBEDDING_SERVICIO el proveedor puede ser el servicio de
+embeddings fuera del proceso (embedding_service.py), con la misma interfaz.
+"""
+
+import asyncio
+import logging
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _pico_rss_mb() -> float:
+    # Linux reporta ru_maxrss en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ProveedorEmbeddings:
+
+    def __init__(self, modelo: str | None = None, backend: str | None = None, hilos: int | None = None):
+        self.nombre_modelo = modelo or config.EMBEDDING_MODEL
+        self.backend = backend or config.EMBEDDING_BACKEND
+        self.hilos = hilos or config.EMBEDDING_HILOS
+        self._modelo = None
+        self._lock = threading.Lock()
+        # Un solo worker: los encodes se serializan y cada uno usa todos los hilos de torch
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embeddings")
+
+    # ------------------------------------------------------------------
+    # Carga perezosa
+    # ------------------------------------------------------------------
+
+    @property
+    def cargado(self) -> bool:
+        return self._modelo is not None
+
+    def _cargar(self):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(self.hilos)
+        inicio = time.monotonic()
+        modelo = None
+        if self.backend == "onnx":
+            try:
+                kwargs = {"file_name": config.EMBEDDING_ONNX_ARCHIVO} if config.EMBEDDING_ONNX_ARCHIVO else {}
+                modelo = SentenceTransformer(self.nombre_modelo, backend="onnx", model_kwargs=kwargs)
+            except Exception as e:
+                logger.warning(f"Backend ONNX no disponible ({e}); se usa torch")
+                self.backend = "torch"
+        if modelo is None:
+            modelo = SentenceTransformer(self.nombre_modelo, device="cpu")
+            if self.backend == "int8":
+                modelo = torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+        carga = time.monotonic() - inicio
+
+        inicio = time.monotonic()
+        modelo.encode(["calentamiento del modelo de embeddings"], convert_to_numpy=True)
+        calentamiento = time.monotonic() - inicio
+
+        logger.info(
+            f"Modelo de embeddings {self.nombre_modelo} ({self.backend}, {self.hilos} hilos): "
+            f"carga {carga:.2f}s, warm-up {calentamiento:.2f}s, pico RSS {_pico_rss_mb():.0f} MB"
+        )
+        return modelo
+
+    @property
+    def id_modelo(self) -> str:
+        """Id de los vectores que produce (refleja el fallback a torch una vez cargado)."""
+        from embedding_cache import id_modelo_embeddings
+        return id_modelo_embeddings(self.nombre_modelo, self.backend)
+
+    @property
+    def modelo(self):
+        if self._modelo is None:
+            with self._lock:
+                if self._modelo is None:
+                    self._modelo = self._cargar()
+        return self._modelo
+
+    # ------------------------------------------------------------------
+    # Encode
+    # ------------------------------------------------------------------
+
+    def encode(self, textos: list[str], batch_size: int = 64) -> np.ndarray:
+        """Vectores (n × 384) float32."""
+        if not textos:
+            return np.zeros((0, 384), dtype=np.float32)
+        vecs = self.modelo.encode(textos, convert_to_numpy=True, batch_size=batch_size)
+        return np.asarray(vecs, dtype=np.float32)
+
+    async def encode_async(self, textos: list[str], batch_size: int = 64) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.encode, textos, batch_size)
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_proveedor = None
+_proveedor_lock = threading.Lock()
+
+
+def _elegir_proveedor():
+    """Servicio fuera del proceso o modelo local según config.EMBEDDING_SERVICIO."""
+    from embedding_service import ClienteEmbeddings, lanzar_worker, servicio_disponible
+
+    modo = config.EMBEDDING_SERVICIO
+    if modo != "local":
+        if servicio_disponible():
+            logger.info(f"Embeddings vía servicio en {config.EMBED_SOCKET_PATH}")
+            return ClienteEmbeddings()
+        if modo == "proceso":
+            if lanzar_worker():
+                logger.info(f"Worker de embeddings lanzado en {config.EMBED_SOCKET_PATH}")
+                return ClienteEmbeddings()
+            logger.warning("El worker de embeddings no respondió a tiempo; se usa el modelo local")
+    return ProveedorEmbeddings()
+
+
+def get_proveedor_embeddings():
+    """ProveedorEmbeddings local o ClienteEmbeddings (misma interfaz: encode / encode_async)."""
+    global _proveedor
+    with _proveedor_lock:
+        if _proveedor is None:
+            _proveedor = _elegir_proveedor()
+    return _proveedor
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    proveedor = ProveedorEmbeddings()
+    print(f"  Cargado antes del primer encode: {proveedor.cargado}")
+    inicio = time.monotonic()
+    vecs = proveedor.encode(["Keiko Fujimori perfil presidencial 2026", "Debate presidencial JNE"] * 32)
+    print(f"  64 títulos en {time.monotonic() - inicio:.3f}s → {vecs.shape}")
+    print(f"[OK] Proveedor del proceso: {type(get_proveedor_embeddings()).__name__}")
@@ -0,0 +1,294 @@
+"""
+embedding_service.py — Servicio de embeddings fuera del proceso (socket Unix)
+
+Un proceso aparte carga el modelo una sola vez y atiende pedidos de encode
+por un socket Unix (config.EMBED_SOCKET_PATH). Los pedidos que llegan casi
+a la vez se agrupan en un micro-lote: se espera hasta
+config.EMBED_SERVICIO_ESPERA_MS o hasta juntar config.EMBED_SERVICIO_MAX_LOTE
+textos, y se corre un solo encode. Así el orquestador, el publisher y la API
+de revisión comparten un modelo y ninguno corre el encode en su event loop.
+
+Protocolo (una conexión por pedido):
+  pedido    : 4 bytes big-endian con el largo + JSON {"textos": [...]}
+  respuesta : 4 bytes + JSON {"n", "dim", "id_modelo"} o {"error"}, seguido de n·dim float32 LE
+
+id_modelo es el del modelo que el servicio cargó de verdad (si el backend
+pedido cayó a torch, lo refleja): el cliente lo expone para que los vectores
+no se guarden en la caché de otro backend.
+
+Modos (config.EMBEDDING_SERVICIO, usado por get_proveedor_embeddings):
+  local   : modelo en el propio proceso (encode_async usa un executor)
+  auto    : el servicio si ya está escuchando, si no local
+  proceso : siempre el servicio; si no está levantado, se lanza como worker
+
+Si el servicio deja de responder (socket eliminado, conexión rechazada o
+cortada), el cliente pasa a un ProveedorEmbeddings local para el resto del
+proceso en vez de fallar cada encode.
+
+Levantar a mano: python run.py --embeddings-server. El worker que lanza
+lanzar_worker vive lo que el proceso que lo lanzó: se termina al salir este
+(atexit) y, si muere sin salir limpio, el propio worker lo detecta y se cierra.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+from embedding_model import ProveedorEmbeddings
+
+logger = logging.getLogger(__name__)
+
+_LARGO = struct.Struct(">I")
+
+
+def _empaquetar(datos: dict) -> bytes:
+    cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+    return _LARGO.pack(len(cuerpo)) + cuerpo
+
+
+# ---------------------------------------------------------------------------
+# Servidor
+# ---------------------------------------------------------------------------
+
+class ServidorEmbeddings:
+
+    def __init__(self, proveedor: ProveedorEmbeddings | None = None, path: str | None = None):
+        self.proveedor = proveedor or ProveedorEmbeddings()
+        self.path = path or config.EMBED_SOCKET_PATH
+        self.max_lote = config.EMBED_SERVICIO_MAX_LOTE
+        self.espera = config.EMBED_SERVICIO_ESPERA_MS / 1000
+        self._cola: asyncio.Queue | None = None
+
+        # Métricas
+        self.pedidos = 0
+        self.lotes = 0
+        self.textos = 0
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            (largo,) = _LARGO.unpack(await reader.readexactly(_LARGO.size))
+            textos = json.loads(await reader.readexactly(largo))["textos"]
+            futuro = asyncio.get_running_loop().create_future()
+            await self._cola.put((textos, futuro))
+            try:
+                vecs = await futuro
+            except Exception as e:
+                writer.write(_empaquetar({"error": str(e)}))
+            else:
+                writer.write(_empaquetar({"n": len(vecs), "dim": vecs.shape[1], "id_modelo": self.proveedor.id_modelo}))
+                writer.write(np.ascontiguousarray(vecs, dtype="<f4").tobytes())
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, json.JSONDecodeError, KeyError) as e:
+            logger.debug(f"Pedido de embeddings inválido: {e}")
+        finally:
+            writer.close()
+
+    async def _agrupar(self):
+        """Junta pedidos concurrentes en un solo encode."""
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            total = len(lote[0][0])
+            limite = loop.time() + self.espera
+            while total < self.max_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self._cola.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+                total += len(lote[-1][0])
+
+            todos = [t for textos, _ in lote for t in textos]
+            try:
+                vecs = await self.proveedor.encode_async(todos)
+            except Exception as e:
+                logger.error(f"Error en encode del servicio: {e}")
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            inicio = 0
+            for textos, futuro in lote:
+                if not futuro.done():
+                    futuro.set_result(vecs[inicio:inicio + len(textos)])
+                inicio += len(textos)
+            self.pedidos += len(lote)
+            self.lotes += 1
+            self.textos += len(todos)
+            logger.debug(f"Micro-lote: {len(lote)} pedidos, {len(todos)} textos")
+
+    async def _vigilar_padre(self, padre: int, server: asyncio.AbstractServer):
+        """Cierra el servicio cuando muere el proceso que lo lanzó (pasa a ser hijo de otro)."""
+        while os.getppid() == padre:
+            await asyncio.sleep(2)
+        logger.info(f"Proceso padre {padre} terminado: se detiene el servicio")
+        server.close()
+
+    async def servir(self, padre: int | None = None):
+        self._cola = asyncio.Queue()
+        self.proveedor.modelo   # carga y warm-up antes de aceptar conexiones
+        Path(self.path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._atender, path=self.path)
+        os.chmod(self.path, 0o600)
+        agrupador = asyncio.create_task(self._agrupar())
+        vigia = asyncio.create_task(self._vigilar_padre(padre, server)) if padre else None
+        logger.info(f"Servicio de embeddings escuchando en {self.path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass   # server.close() desde _vigilar_padre
+        finally:
+            agrupador.cancel()
+            if vigia:
+                vigia.cancel()
+            Path(self.path).unlink(missing_ok=True)
+            logger.info(f"Servicio detenido: {self.pedidos} pedidos en {self.lotes} lotes ({self.textos} textos)")
+
+
+# ---------------------------------------------------------------------------
+# Cliente (misma interfaz que ProveedorEmbeddings)
+# ---------------------------------------------------------------------------
+
+class ClienteEmbeddings:
+
+    cargado = True
+
+    def __init__(self, path: str | None = None):
+        self.path = path or config.EMBED_SOCKET_PATH
+        self._local: ProveedorEmbeddings | None = None   # respaldo si el servicio se cae
+        self._id_servidor: str | None = None             # id_modelo informado por el servicio
+
+    @property
+    def backend(self) -> str:
+        return self._local.backend if self._local else "servicio"
+
+    @property
+    def id_modelo(self) -> str | None:
+        """Id de los vectores del último encode: el del servicio, o el local tras el respaldo (None antes del primero)."""
+        return self._local.id_modelo if self._local else self._id_servidor
+
+    def _respaldo(self, error: Exception) -> ProveedorEmbeddings:
+        if self._local is None:
+            logger.warning(
+                f"Servicio de embeddings en {self.path} no disponible ({type(error).__name__}: {error}); "
+                f"se usa el modelo local"
+            )
+            self._local = ProveedorEmbeddings()
+        return self._local
+
+    def _decodificar(self, cabecera: dict, cuerpo: bytes) -> np.ndarray:
+        if "error" in cabecera:
+            raise RuntimeError(f"Servicio de embeddings: {cabecera['error']}")
+        if len(cuerpo) != 4 * cabecera["n"] * cabecera["dim"]:
+            # El servicio murió a mitad de la respuesta
+            raise ConnectionError(f"respuesta incompleta ({len(cuerpo)} bytes)")
+        self._id_servidor = cabecera.get("id_modelo")
+        return np.frombuffer(cuerpo, dtype="<f4").reshape(cabecera["n"], cabecera["dim"]).astype(np.float32)
+
+    def encode(self, textos: list[str], batch_size: int = 64) -> np.ndarray:
+        if not textos:
+            return np.zeros((0, 384), dtype=np.float32)
+        if self._local is not None:
+            return self._local.encode(textos, batch_size)
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(self.path)
+                s.sendall(_empaquetar({"textos": textos}))
+                archivo = s.makefile("rb")
+                (largo,) = _LARGO.unpack(archivo.read(_LARGO.size))
+                cabecera = json.loads(archivo.read(largo))
+                cuerpo = archivo.read(4 * cabecera.get("n", 0) * cabecera.get("dim", 0))
+                return self._decodificar(cabecera, cuerpo)
+        except (OSError, struct.error, json.JSONDecodeError) as e:   # struct/json: conexión cortada a medias
+            return self._respaldo(e).encode(textos, batch_size)
+
+    async def encode_async(self, textos: list[str], batch_size: int = 64) -> np.ndarray:
+        if not textos:
+            return np.zeros((0, 384), dtype=np.float32)
+        if self._local is not None:
+            return await self._local.encode_async(textos, batch_size)
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+            try:
+                writer.write(_empaquetar({"textos": textos}))
+                await writer.drain()
+                (largo,) = _LARGO.unpack(await reader.readexactly(_LARGO.size))
+                cabecera = json.loads(await reader.readexactly(largo))
+                cuerpo = await reader.readexactly(4 * cabecera.get("n", 0) * cabecera.get("dim", 0))
+                return self._decodificar(cabecera, cuerpo)
+            finally:
+                writer.close()
+        except (OSError, asyncio.IncompleteReadError, json.JSONDecodeError) as e:
+            return await self._respaldo(e).encode_async(textos, batch_size)
+
+
+def servicio_disponible(path: str | None = None) -> bool:
+    path = path or config.EMBED_SOCKET_PATH
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(0.5)
+            s.connect(path)
+        return True
+    except OSError:
+        return False
+
+
+def _terminar_worker(worker: subprocess.Popen):
+    if worker.poll() is None:
+        worker.terminate()
+        try:
+            worker.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            worker.kill()
+
+
+def lanzar_worker(path: str | None = None) -> bool:
+    """
+    Lanza el servicio como proceso aparte y espera a que escuche. El worker
+    se termina cuando sale este proceso (o se cierra solo si este muere).
+    """
+    path = path or config.EMBED_SOCKET_PATH
+    worker = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve())],
+        cwd=str(Path(__file__).parent),
+        env={**os.environ, "EMBED_SOCKET_PATH": path, "EMBED_PADRE_PID": str(os.getpid())},
+        start_new_session=True,
+        stdout=subprocess.DEVNULL,
+    )
+    atexit.register(_terminar_worker, worker)
+    limite = time.monotonic() + config.EMBED_SERVICIO_ARRANQUE_SEG
+    while time.monotonic() < limite:
+        if servicio_disponible(path):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Punto de entrada del worker
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [embeddings] %(message)s")
+    signal.signal(signal.SIGTERM, signal.default_int_handler)   # terminate() → cierre limpio del socket
+    try:
+        padre = os.getenv("EMBED_PADRE_PID")
+        asyncio.run(ServidorEmbeddings().servir(int(padre) if padre else None))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,264 @@
+"""
+embedding_storage.py — Formato compacto y versionado de los embeddings en SQLite
+
+Cada fila de temas_publicados guarda el vector en `embedding` y su formato en
+`embedding_version`:
+
+  0 npy     : blob de np.save (formato original, 1664 bytes con cabecera)
+  1 float32 : 384 × float32 little-endian crudo (1536 bytes)
+  2 float16 : 384 × float16 little-endian crudo (768 bytes)
+  3 int8    : escala float32 + 384 × int8 (388 bytes), v ≈ escala · q
+
+Los vectores se L2-normalizan antes de cuantizar. Los blobs nuevos usan
+config.EMBEDDING_FORMATO; `python run.py --migrar-embeddings <formato>`
+convierte las filas existentes y muestra el impacto de cada nivel de
+cuantización sobre las similitudes, comparado con float32.
+
+Sidecar opcional (config.EMBED_SIDECAR): la matriz normalizada completa en
+un .npy que EmbeddingIndex.cargar abre con mmap, sin leer ni decodificar un
+blob por fila. Se valida con una firma (cantidad, slugs y última
+actualización) y se regenera cuando no coincide con la DB.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+VERSIONES = {"npy": 0, "float32": 1, "float16": 2, "int8": 3}
+FORMATOS = {v: k for k, v in VERSIONES.items()}
+
+_MAGIC_NPY = b"\x93NUMPY"
+
+
+def _normalizar(vecs: np.ndarray) -> np.ndarray:
+    vecs = np.asarray(vecs, dtype=np.float32)
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=-1, keepdims=True), 1e-12)
+
+
+# ---------------------------------------------------------------------------
+# Serialización por fila
+# ---------------------------------------------------------------------------
+
+def serializar(vec: np.ndarray, formato: str | None = None) -> tuple[bytes, int]:
+    """Retorna (blob, embedding_version) para guardar en temas_publicados."""
+    formato = formato or config.EMBEDDING_FORMATO
+    vec = _normalizar(vec).ravel()
+    if formato == "npy":
+        buf = io.BytesIO()
+        np.save(buf, vec)
+        blob = buf.getvalue()
+    elif formato == "float32":
+        blob = vec.astype("<f4").tobytes()
+    elif formato == "float16":
+        blob = vec.astype("<f2").tobytes()
+    elif formato == "int8":
+        escala = max(float(np.abs(vec).max()), 1e-12) / 127.0
+        q = np.clip(np.rint(vec / escala), -127, 127).astype(np.int8)
+        blob = np.float32(escala).astype("<f4").tobytes() + q.tobytes()
+    else:
+        raise ValueError(f"Formato de embedding desconocido: {formato}")
+    return blob, VERSIONES[formato]
+
+
+def deserializar(blob: bytes, version: int | None = None) -> np.ndarray:
+    """Vector float32 desde un blob de cualquier versión (None = np.save original)."""
+    if version is None or version == 0 or blob[:6] == _MAGIC_NPY:
+        return np.load(io.BytesIO(blob)).astype(np.float32, copy=False)
+    if version == 1:
+        return np.frombuffer(blob, dtype="<f4").astype(np.float32)
+    if version == 2:
+        return np.frombuffer(blob, dtype="<f2").astype(np.float32)
+    if version == 3:
+        escala = np.frombuffer(blob[:4], dtype="<f4")[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * escala
+    raise ValueError(f"Versión de embedding desconocida: {version}")
+
+
+def cuantizar_matriz(matriz: np.ndarray, formato: str) -> np.ndarray:
+    """Ida y vuelta vectorizada por un formato: lo que se leería de la DB."""
+    matriz = _normalizar(matriz)
+    if formato in ("npy", "float32"):
+        return matriz
+    if formato == "float16":
+        return matriz.astype(np.float16).astype(np.float32)
+    if formato == "int8":
+        escalas = np.maximum(np.abs(matriz).max(axis=1, keepdims=True), 1e-12) / 127.0
+        return np.clip(np.rint(matriz / escalas), -127, 127) * escalas
+    raise ValueError(f"Formato de embedding desconocido: {formato}")
+
+
+# ---------------------------------------------------------------------------
+# Precisión de cada nivel de cuantización
+# ---------------------------------------------------------------------------
+
+def evaluar_cuantizacion(matriz: np.ndarray, consultas: int = 500, k: int = 10, ruido: float = 0.05) -> dict:
+    """
+    Compara float16 e int8 contra float32 con consultas cercanas a temas
+    reales (tema + ruido): error de similitud coseno, coincidencia del mejor
+    vecino y recall@k. Retorna {formato: métricas}.
+    """
+    from ann_backend import top_k_exacto
+
+    matriz = _normalizar(matriz)
+    n = len(matriz)
+    if n == 0:
+        return {}
+    rng = np.random.default_rng(0)
+    muestra = rng.choice(n, size=min(consultas, n), replace=False)
+    vecs = _normalizar(matriz[muestra] + ruido * rng.standard_normal(matriz[muestra].shape).astype(np.float32))
+    k = min(k, n)
+    verdad, sims_verdad = top_k_exacto(matriz, vecs, k)
+
+    resultado = {}
+    for formato in ("float32", "float16", "int8"):
+        cuantizada = cuantizar_matriz(matriz, formato)
+        vecinos, _ = top_k_exacto(cuantizada, vecs, k)
+        # Similitud que vería el servicio para los mismos vecinos verdaderos
+        sims_q = np.einsum("qd,qkd->qk", vecs, cuantizada[verdad])
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(vecinos, verdad)])
+        resultado[formato] = {
+            "bytes_por_vector": len(serializar(matriz[0], formato)[0]),
+            "error_sim_max": round(float(np.abs(sims_q - sims_verdad).max()), 6),
+            "error_sim_medio": round(float(np.abs(sims_q - sims_verdad).mean()), 6),
+            "top1_igual": round(float(np.mean(vecinos[:, 0] == verdad[:, 0])), 4),
+            f"recall@{k}": round(float(recall), 4),
+        }
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Sidecar .npy con mmap
+# ---------------------------------------------------------------------------
+
+def firma_indice(slugs: list[str], ultima_actualizacion) -> str:
+    """Identifica el contenido de temas_publicados sin leer los blobs."""
+    h = hashlib.sha1("\n".join(slugs).encode("utf-8"))
+    h.update(f"|{len(slugs)}|{ultima_actualizacion}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _sidecar_paths() -> tuple[Path, Path]:
+    directorio = Path(config.ANN_DIR)
+    return directorio / "embeddings.npy", directorio / "embeddings_meta.json"
+
+
+def cargar_sidecar(firma: str, dimension: int) -> np.ndarray | None:
+    """Matriz mmap (copy-on-write) si el sidecar corresponde a `firma`, si no None."""
+    if not config.EMBED_SIDECAR:
+        return None
+    path, meta_path = _sidecar_paths()
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("firma") != firma:
+            return None
+        matriz = np.load(path, mmap_mode="c")
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return None
+    if matriz.ndim != 2 or matriz.shape[1] != dimension or matriz.dtype != np.float32:
+        return None
+    return matriz
+
+
+def guardar_sidecar(matriz: np.ndarray, firma: str):
+    """Escribe la matriz normalizada de forma atómica (tmp + rename), sin romper mmaps abiertos."""
+    if not config.EMBED_SIDECAR:
+        return
+    path, meta_path = _sidecar_paths()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npy")
+    np.save(tmp, np.ascontiguousarray(matriz, dtype=np.float32))
+    os.replace(tmp, path)
+    meta_path.write_text(json.dumps({"firma": firma, "n": len(matriz)}), encoding="utf-8")
+
+
+def invalidar_sidecar():
+    """Fuerza a la próxima carga a leer los blobs (p. ej. tras reescribirlos)."""
+    _sidecar_paths()[1].unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Migración de filas existentes
+# ---------------------------------------------------------------------------
+
+def migrar_embeddings(formato: str, lote: int = 1000) -> dict:
+    """
+    Reescribe todos los embeddings de temas_publicados en `formato`.
+    Antes de escribir mide la precisión de cada nivel sobre los vectores
+    actuales. Retorna {filas, bytes_antes, bytes_despues, segundos, precision}.
+    """
+    from revision_queue import SessionLocal, TemaPublicado, migrar_db
+
+    if formato not in VERSIONES:
+        raise ValueError(f"Formato de embedding desconocido: {formato}")
+    migrar_db()
+    inicio = time.monotonic()
+    db = SessionLocal()
+    try:
+        filas = (
+            db.query(TemaPublicado.id, TemaPublicado.embedding, TemaPublicado.embedding_version)
+            .filter(TemaPublicado.embedding.isnot(None))
+            .order_by(TemaPublicado.id)
+            .all()
+        )
+        if not filas:
+            return {"filas": 0, "bytes_antes": 0, "bytes_despues": 0, "segundos": 0.0, "precision": {}}
+        matriz = np.stack([deserializar(blob, version) for _, blob, version in filas])
+        precision = evaluar_cuantizacion(matriz)
+
+        bytes_antes = sum(len(blob) for _, blob, _ in filas)
+        bytes_despues = 0
+        for i in range(0, len(filas), lote):
+            cambios = []
+            for (id_, _, _), vec in zip(filas[i:i + lote], matriz[i:i + lote]):
+                blob, version = serializar(vec, formato)
+                bytes_despues += len(blob)
+                cambios.append({"id": id_, "embedding": blob, "embedding_version": version})
+            db.bulk_update_mappings(TemaPublicado, cambios)
+            db.commit()
+    finally:
+        db.close()
+    invalidar_sidecar()
+
+    resumen = {
+        "filas": len(filas),
+        "bytes_antes": bytes_antes,
+        "bytes_despues": bytes_despues,
+        "segundos": round(time.monotonic() - inicio, 2),
+        "precision": precision,
+    }
+    logger.info(
+        f"Embeddings migrados a {formato}: {len(filas)} filas, "
+        f"{bytes_antes / 1e6:.1f} MB → {bytes_despues / 1e6:.1f} MB"
+    )
+    return resumen
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    rng = np.random.default_rng(1)
+    vec = rng.standard_normal(384).astype(np.float32)
+    for formato in VERSIONES:
+        blob, version = serializar(vec, formato)
+        error = np.abs(deserializar(blob, version) - _normalizar(vec)).max()
+        print(f"  {formato:<8} v{version}: {len(blob):>5} bytes, error máx {error:.2e}")
+
+    centros = rng.standard_normal((500, 384)).astype(np.float32)
+    matriz = centros[rng.integers(0, 500, 20_000)] + 0.5 * rng.standard_normal((20_000, 384)).astype(np.float32)
+    for formato, metricas in evaluar_cuantizacion(matriz).items():
+        print(f"  {formato:<8} {metricas}")
+    print("[OK]")
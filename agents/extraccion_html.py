@@ -0,0 +1,318 @@
+"""
+extraccion_html.py — Extracción de HTML de la ingesta fuera del event loop
+
+El parseo de cada artículo (y de la página de tag de Infobae) es CPU puro:
+hecho en el event loop bloquea todas las demás descargas. Aquí se hace con
+lxml en un pool de procesos (config.EXTRACCION_PROCESOS; 0 = un hilo, para
+entornos sin fork/spawn) y:
+
+  - El texto se corta apenas se juntan MAX_CONTENT_CHARS caracteres, sin
+    recorrer el resto del bloque.
+  - Los selectores específicos (clases del cuerpo de la nota) se prueban en
+    el orden que mejor funcionó para ese medio (RegistroSelectores, tasa de
+    acierto por host en SQLite); sin historial, en el orden por defecto. Los
+    genéricos (article, main) van siempre al final y en orden fijo: casi
+    siempre devuelven texto aunque arrastren "Lee también" y relacionados,
+    así que su tasa de acierto no dice nada de la calidad.
+  - Cada página reporta su tiempo de parseo; ExtractorHTML.resumen() da
+    páginas, promedio, p95, máximo y la URL más lenta.
+
+Uso (también como `async with`):
+  with ExtractorHTML() as extractor:
+      contenido = await extractor.contenido(url, html)
+      noticias  = await extractor.infobae_tag(html)
+"""
+
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+import lxml.html
+from lxml import etree
+
+import config
+
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_CHARS = 3000  # máximo de caracteres del contenido completo a extraer
+
+# Selectores por orden de prioridad (cubren RPP, El Comercio, Infobae, etc.).
+# Nombre CSS (para el registro y los logs) → XPath equivalente (lxml sin cssselect).
+SELECTORES: dict[str, str] = {
+    '[class*="article-body"]':    '//*[contains(@class, "article-body")]',
+    '[class*="content-body"]':    '//*[contains(@class, "content-body")]',
+    '[class*="story-body"]':      '//*[contains(@class, "story-body")]',
+    '[class*="nota-cuerpo"]':     '//*[contains(@class, "nota-cuerpo")]',
+    '[class*="entry-content"]':   '//*[contains(@class, "entry-content")]',
+    '[class*="article__body"]':   '//*[contains(@class, "article__body")]',
+    "article":                    "//article",
+    "main":                       "//main",
+}
+# Contenedores amplios: siempre después de los específicos y sin reordenar
+GENERICOS = ("article", "main")
+
+# Scripts, estilos, navs, footers, publicidad
+_RUIDO = ("script", "style", "nav", "footer", "header", "aside", "figure", "iframe", "form", "button")
+
+_TARJETAS_INFOBAE = (
+    "//article"
+    " | //*[contains(@class, 'story-card')]"
+    " | //*[contains(@class, 'article-card')]"
+    " | //*[contains(@class, 'feed-list-card')]"
+)
+
+
+def _limpiar_texto(texto: str) -> str:
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def _parsear(html: str):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # lxml no acepta str con declaración de encoding
+        return lxml.html.document_fromstring(html.encode("utf-8"))
+
+
+def _parrafos(nodos, minimo: int, max_parrafos: int | None = None) -> str:
+    """Junta el texto de los nodos de más de `minimo` caracteres, cortando al llegar a MAX_CONTENT_CHARS."""
+    partes, total = [], 0
+    for nodo in nodos:
+        texto = _limpiar_texto(" ".join(nodo.itertext()))
+        if len(texto) <= minimo:
+            continue
+        partes.append(texto)
+        total += len(texto) + 1
+        if total >= MAX_CONTENT_CHARS or (max_parrafos and len(partes) >= max_parrafos):
+            break
+    return " ".join(partes)[:MAX_CONTENT_CHARS]
+
+
+# ---------------------------------------------------------------------------
+# Funciones del worker (top-level para poder enviarlas al pool de procesos)
+# ---------------------------------------------------------------------------
+
+def extraer_contenido(html: str, orden: list[str] | None = None) -> dict:
+    """
+    Extrae el texto principal de un artículo HTML probando los selectores en
+    `orden`. Retorna {"contenido", "selector" (None si cayó al fallback),
+    "fallidos" (selectores probados sin resultado), "ms"}.
+    """
+    inicio = time.perf_counter()
+    doc = _parsear(html)
+    etree.strip_elements(doc, *_RUIDO, with_tail=False)
+
+    fallidos = []
+    for nombre in orden or SELECTORES:
+        bloques = doc.xpath(SELECTORES[nombre])
+        if bloques:
+            texto = _parrafos(bloques[0].iter("p", "h2", "h3"), minimo=40)
+            if texto:
+                return {"contenido": texto, "selector": nombre, "fallidos": fallidos,
+                        "ms": (time.perf_counter() - inicio) * 1000}
+        fallidos.append(nombre)
+
+    # Fallback: todos los párrafos de la página
+    texto = _parrafos(doc.iter("p"), minimo=50, max_parrafos=15)
+    return {"contenido": texto, "selector": None, "fallidos": fallidos,
+            "ms": (time.perf_counter() - inicio) * 1000}
+
+
+def scrape_infobae_tag(html: str) -> dict:
+    """Extrae artículos de la página de tag de Infobae. Retorna {"noticias", "ms"}."""
+    inicio = time.perf_counter()
+    doc = _parsear(html)
+    noticias = []
+
+    def _noticia(titulo: str, url: str, fecha: str) -> dict:
+        if not url.startswith("http"):
+            url = "https://www.infobae.com" + url
+        return {
+            "titulo": titulo,
+            "resumen": "",
+            "contenido_completo": "",
+            "fecha": fecha,
+            "url": url,
+            "fuente": "Infobae Peru 2026",
+        }
+
+    # Infobae usa tarjetas de artículo con estos selectores
+    tarjetas = doc.xpath(_TARJETAS_INFOBAE)
+
+    if not tarjetas:
+        # Fallback: todos los <a> con href que contengan /peru/ (cubre /america/peru/)
+        for link in doc.xpath("//a[contains(@href, '/peru/')]")[:20]:
+            titulo = _limpiar_texto(link.text_content())
+            url = link.get("href", "")
+            if len(titulo) > 20 and url:
+                noticias.append(_noticia(titulo, url, ""))
+        return {"noticias": noticias[:15], "ms": (time.perf_counter() - inicio) * 1000}
+
+    for tarjeta in tarjetas[:20]:
+        titulo_tag = tarjeta.xpath(".//*[self::h2 or self::h3 or self::h4]")
+        link_tag   = tarjeta.xpath(".//a[@href]")
+        fecha_tag  = tarjeta.xpath(".//time")
+
+        titulo = _limpiar_texto(titulo_tag[0].text_content()) if titulo_tag else ""
+        url    = link_tag[0].get("href")                      if link_tag   else ""
+        fecha  = _limpiar_texto(fecha_tag[0].text_content())  if fecha_tag  else ""
+
+        if titulo and len(titulo) > 15:
+            noticias.append(_noticia(titulo, url, fecha))
+
+    return {"noticias": noticias, "ms": (time.perf_counter() - inicio) * 1000}
+
+
+# ---------------------------------------------------------------------------
+# Registro de selectores por medio
+# ---------------------------------------------------------------------------
+
+class RegistroSelectores:
+    """Aciertos e intentos de cada selector por host; ordena los selectores por tasa de acierto."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or config.SELECTORES_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS selectores (
+                host      TEXT NOT NULL,
+                selector  TEXT NOT NULL,
+                intentos  INTEGER NOT NULL DEFAULT 0,
+                aciertos  INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (host, selector)
+            )
+        """)
+        self._conn.commit()
+
+    def orden(self, host: str) -> list[str]:
+        """
+        Selectores específicos del host de mayor a menor tasa de acierto
+        (suavizada; empata al orden por defecto), seguidos de GENERICOS.
+        """
+        with self._lock:
+            tasas = {
+                selector: (aciertos + 1) / (intentos + 2)
+                for selector, intentos, aciertos in self._conn.execute(
+                    "SELECT selector, intentos, aciertos FROM selectores WHERE host = ?", (host,)
+                )
+            }
+        especificos = [s for s in SELECTORES if s not in GENERICOS]
+        return sorted(especificos, key=lambda s: (-tasas.get(s, 0.5), especificos.index(s))) + list(GENERICOS)
+
+    def registrar(self, host: str, selector: str | None, fallidos: list[str]):
+        filas = [(host, s, 0) for s in fallidos] + ([(host, selector, 1)] if selector else [])
+        if not filas:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO selectores (host, selector, intentos, aciertos) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(host, selector) DO UPDATE SET intentos = intentos + 1, "
+                "aciertos = aciertos + excluded.aciertos",
+                filas,
+            )
+            self._conn.commit()
+
+    def resumen(self) -> dict[str, dict]:
+        """{host: {selector, tasa}} con el mejor selector de cada medio."""
+        mejores = {}
+        with self._lock:
+            for host, selector, intentos, aciertos in self._conn.execute(
+                "SELECT host, selector, intentos, aciertos FROM selectores WHERE aciertos > 0 "
+                "ORDER BY host, CAST(aciertos AS REAL) / intentos"
+            ):
+                mejores[host] = {"selector": selector, "tasa": round(aciertos / intentos, 3)}
+        return mejores
+
+
+# ---------------------------------------------------------------------------
+# Extractor (pool + registro + métricas)
+# ---------------------------------------------------------------------------
+
+class ExtractorHTML:
+
+    def __init__(self, procesos: int | None = None, registro: RegistroSelectores | None = None):
+        self.procesos = config.EXTRACCION_PROCESOS if procesos is None else procesos
+        self.registro = registro or RegistroSelectores()
+        if self.procesos > 0:
+            # spawn: el proceso padre puede tener hilos (SQLite, torch) y fork no es seguro
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="extraccion")
+        self._tiempos: list[tuple[float, str]] = []   # (ms, url) por página
+
+    def __enter__(self) -> "ExtractorHTML":
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self) -> "ExtractorHTML":
+        return self
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+    async def _ejecutar(self, funcion, *args) -> dict:
+        return await asyncio.get_running_loop().run_in_executor(self._pool, funcion, *args)
+
+    async def contenido(self, url: str, html: str) -> str:
+        """Texto principal del artículo, probando primero los selectores que mejor funcionan en su medio."""
+        host = urlsplit(url).hostname or ""
+        r = await self._ejecutar(extraer_contenido, html, self.registro.orden(host))
+        self.registro.registrar(host, r["selector"], r["fallidos"])
+        self._tiempos.append((r["ms"], url))
+        logger.debug(f"Extracción {url}: {r['ms']:.1f} ms, selector {r['selector'] or 'fallback'}")
+        return r["contenido"]
+
+    async def infobae_tag(self, html: str) -> list[dict]:
+        r = await self._ejecutar(scrape_infobae_tag, html)
+        self._tiempos.append((r["ms"], "infobae_tag"))
+        return r["noticias"]
+
+    def resumen(self) -> dict:
+        """{paginas, ms_medio, ms_p95, ms_max, mas_lenta} del parseo en este run."""
+        if not self._tiempos:
+            return {"paginas": 0, "ms_medio": 0.0, "ms_p95": 0.0, "ms_max": 0.0, "mas_lenta": None}
+        ordenados = sorted(self._tiempos)
+        ms = [t for t, _ in ordenados]
+        return {
+            "paginas": len(ms),
+            "ms_medio": round(sum(ms) / len(ms), 1),
+            "ms_p95": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 1),
+            "ms_max": round(ms[-1], 1),
+            "mas_lenta": ordenados[-1][1],
+        }
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    parrafo = "<p>El Jurado Nacional de Elecciones publicó la lista de fórmulas presidenciales admitidas.</p>"
+    html = (
+        "<html><head><script>var x = 1;</script></head><body><nav>Menú</nav>"
+        f"<div class='nota-cuerpo'>{parrafo * 80}</div><footer>Pie</footer></body></html>"
+    )
+
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp, \
+                ExtractorHTML(procesos=2, registro=RegistroSelectores(f"{tmp}/sel.db")) as extractor:
+            for i in range(5):
+                texto = await extractor.contenido(f"https://elcomercio.pe/n{i}", html)
+            print(f"  Contenido: {len(texto)} caracteres")
+            print(f"  Orden aprendido: {extractor.registro.orden('elcomercio.pe')[:2]}")
+            print(f"  Registro: {extractor.registro.resumen()}")
+            print(f"[OK] {extractor.resumen()}")
+
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+"""
+feed_cache.py — Caché HTTP condicional de los feeds RSS (SQLite)
+
+Por cada URL de feed se guardan el ETag y el Last-Modified de la última
+respuesta 200, junto con los ítems ya parseados (sin filtrar: el filtro
+electoral se aplica al servirlos, así un cambio de filtro o de candidatos
+vale también para feeds sin cambios) y el tamaño del cuerpo. El siguiente
+fetch manda If-None-Match / If-Modified-Since; si el medio responde 304 se
+reutilizan los ítems guardados sin descargar ni parsear el XML.
+
+Las filas guardadas antes de este formato (ítems ya filtrados) no mandan
+cabeceras condicionales: se descargan completas una vez y se reescriben.
+
+Las métricas por feed (consultas, 304 y bytes ahorrados) se acumulan en la
+tabla y además se cuentan por run, para el resumen de la ingesta.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class FeedCache:
+
+    def __init__(self, path: str | None = None):
+        self.path = path or config.FEED_CACHE_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS feeds (
+                url             TEXT PRIMARY KEY,
+                etag            TEXT,
+                last_modified   TEXT,
+                noticias_json   TEXT NOT NULL,
+                bytes           INTEGER NOT NULL,
+                actualizado     REAL NOT NULL,
+                consultas       INTEGER NOT NULL DEFAULT 0,
+                hits            INTEGER NOT NULL DEFAULT 0,
+                bytes_ahorrados INTEGER NOT NULL DEFAULT 0,
+                sin_filtrar     INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        columnas = {fila[1] for fila in self._conn.execute("PRAGMA table_info(feeds)")}
+        if "sin_filtrar" not in columnas:
+            # Tabla previa: sus ítems ya venían filtrados
+            self._conn.execute("ALTER TABLE feeds ADD COLUMN sin_filtrar INTEGER NOT NULL DEFAULT 0")
+        self._conn.commit()
+        self.run: dict[str, dict] = {}   # métricas de este run por nombre de feed
+
+    # ------------------------------------------------------------------
+    # Petición condicional
+    # ------------------------------------------------------------------
+
+    def cabeceras(self, url: str) -> dict[str, str]:
+        """Cabeceras condicionales para la URL (vacío si nunca se descargó o la fila es del formato previo)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM feeds WHERE url = ? AND sin_filtrar = 1", (url,)
+            ).fetchone()
+        if row is None:
+            return {}
+        cabeceras = {}
+        if row[0]:
+            cabeceras["If-None-Match"] = row[0]
+        if row[1]:
+            cabeceras["If-Modified-Since"] = row[1]
+        return cabeceras
+
+    def no_modificado(self, nombre: str, url: str) -> list[dict] | None:
+        """Respuesta 304: retorna los ítems guardados (sin filtrar) y registra el hit."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT noticias_json, bytes FROM feeds WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE feeds SET consultas = consultas + 1, hits = hits + 1, "
+                "bytes_ahorrados = bytes_ahorrados + ? WHERE url = ?",
+                (row[1], url),
+            )
+            self._conn.commit()
+        self.run[nombre] = {"estado": 304, "bytes_ahorrados": row[1]}
+        return json.loads(row[0])
+
+    def guardar(self, nombre: str, url: str, etag: str | None, last_modified: str | None,
+                noticias: list[dict], bytes_cuerpo: int):
+        """Respuesta 200: guarda validadores y los ítems parseados, antes del filtro electoral."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO feeds (url, etag, last_modified, noticias_json, bytes, actualizado, consultas, sin_filtrar) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1, 1) "
+                "ON CONFLICT(url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified, "
+                "noticias_json = excluded.noticias_json, bytes = excluded.bytes, "
+                "actualizado = excluded.actualizado, consultas = feeds.consultas + 1, sin_filtrar = 1",
+                (url, etag, last_modified, json.dumps(noticias, ensure_ascii=False), bytes_cuerpo, time.time()),
+            )
+            self._conn.commit()
+        self.run[nombre] = {"estado": 200, "bytes_ahorrados": 0}
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def resumen(self, fuentes: list[dict]) -> dict[str, dict]:
+        """{feed: {estado, bytes_ahorrados, hit_rate, bytes_ahorrados_total}} para el resumen de ingesta."""
+        with self._lock:
+            filas = {
+                url: (consultas, hits, ahorrados)
+                for url, consultas, hits, ahorrados in self._conn.execute(
+                    "SELECT url, consultas, hits, bytes_ahorrados FROM feeds"
+                )
+            }
+        resumen = {}
+        for src in fuentes:
+            consultas, hits, ahorrados = filas.get(src["url"], (0, 0, 0))
+            resumen[src["nombre"]] = {
+                **self.run.get(src["nombre"], {"estado": None, "bytes_ahorrados": 0}),
+                "hit_rate": round(hits / consultas, 3) if consultas else 0.0,
+                "bytes_ahorrados_total": ahorrados,
+            }
+        return resumen
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = FeedCache(path=f"{tmp}/feeds.db")
+        url = "https://rpp.pe/rss"
+        print(f"  Primera vez: {cache.cabeceras(url)}")
+        cache.guardar("RPP", url, '"abc"', "Sat, 17 Oct 2026 10:00:00 GMT", [{"titulo": "JNE"}], 52_000)
+        print(f"  Condicional: {cache.cabeceras(url)}")
+        print(f"  304 → {cache.no_modificado('RPP', url)}")
+        print(f"[OK] {cache.resumen([{'nombre': 'RPP', 'url': url}])}")
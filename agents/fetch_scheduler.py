@@ -0,0 +1,172 @@
+"""
+fetch_scheduler.py — Descargas de la ingesta con límites por host y reintentos
+
+Envuelve un único httpx.AsyncClient (HTTP/2 si el paquete h2 está instalado,
+pool de conexiones acotado) y agrega:
+
+  - Concurrencia máxima por host (config.INGESTA_MAX_POR_HOST, con
+    excepciones en config.INGESTA_HOSTS): un medio lento no acapara el pool
+    ni recibe ráfagas de pedidos.
+  - Reintentos acotados con backoff exponencial y jitter ante 5xx, timeouts
+    y errores de conexión.
+  - Plazo global para toda la fase de ingesta (config.INGESTA_PLAZO_SEG): el
+    timeout de cada pedido se recorta al tiempo restante y, vencido el plazo,
+    los pedidos pendientes fallan de inmediato con PlazoVencido.
+
+Uso:
+  async with ProgramadorFetch() as client:
+      resp = await client.get(url, headers=HEADERS, timeout=15.0)
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class PlazoVencido(Exception):
+    """Se agotó el plazo global de la ingesta."""
+
+
+def _http2_disponible() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ProgramadorFetch:
+
+    def __init__(self, plazo_seg: float | None = None):
+        self.plazo_seg = plazo_seg if plazo_seg is not None else config.INGESTA_PLAZO_SEG
+        self.http2 = _http2_disponible()
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=config.INGESTA_CONCURRENCIA,
+                max_keepalive_connections=config.INGESTA_CONCURRENCIA,
+            ),
+        )
+        self._semaforos: dict[str, asyncio.Semaphore] = {}
+        self._limite = time.monotonic() + self.plazo_seg
+
+        # Métricas por host
+        self.stats: dict[str, dict] = defaultdict(
+            lambda: {"pedidos": 0, "reintentos": 0, "errores": 0, "segundos": 0.0}
+        )
+
+    async def __aenter__(self) -> "ProgramadorFetch":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    # ------------------------------------------------------------------
+    # Política por host
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _politica(host: str) -> dict:
+        return {
+            "concurrencia": config.INGESTA_MAX_POR_HOST,
+            "reintentos": config.INGESTA_REINTENTOS,
+            **config.INGESTA_HOSTS.get(host, {}),
+        }
+
+    def _semaforo(self, host: str) -> asyncio.Semaphore:
+        if host not in self._semaforos:
+            self._semaforos[host] = asyncio.Semaphore(self._politica(host)["concurrencia"])
+        return self._semaforos[host]
+
+    @property
+    def restante(self) -> float:
+        return self._limite - time.monotonic()
+
+    # ------------------------------------------------------------------
+    # GET
+    # ------------------------------------------------------------------
+
+    async def get(self, url: str, timeout: float = 15.0, **kwargs) -> httpx.Response:
+        """
+        GET con la política del host. Devuelve la última respuesta (aunque sea
+        5xx) o relanza la última excepción si todos los intentos fallaron.
+        """
+        host = urlsplit(url).hostname or ""
+        politica = self._politica(host)
+        timeout = politica.get("timeout", timeout)
+        kwargs.pop("follow_redirects", None)
+        stats = self.stats[host]
+
+        async with self._semaforo(host):
+            for intento in range(politica["reintentos"] + 1):
+                restante = self.restante
+                if restante <= 0:
+                    stats["errores"] += 1
+                    raise PlazoVencido(f"plazo de ingesta vencido antes de pedir {url}")
+                if intento:
+                    stats["reintentos"] += 1
+
+                inicio = time.monotonic()
+                try:
+                    stats["pedidos"] += 1
+                    # wait_for además del timeout de httpx: corta también la espera del pool
+                    limite = min(timeout, restante)
+                    resp = await asyncio.wait_for(self._client.get(url, timeout=limite, **kwargs), limite)
+                except (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError):
+                    stats["segundos"] += time.monotonic() - inicio
+                    if intento == politica["reintentos"] or self.restante <= 0:
+                        stats["errores"] += 1
+                        raise
+                else:
+                    stats["segundos"] += time.monotonic() - inicio
+                    if resp.status_code < 500 or intento == politica["reintentos"]:
+                        if resp.status_code >= 500:
+                            stats["errores"] += 1
+                        return resp
+
+                # Backoff exponencial con jitter, sin pasarse del plazo
+                espera = min(config.INGESTA_BACKOFF_BASE_SEG * 2 ** intento, config.INGESTA_BACKOFF_MAX_SEG)
+                await asyncio.sleep(min(espera * random.uniform(0.5, 1.5), max(self.restante, 0)))
+
+    def resumen(self) -> dict[str, dict]:
+        return {
+            host: {**s, "segundos": round(s["segundos"], 2)}
+            for host, s in sorted(self.stats.items(), key=lambda kv: -kv[1]["segundos"])
+        }
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    config.INGESTA_BACKOFF_BASE_SEG = 0.01
+    fallos = defaultdict(int)
+
+    def responder(request: httpx.Request) -> httpx.Response:
+        fallos[request.url.path] += 1
+        if request.url.path == "/inestable" and fallos["/inestable"] < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, text="ok")
+
+    async def main():
+        async with ProgramadorFetch(plazo_seg=5) as client:
+            client._client = httpx.AsyncClient(transport=httpx.MockTransport(responder))
+            resp = await client.get("https://rpp.pe/inestable")
+            print(f"  /inestable → {resp.status_code} tras {fallos['/inestable']} intentos")
+            await asyncio.gather(*[client.get(f"https://rpp.pe/n{i}") for i in range(10)])
+            print(f"  HTTP/2: {client.http2}")
+            print(f"[OK] {client.resumen()}")
+
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+"""
+filtro_electoral.py — Filtro y relevancia electoral de noticias por palabras clave
+
+Compila en UNA sola regex todas las palabras clave electorales y todos los
+aliases de candidatos y partidos de agents/data/candidatos.json, sobre texto
+plegado (minúsculas sin tildes): "acuña" y "acuna", "inscripción" e
+"inscripcion" coinciden igual.
+
+Las alternativas se arman como un trie (prefijos comunes factorizados), así la
+regex no prueba miles de alternativas en cada posición y escala a miles de
+términos. Dos clases de término:
+
+  - palabras clave (FILTROS_ELECTORALES): coinciden en cualquier parte del
+    texto, como el filtro por subcadena original ("candidato" en
+    "precandidatos", "electoral" en "postelectoral", "2026" en "EG2026")
+  - aliases de candidatos y partidos: palabra completa, la más larga gana
+    ("keiko fujimori" antes que "fujimori")
+
+evaluar() retorna la relevancia y las coincidencias (nombre del candidato o
+partido, o la palabra clave), para ordenar las noticias en vez de solo
+incluirlas o descartarlas.
+"""
+
+import json
+import logging
+import re
+from pathlib import Path
+
+from texto import plegar
+
+logger = logging.getLogger(__name__)
+
+CANDIDATOS_JSON = Path(__file__).parent / "data" / "candidatos.json"
+
+FILTROS_ELECTORALES = [
+    "candidato", "elecciones", "jne", "2026", "presidente",
+    "congreso", "partido", "voto", "electoral", "campaña",
+    "debate", "primera vuelta", "segunda vuelta", "keiko",
+    "lopez aliaga", "acuña", "fujimori", "onpe", "ballotage",
+    "inscripcion", "plancha", "formula presidencial",
+]
+
+# Peso por tipo de término; las coincidencias en el título cuentan doble
+PESOS = {"candidato": 3.0, "partido": 2.0, "clave": 1.0}
+FACTOR_TITULO = 2.0
+
+
+def _patron_trie(terminos: list[str]) -> str:
+    """Regex equivalente a la alternancia de `terminos`, factorizada como trie (más largo primero)."""
+    trie: dict = {}
+    for termino in terminos:
+        nodo = trie
+        for c in termino:
+            nodo = nodo.setdefault(c, {})
+        nodo[""] = True
+
+    def _armar(nodo: dict) -> str:
+        final = "" in nodo
+        ramas = [re.escape(c) + _armar(hijo) for c, hijo in sorted(nodo.items()) if c]
+        if not ramas:
+            return ""
+        cuerpo = ramas[0] if len(ramas) == 1 else "(?:" + "|".join(ramas) + ")"
+        if final:
+            return f"(?:{cuerpo})?" if len(ramas) > 1 or len(ramas[0]) > 1 else cuerpo + "?"
+        return cuerpo
+
+    return _armar(trie)
+
+
+class FiltroElectoral:
+
+    def __init__(self, claves: list[str] | None = None, candidatos: list[dict] | None = None):
+        # término plegado → (etiqueta, tipo)
+        self.aliases: dict[str, tuple[str, str]] = {}
+        self.claves: dict[str, tuple[str, str]] = {}
+
+        for clave in FILTROS_ELECTORALES if claves is None else claves:
+            self.claves[plegar(clave)] = (clave, "clave")
+        for c in self._cargar_candidatos() if candidatos is None else candidatos:
+            self._registrar(c.get("nombre", ""), "candidato")
+            self._registrar(c.get("partido", ""), "partido")
+
+        # Una sola regex: primero aliases (palabra completa), luego claves (subcadena).
+        # Una clave igual a un alias ("lopez aliaga") queda como respaldo dentro de palabras
+        partes = []
+        if self.aliases:
+            partes.append(rf"\b(?P<alias>{_patron_trie(list(self.aliases))})\b")
+        if self.claves:
+            partes.append(rf"(?P<clave>{_patron_trie(list(self.claves))})")
+        self._re = re.compile("|".join(partes)) if partes else None
+
+    @staticmethod
+    def _cargar_candidatos() -> list[dict]:
+        try:
+            with open(CANDIDATOS_JSON, encoding="utf-8") as f:
+                return json.load(f).get("candidatos", [])
+        except Exception as e:
+            logger.warning(f"Filtro electoral: no se pudo leer {CANDIDATOS_JSON.name}: {e}")
+            return []
+
+    def _registrar(self, nombre: str, tipo: str):
+        nombre = nombre.strip()
+        if not nombre:
+            return
+        tokens = nombre.split()
+        aliases = {nombre}
+        if tipo == "candidato" and len(tokens) >= 3:
+            aliases.add(" ".join(tokens[:2]))        # "Alfonso López"
+            aliases.add(" ".join(tokens[1:3]))       # "López Chau"
+        for alias in aliases:
+            clave = plegar(alias)
+            previo = self.aliases.get(clave)
+            if previo is not None and previo[0] != nombre:
+                # Alias compartido: se mantiene el de mayor peso, con la etiqueta genérica
+                tipo_final = max(previo[1], tipo, key=PESOS.get)
+                self.aliases[clave] = (alias, tipo_final)
+                continue
+            self.aliases[clave] = (nombre, tipo)
+
+    def __len__(self) -> int:
+        return len(self.aliases) + len(self.claves)
+
+    def coincidencias(self, texto: str) -> dict[str, str]:
+        """{etiqueta: tipo} de los términos presentes en el texto, en orden de aparición."""
+        if self._re is None or not texto:
+            return {}
+        encontrados = {}
+        for m in self._re.finditer(plegar(texto)):
+            etiqueta, tipo = (self.aliases[m["alias"]] if m["alias"] is not None
+                              else self.claves[m["clave"]])
+            encontrados.setdefault(etiqueta, tipo)
+        return encontrados
+
+    def evaluar(self, titulo: str, texto: str = "") -> tuple[float, list[str]]:
+        """
+        (relevancia, coincidencias). La relevancia suma el peso de cada término
+        distinto (candidato > partido > palabra clave), doble si está en el
+        título. 0 = no es noticia electoral.
+        """
+        en_titulo = self.coincidencias(titulo)
+        en_texto = self.coincidencias(texto)
+        relevancia = sum(PESOS[t] * FACTOR_TITULO for t in en_titulo.values()) + sum(
+            PESOS[t] for e, t in en_texto.items() if e not in en_titulo
+        )
+        return relevancia, list({**en_titulo, **en_texto})
+
+    def es_electoral(self, titulo: str, texto: str = "") -> bool:
+        return self._re is not None and (
+            self._re.search(plegar(titulo)) is not None or self._re.search(plegar(texto)) is not None
+        )
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_filtro: FiltroElectoral | None = None
+
+
+def get_filtro_electoral() -> FiltroElectoral:
+    global _filtro
+    if _filtro is None:
+        _filtro = FiltroElectoral()
+        logger.debug(f"Filtro electoral: {len(_filtro)} términos compilados")
+    return _filtro
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import random
+    import time
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    filtro = get_filtro_electoral()
+    print(f"  {len(filtro)} términos")
+    for titulo in [
+        "César Acuna cierra la inscripcion de su plancha",
+        "Keiko Fujimori encabeza encuesta; López Aliaga segundo",
+        "Renovación Popular presenta candidatos al Senado",
+        "Precio del dólar cierra a la baja",
+    ]:
+        print(f"  {filtro.evaluar(titulo)}  ← {titulo}")
+
+    rng = random.Random(0)
+    letras = "abcdefghijklmnopqrstuvwxyz"
+    nombres = [{"nombre": " ".join("".join(rng.choices(letras, k=rng.randint(4, 9))) for _ in range(3)),
+                "partido": "partido " + "".join(rng.choices(letras, k=8))} for _ in range(2_000)]
+    grande = FiltroElectoral(candidatos=nombres)
+    texto = " ".join("".join(rng.choices(letras, k=rng.randint(2, 10))) for _ in range(5_000)) + " " + nombres[-1]["nombre"]
+    inicio = time.perf_counter()
+    relevancia, encontrados = grande.evaluar("", texto)
+    print(f"[OK] {len(grande)} términos, texto de {len(texto)} caracteres en "
+          f"{1000 * (time.perf_counter() - inicio):.1f} ms → {encontrados[-1:]}")
@@ -10,6 +10,19 @@ Fuentes por scraping directo:
 Para cada noticia: extrae título + resumen del RSS, luego
 intenta leer el contenido completo del artículo original.
 
+Los feeds se piden con GET condicional (ETag / Last-Modified, feed_cache.py):
+un 304 reutiliza las noticias del último fetch sin parsear el XML. El
+contenido completo de cada artículo se guarda por URL (url_store.py) y solo
+se descargan las URLs nuevas o vencidas.
+
+Todas las descargas pasan por fetch_scheduler.py: límite de conexiones por
+host, HTTP/2 si está disponible, reintentos con jitter y un plazo global.
+El parseo del HTML de artículos y páginas de tag se hace con lxml en un pool
+de procesos (extraccion_html.py), fuera del event loop.
+
+Las noticias se filtran y ordenan por relevancia electoral (filtro_electoral.py:
+palabras clave y aliases de candidatos y partidos, con o sin tildes).
+
 NUNCA crashea por fallo de una fuente individual.
 """
 
@@ -21,9 +34,14 @@ from datetime import datetime
 from pathlib import Path
 from typing import Any
 
-import httpx
 from bs4 import BeautifulSoup
 
+from extraccion_html import ExtractorHTML
+from feed_cache import FeedCache
+from filtro_electoral import get_filtro_electoral
+from fetch_scheduler import ProgramadorFetch
+from url_store import URLStore
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -49,14 +67,6 @@ SCRAPING_SOURCES = [
     },
 ]
 
-FILTROS_ELECTORALES = [
-    "candidato", "elecciones", "jne", "2026", "presidente",
-    "congreso", "partido", "voto", "electoral", "campaña",
-    "debate", "primera vuelta", "segunda vuelta", "keiko",
-    "lopez aliaga", "acuña", "fujimori", "onpe", "ballotage",
-    "inscripcion", "plancha", "formula presidencial",
-]
-
 STATIC_CANDIDATOS_PATH = Path(__file__).parent / "data" / "candidatos.json"
 
 HEADERS = {
@@ -70,18 +80,12 @@ HEADERS = {
 }
 
 TIMEOUT = 15.0
-MAX_CONTENT_CHARS = 3000  # máximo de caracteres del contenido completo a extraer
 
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _es_noticia_electoral(titulo: str, resumen: str) -> bool:
-    texto = (titulo + " " + resumen).lower()
-    return any(kw in texto for kw in FILTROS_ELECTORALES)
-
-
 def _limpiar_texto(texto: str) -> str:
     """Elimina espacios múltiples, saltos innecesarios y caracteres raros."""
     texto = re.sub(r'\s+', ' ', texto)
@@ -89,7 +93,10 @@ def _limpiar_texto(texto: str) -> str:
 
 
 def _parse_rss(xml_text: str, fuente: str) -> list[dict]:
-    """Parsea XML de RSS y retorna lista de noticias con URL para scraping posterior."""
+    """
+    Parsea XML de RSS y retorna todos los ítems con URL para scraping
+    posterior, sin filtrar (se cachean así; ver _filtrar_electorales).
+    """
     soup = BeautifulSoup(xml_text, "lxml-xml")
     items = soup.find_all("item")
     noticias = []
@@ -110,7 +117,7 @@ def _parse_rss(xml_text: str, fuente: str) -> list[dict]:
             if guid:
                 url = guid.get_text(strip=True)
 
-        if titulo and _es_noticia_electoral(titulo, resumen):
+        if titulo:
             noticias.append({
                 "titulo":   titulo,
                 "resumen":  resumen[:400],
@@ -122,97 +129,9 @@ def _parse_rss(xml_text: str, fuente: str) -> list[dict]:
     return noticias
 
 
-def _extraer_contenido_articulo(html: str) -> str:
-    """
-    Extrae el texto principal de un artículo HTML.
-    Intenta varios selectores comunes de medios peruanos.
-    """
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Eliminar scripts, estilos, navs, footers, publicidad
-    for tag in soup(["script", "style", "nav", "footer", "header",
-                     "aside", "figure", "iframe", "form", "button"]):
-        tag.decompose()
-
-    # Selectores por orden de prioridad (cubren RPP, El Comercio, Infobae, etc.)
-    selectores = [
-        "article",
-        '[class*="article-body"]',
-        '[class*="content-body"]',
-        '[class*="story-body"]',
-        '[class*="nota-cuerpo"]',
-        '[class*="entry-content"]',
-        '[class*="article__body"]',
-        "main",
-    ]
-
-    for sel in selectores:
-        bloque = soup.select_one(sel)
-        if bloque:
-            parrafos = [p.get_text(separator=" ", strip=True)
-                        for p in bloque.find_all(["p", "h2", "h3"])
-                        if len(p.get_text(strip=True)) > 40]
-            if parrafos:
-                texto = " ".join(parrafos)
-                return _limpiar_texto(texto)[:MAX_CONTENT_CHARS]
-
-    # Fallback: todos los párrafos de la página
-    parrafos = [p.get_text(separator=" ", strip=True)
-                for p in soup.find_all("p")
-                if len(p.get_text(strip=True)) > 50]
-    return _limpiar_texto(" ".join(parrafos[:15]))[:MAX_CONTENT_CHARS]
-
-
-def _scrape_infobae_tag(html: str) -> list[dict]:
-    """Extrae artículos de la página de tag de Infobae."""
-    soup = BeautifulSoup(html, "html.parser")
-    noticias = []
-
-    # Infobae usa tarjetas de artículo con estos selectores
-    tarjetas = soup.select("article, [class*='story-card'], [class*='article-card'], [class*='feed-list-card']")
-
-    if not tarjetas:
-        # Fallback: buscar todos los <a> con href que contengan /peru/ o /america/
-        links = soup.find_all("a", href=re.compile(r'/peru/|/america/peru/'))
-        for link in links[:20]:
-            titulo = link.get_text(strip=True)
-            url = link.get("href", "")
-            if len(titulo) > 20 and url:
-                if not url.startswith("http"):
-                    url = "https://www.infobae.com" + url
-                noticias.append({
-                    "titulo": titulo,
-                    "resumen": "",
-                    "contenido_completo": "",
-                    "fecha": "",
-                    "url": url,
-                    "fuente": "Infobae Peru 2026",
-                })
-        return noticias[:15]
-
-    for tarjeta in tarjetas[:20]:
-        titulo_tag = tarjeta.find(["h2", "h3", "h4"])
-        link_tag   = tarjeta.find("a", href=True)
-        fecha_tag  = tarjeta.find(["time", "[class*='date']"])
-
-        titulo = titulo_tag.get_text(strip=True) if titulo_tag else ""
-        url    = link_tag["href"]                if link_tag   else ""
-        fecha  = fecha_tag.get_text(strip=True)  if fecha_tag  else ""
-
-        if not url.startswith("http"):
-            url = "https://www.infobae.com" + url
-
-        if titulo and len(titulo) > 15:
-            noticias.append({
-                "titulo": titulo,
-                "resumen": "",
-                "contenido_completo": "",
-                "fecha": fecha,
-                "url": url,
-                "fuente": "Infobae Peru 2026",
-            })
-
-    return noticias
+def _filtrar_electorales(items: list[dict]) -> list[dict]:
+    filtro = get_filtro_electoral()
+    return [n for n in items if filtro.es_electoral(n["titulo"], n.get("resumen", ""))]
 
 
 # ---------------------------------------------------------------------------
@@ -221,16 +140,34 @@ def _scrape_infobae_tag(html: str) -> list[dict]:
 
 class IngestaAgent:
 
+    def __init__(self):
+        self.feed_cache = FeedCache()
+        self.url_store = URLStore()
+
     async def _fetch_rss(
-        self, client: httpx.AsyncClient, source: dict
+        self, client: ProgramadorFetch, source: dict
     ) -> tuple[list, str | None]:
-        """Scrapea un feed RSS. Retorna (noticias, error)."""
+        """Scrapea un feed RSS con GET condicional. Retorna (noticias, error)."""
         try:
             resp = await client.get(
-                source["url"], headers=HEADERS, timeout=TIMEOUT, follow_redirects=True
+                source["url"], headers={**HEADERS, **self.feed_cache.cabeceras(source["url"])},
+                timeout=TIMEOUT, follow_redirects=True,
             )
+            if resp.status_code == 304:
+                items = self.feed_cache.no_modificado(source["nombre"], source["url"])
+                if items is not None:
+                    # El filtro se aplica al servir: vale aunque el feed no haya cambiado
+                    noticias = _filtrar_electorales(items)
+                    logger.info(f"RSS {source['nombre']}: sin cambios (304), {len(noticias)} noticias en caché")
+                    return noticias, None
             resp.raise_for_status()
-            noticias = _parse_rss(resp.text, source["nombre"])
+            items = _parse_rss(resp.text, source["nombre"])
+            self.feed_cache.guardar(
+                source["nombre"], source["url"],
+                resp.headers.get("ETag"), resp.headers.get("Last-Modified"),
+                items, len(resp.content),
+            )
+            noticias = _filtrar_electorales(items)
             logger.info(f"RSS {source['nombre']}: {len(noticias)} noticias electorales")
             return noticias, None
         except Exception as e:
@@ -239,7 +176,7 @@ class IngestaAgent:
             return [], msg
 
     async def _fetch_scraping(
-        self, client: httpx.AsyncClient, source: dict
+        self, client: ProgramadorFetch, extractor: ExtractorHTML, source: dict
     ) -> tuple[list, str | None]:
         """Scrapea una página de tag/sección directamente."""
         try:
@@ -249,7 +186,7 @@ class IngestaAgent:
             resp.raise_for_status()
 
             if source["tipo"] == "infobae_tag":
-                noticias = _scrape_infobae_tag(resp.text)
+                noticias = await extractor.infobae_tag(resp.text)
             else:
                 noticias = []
 
@@ -261,27 +198,28 @@ class IngestaAgent:
             return [], msg
 
     async def _enriquecer_contenido(
-        self, client: httpx.AsyncClient, noticia: dict
-    ) -> dict:
+        self, client: ProgramadorFetch, extractor: ExtractorHTML, url: str
+    ) -> str | None:
         """
         Descarga el artículo completo y extrae el texto principal.
-        Si falla, deja contenido_completo vacío — no es crítico.
+        Retorna None si falla o no se extrajo texto (no es crítico: se
+        reintenta en el próximo run; lo vacío no se guarda en el registro).
         """
-        url = noticia.get("url", "")
-        if not url or not url.startswith("http"):
-            return noticia
         try:
             resp = await client.get(
                 url, headers=HEADERS, timeout=12.0, follow_redirects=True
             )
             if resp.status_code == 200:
-                contenido = _extraer_contenido_articulo(resp.text)
-                noticia["contenido_completo"] = contenido
-        except Exception:
-            pass  # silencioso — el contenido completo es opcional
-        return noticia
+                contenido = await extractor.contenido(url, resp.text)
+                if contenido:
+                    self.url_store.guardar(url, contenido)
+                    return contenido
+        except Exception as e:
+            # El contenido completo es opcional, pero un error del parser o del registro no debe quedar oculto
+            logger.debug(f"Contenido completo de {url} no disponible: {type(e).__name__}: {e}")
+        return None
 
-    async def _fetch_jne(self, client: httpx.AsyncClient) -> tuple[list, str | None]:
+    async def _fetch_jne(self, client: ProgramadorFetch) -> tuple[list, str | None]:
         """Intenta scrapear JNE. No crítico."""
         try:
             url = "https://declara.jne.gob.pe/ASJNE/candidato.aspx"
@@ -294,8 +232,9 @@ class IngestaAgent:
             logger.info(f"JNE scraping: {len(nombres)} elementos")
             return nombres, None
         except Exception as e:
-            logger.info(f"JNE scraping fallo (esperado): {e}")
-            return [], str(e)
+            error = str(e) or type(e).__name__   # TimeoutError del plazo no trae mensaje
+            logger.info(f"JNE scraping fallo (esperado): {error}")
+            return [], error
 
     def _load_static_candidatos(self) -> list[dict]:
         try:
@@ -312,31 +251,38 @@ class IngestaAgent:
         """
         Ejecuta la ingesta completa en 3 fases:
           1. RSS + scraping de páginas de tag (en paralelo)
-          2. Enriquecimiento: descarga contenido completo de cada artículo
+          2. Enriquecimiento: contenido completo de cada artículo (solo se
+             descargan las URLs que no están en el registro)
           3. Candidatos estáticos
 
         Retorna:
           {
-            "noticias_hoy": [...],   # con contenido_completo incluido
+            "noticias_hoy": [...],   # con contenido_completo, relevancia y coincidencias,
+                                     # de mayor a menor relevancia
             "candidatos":  [...],
             "fecha_ingesta": str,
             "fuentes_exitosas": [...],
-            "fuentes_fallidas": [...]
+            "fuentes_fallidas": [...],
+            "cache_rss": {feed: {estado, bytes_ahorrados, hit_rate, bytes_ahorrados_total}},
+            "enriquecimiento": {desde_registro, descargados, fallidos},
+            "descargas": {host: {pedidos, reintentos, errores, segundos}},
+            "extraccion": {paginas, ms_medio, ms_p95, ms_max, mas_lenta}
           }
         """
         noticias_hoy: list[dict] = []
         fuentes_exitosas: list[str] = []
         fuentes_fallidas: list[str] = []
 
-        async with httpx.AsyncClient() as client:
+        async with ProgramadorFetch() as client, ExtractorHTML() as extractor:
 
             # ---- FASE 1: RSS + scraping en paralelo ----------------------
             rss_tasks      = [self._fetch_rss(client, src)      for src in RSS_SOURCES]
-            scraping_tasks = [self._fetch_scraping(client, src) for src in SCRAPING_SOURCES]
-            jne_task       = self._fetch_jne(client)
+            scraping_tasks = [self._fetch_scraping(client, extractor, src) for src in SCRAPING_SOURCES]
+            # JNE es lento y no crítico: corre en paralelo con ambas fases
+            jne_task       = asyncio.create_task(self._fetch_jne(client))
 
             todos = await asyncio.gather(
-                *rss_tasks, *scraping_tasks, jne_task,
+                *rss_tasks, *scraping_tasks,
                 return_exceptions=False,
             )
 
@@ -361,22 +307,42 @@ class IngestaAgent:
                     if noticias:
                         fuentes_exitosas.append(src["nombre"])
 
-            # JNE (último elemento)
-            _, jne_error = todos[-1]
+            # ---- FASE 2: Enriquecimiento de contenido completo -----------
+            # Solo se descargan las URLs que no están en el registro (o vencieron)
+            urls = list(dict.fromkeys(
+                n["url"] for n in noticias_hoy if n.get("url", "").startswith("http")
+            ))
+            contenidos = self.url_store.vigentes(urls)
+            nuevas = [u for u in urls if u not in contenidos]
+
+            logger.info(
+                f"Contenido completo: {len(contenidos)} articulos desde el registro, "
+                f"descargando {len(nuevas)} nuevos..."
+            )
+            descargados = await asyncio.gather(*[self._enriquecer_contenido(client, extractor, u) for u in nuevas])
+            contenidos.update({u: c for u, c in zip(nuevas, descargados) if c is not None})
+            for n in noticias_hoy:
+                if n.get("url") in contenidos:
+                    n["contenido_completo"] = contenidos[n["url"]]
+            enriquecimiento = {
+                "desde_registro": len(urls) - len(nuevas),
+                "descargados": sum(1 for c in descargados if c is not None),
+                "fallidos": sum(1 for c in descargados if c is None),
+            }
+
+            _, jne_error = await jne_task
             if jne_error:
                 fuentes_fallidas.append(f"JNE: {jne_error}")
-
-            # ---- FASE 2: Enriquecimiento de contenido completo -----------
-            # Limitar a 20 artículos para no sobrecargar ni gastar demasiado tiempo
-            a_enriquecer = noticias_hoy[:20]
-            resto        = noticias_hoy[20:]
-
-            logger.info(f"Descargando contenido completo de {len(a_enriquecer)} articulos...")
-            enriquecidos = await asyncio.gather(
-                *[self._enriquecer_contenido(client, n) for n in a_enriquecer],
-                return_exceptions=False,
+            descargas = client.resumen()
+            extraccion = extractor.resumen()
+
+        # Relevancia electoral con título, resumen y contenido; las más relevantes primero
+        filtro = get_filtro_electoral()
+        for n in noticias_hoy:
+            n["relevancia"], n["coincidencias"] = filtro.evaluar(
+                n["titulo"], f"{n.get('resumen', '')} {n.get('contenido_completo', '')}"
             )
-            noticias_hoy = list(enriquecidos) + resto
+        noticias_hoy.sort(key=lambda n: n["relevancia"], reverse=True)
 
         con_contenido = sum(1 for n in noticias_hoy if n.get("contenido_completo"))
         logger.info(f"Contenido completo extraido: {con_contenido}/{len(noticias_hoy)} articulos")
@@ -385,6 +351,22 @@ class IngestaAgent:
         candidatos = self._load_static_candidatos()
         fuentes_exitosas.append("candidatos_estaticos")
 
+        cache_rss = self.feed_cache.resumen(RSS_SOURCES)
+        no_modificados = sum(1 for c in cache_rss.values() if c["estado"] == 304)
+        ahorrados = sum(c["bytes_ahorrados"] for c in cache_rss.values())
+        if descargas:
+            host, lento = next(iter(descargas.items()))
+            logger.info(f"Descargas: {len(descargas)} hosts; el más lento {host} ({lento['segundos']}s acumulados)")
+        if extraccion["paginas"]:
+            logger.info(
+                f"Extracción HTML: {extraccion['paginas']} páginas, {extraccion['ms_medio']} ms promedio, "
+                f"p95 {extraccion['ms_p95']} ms, la más lenta {extraccion['mas_lenta']} ({extraccion['ms_max']} ms)"
+            )
+        logger.info(
+            f"Caché RSS: {no_modificados}/{len(RSS_SOURCES)} feeds sin cambios (304), "
+            f"{ahorrados / 1024:.0f} KB ahorrados"
+        )
+
         logger.info(
             f"Ingesta completada: {len(noticias_hoy)} noticias, "
             f"{len(candidatos)} candidatos, "
@@ -398,6 +380,10 @@ class IngestaAgent:
             "fecha_ingesta":   datetime.utcnow().isoformat(),
             "fuentes_exitosas": fuentes_exitosas,
             "fuentes_fallidas": fuentes_fallidas,
+            "cache_rss":       cache_rss,
+            "enriquecimiento": enriquecimiento,
+            "descargas":       descargas,
+            "extraccion":      extraccion,
         }
 
 
@@ -423,6 +409,6 @@ if __name__ == "__main__":
         print(f"\nPrimeras 5 noticias:")
         for n in resultado["noticias_hoy"][:5]:
             palabras = len(n.get("contenido_completo", "").split())
-            print(f"  [{n['fuente']}] {n['titulo'][:70]} ({palabras} palabras)")
+            print(f"  [{n['fuente']}] {n['titulo'][:70]} ({palabras} palabras, relevancia {n['relevancia']})")
 
     asyncio.run(main())
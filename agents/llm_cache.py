@@ -0,0 +1,175 @@
+"""
+llm_cache.py — Caché persistente de respuestas de Claude (SQLite)
+
+La clave es un hash SHA-256 del request completo (modelo, system, messages y
+resto de parámetros, serializados de forma canónica): dos llamadas idénticas
+devuelven la misma respuesta sin volver a pagarla. Repetir run.py tras un
+crash o con --dry-run sobre la misma ingesta no gasta tokens.
+
+  - TTL:       config.LLM_CACHE_TTL_HORAS (entradas vencidas se ignoran y purgan)
+  - Tamaño:    config.LLM_CACHE_MAX_MB; al superarlo se eliminan las entradas
+               menos usadas recientemente hasta bajar al 90%
+  - Desactivar: run.py --no-cache (config.LLM_CACHE_ACTIVO = False)
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def clave_request(params: dict[str, Any]) -> str:
+    canonico = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+
+    def __init__(
+        self,
+        path: str | None = None,
+        ttl_horas: float | None = None,
+        max_mb: float | None = None,
+    ):
+        self.path = path or config.LLM_CACHE_PATH
+        self.ttl_seg = (ttl_horas if ttl_horas is not None else config.LLM_CACHE_TTL_HORAS) * 3600
+        self.max_bytes = int((max_mb if max_mb is not None else config.LLM_CACHE_MAX_MB) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                clave     TEXT PRIMARY KEY,
+                respuesta TEXT NOT NULL,
+                creado    REAL NOT NULL,
+                accedido  REAL NOT NULL,
+                tamano    INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_accedido ON respuestas(accedido)")
+        self._conn.commit()
+        self._purgar_vencidas()
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.tokens_ahorrados = 0
+
+    # ------------------------------------------------------------------
+    # get / put
+    # ------------------------------------------------------------------
+
+    def get(self, clave: str) -> dict | None:
+        ahora = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if row is None or ahora - row[1] > self.ttl_seg:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE respuestas SET accedido = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+        self.hits += 1
+        data = json.loads(row[0])
+        usage = data.get("usage") or {}
+        self.tokens_ahorrados += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        return data
+
+    def put(self, clave: str, respuesta: dict):
+        texto = json.dumps(respuesta, ensure_ascii=False)
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, respuesta, creado, accedido, tamano) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (clave, texto, ahora, ahora, len(texto.encode("utf-8"))),
+            )
+            self._conn.commit()
+            self._evictar_si_excede()
+
+    # ------------------------------------------------------------------
+    # Mantenimiento
+    # ------------------------------------------------------------------
+
+    def _purgar_vencidas(self):
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM respuestas WHERE creado < ?", (time.time() - self.ttl_seg,)
+            )
+            self._conn.commit()
+        if cur.rowcount:
+            logger.info(f"Caché LLM: {cur.rowcount} entradas vencidas eliminadas")
+
+    def _evictar_si_excede(self):
+        """Elimina las entradas menos usadas hasta quedar bajo el 90% del máximo (con lock tomado)."""
+        total = self._conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM respuestas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        objetivo = int(self.max_bytes * 0.9)
+        eliminadas = 0
+        for clave, tamano in self._conn.execute(
+            "SELECT clave, tamano FROM respuestas ORDER BY accedido ASC"
+        ).fetchall():
+            if total <= objetivo:
+                break
+            self._conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+            total -= tamano
+            eliminadas += 1
+        self._conn.commit()
+        logger.debug(f"Caché LLM: {eliminadas} entradas eliminadas por tamaño")
+
+    def resumen(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "cache_tokens_ahorrados": self.tokens_ahorrados,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_llm_cache: LLMCache | None = None
+
+
+def get_llm_cache() -> LLMCache | None:
+    """Retorna la caché compartida, o None si está desactivada (--no-cache)."""
+    global _llm_cache
+    if not config.LLM_CACHE_ACTIVO:
+        return None
+    if _llm_cache is None:
+        _llm_cache = LLMCache()
+    return _llm_cache
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMCache(path=f"{tmp}/cache.db", ttl_horas=1, max_mb=0.001)
+        params = {"model": config.CLAUDE_MODEL, "max_tokens": 10,
+                  "messages": [{"role": "user", "content": "hola"}]}
+        clave = clave_request(params)
+        print(f"  get (vacío): {cache.get(clave)}")
+        cache.put(clave, {"content": [{"type": "text", "text": "hola"}],
+                          "usage": {"input_tokens": 5, "output_tokens": 2}})
+        print(f"  get (tras put): {cache.get(clave) is not None}")
+        for i in range(20):
+            cache.put(f"relleno-{i}", {"texto": "x" * 200})
+        print(f"  get tras evicción: {cache.get(clave) is not None}")
+        print(f"[OK] {cache.resumen()}")
@@ -0,0 +1,252 @@
+"""
+llm_client.py — Cliente asíncrono compartido para llamadas a Claude
+
+Todos los agentes (SEO, writers, verificación, dedup) llaman a Claude a través
+de este módulo. Usa anthropic.AsyncAnthropic, de modo que las llamadas no
+bloquean el event loop y el asyncio.gather del orquestador corre realmente
+en paralelo: el tiempo total del run depende del artículo más lento, no de
+la suma de todos.
+
+Límites de concurrencia:
+  - global       : config.LLM_MAX_CONCURRENCIA llamadas en vuelo en total
+  - por categoría: config.LLM_CONCURRENCIA_CATEGORIA[categoria]
+                   (seo, verificacion, dedup, perfiles, debates, ...)
+
+Caché de respuestas: llm_cache.LLMCache. Un request idéntico a uno ya
+respondido se sirve desde disco sin llamar a la API (usage en cero).
+
+Límites de tasa y reintentos: rate_limiter.RateLimiter (RPM/TPM compartidos).
+Errores 429/529, 5xx, timeouts y fallos de conexión se reintentan hasta
+config.LLM_MAX_REINTENTOS veces con backoff; el resto se propaga.
+
+Uso:
+  llm = get_llm_client()
+  msg = await llm.create("perfiles", model=..., max_tokens=..., messages=[...])
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import anthropic
+
+import config
+from llm_cache import clave_request, get_llm_cache
+from rate_limiter import RateLimiter, estimar_tokens_entrada, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClient:
+
+    def __init__(
+        self,
+        max_concurrencia: int | None = None,
+        concurrencia_categoria: dict[str, int] | None = None,
+        rate_limiter: RateLimiter | None = None,
+    ):
+        # Reintentos propios (max_retries=0) para que pasen por el rate limiter
+        self.client = anthropic.AsyncAnthropic(api_key=config.ANTHROPIC_API_KEY, max_retries=0)
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.max_concurrencia = max_concurrencia or config.LLM_MAX_CONCURRENCIA
+        self.concurrencia_categoria = (
+            concurrencia_categoria
+            if concurrencia_categoria is not None
+            else dict(config.LLM_CONCURRENCIA_CATEGORIA)
+        )
+
+        # Los semáforos se crean por event loop (asyncio.run crea uno nuevo
+        # en cada comando CLI; la API FastAPI usa el suyo)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._sem_global: asyncio.Semaphore | None = None
+        self._sem_categoria: dict[str, asyncio.Semaphore] = {}
+
+        # Métricas
+        self.llamadas: dict[str, int] = {}
+        self.reintentos = 0
+        self.en_vuelo = 0
+        self.pico_en_vuelo = 0
+
+    # ------------------------------------------------------------------
+    # Semáforos
+    # ------------------------------------------------------------------
+
+    def _semaforos(self, categoria: str) -> tuple[asyncio.Semaphore, asyncio.Semaphore | None]:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._sem_global = asyncio.Semaphore(self.max_concurrencia)
+            self._sem_categoria = {}
+
+        limite = self.concurrencia_categoria.get(categoria)
+        sem_cat = None
+        if limite:
+            sem_cat = self._sem_categoria.get(categoria)
+            if sem_cat is None:
+                sem_cat = asyncio.Semaphore(limite)
+                self._sem_categoria[categoria] = sem_cat
+        return self._sem_global, sem_cat
+
+    # ------------------------------------------------------------------
+    # Llamada principal
+    # ------------------------------------------------------------------
+
+    async def _create_una_vez(self, categoria: str, params: dict) -> anthropic.types.Message:
+        sem_global, sem_cat = self._semaforos(categoria)
+
+        # Primero el de categoría: así una categoría saturada no acapara
+        # plazas globales mientras espera
+        if sem_cat is not None:
+            await sem_cat.acquire()
+        try:
+            async with sem_global:
+                self.en_vuelo += 1
+                self.pico_en_vuelo = max(self.pico_en_vuelo, self.en_vuelo)
+                self.llamadas[categoria] = self.llamadas.get(categoria, 0) + 1
+                inicio = time.monotonic()
+                try:
+                    return await self.client.messages.create(**params)
+                finally:
+                    self.en_vuelo -= 1
+                    logger.debug(
+                        f"LLM [{categoria}] {time.monotonic() - inicio:.1f}s "
+                        f"(en vuelo: {self.en_vuelo})"
+                    )
+        finally:
+            if sem_cat is not None:
+                sem_cat.release()
+
+    async def create(self, categoria: str, **params: Any) -> anthropic.types.Message:
+        """
+        Equivalente asíncrono de client.messages.create(**params), respetando
+        el límite global, el de la categoría indicada y el rate limiter.
+        """
+        cache = get_llm_cache()
+        clave = clave_request(params) if cache else None
+        if cache:
+            data = cache.get(clave)
+            if data is not None:
+                logger.debug(f"LLM [{categoria}] respuesta servida desde caché")
+                return respuesta_cacheada(data)
+
+        estimados = estimar_tokens_entrada(params) + params.get("max_tokens", 0)
+
+        for intento in range(config.LLM_MAX_REINTENTOS + 1):
+            await self.rate_limiter.adquirir(estimados)
+            try:
+                msg = await self._create_una_vez(categoria, params)
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                # La llamada fallida no consumió tokens: se devuelven
+                self.rate_limiter.reconciliar(estimados, 0)
+                espera = self._espera_reintento(e, intento)
+                if espera is None or intento == config.LLM_MAX_REINTENTOS:
+                    raise
+                self.reintentos += 1
+                logger.info(f"LLM [{categoria}] reintento {intento + 1} en {espera:.1f}s: {e}")
+                await asyncio.sleep(espera)
+                continue
+
+            usage = msg.usage
+            # Las lecturas de caché no cuentan para el límite de tokens de entrada
+            self.rate_limiter.reconciliar(
+                estimados,
+                usage.input_tokens + (usage.cache_creation_input_tokens or 0) + usage.output_tokens,
+            )
+            self.rate_limiter.registrar_exito()
+            if cache:
+                cache.put(clave, msg.model_dump(mode="json"))
+            return msg
+
+        raise RuntimeError("inalcanzable")  # el bucle siempre retorna o relanza
+
+    def _espera_reintento(self, error: Exception, intento: int) -> float | None:
+        """Segundos a esperar antes de reintentar, o None si el error no es reintentable."""
+        if isinstance(error, anthropic.APIConnectionError):  # incluye timeouts
+            return min(config.LLM_BACKOFF_MAX_SEG, config.LLM_BACKOFF_BASE_SEG * 2 ** intento)
+
+        status = getattr(error, "status_code", None)
+        if status in (429, 529):
+            retry_after = None
+            try:
+                retry_after = float(error.response.headers.get("retry-after", ""))
+            except (AttributeError, ValueError):
+                pass
+            return self.rate_limiter.registrar_rechazo(retry_after, intento)
+        if status is not None and status >= 500:
+            return min(config.LLM_BACKOFF_MAX_SEG, config.LLM_BACKOFF_BASE_SEG * 2 ** intento)
+        return None
+
+    def resumen(self) -> dict:
+        cache = get_llm_cache()
+        return {
+            "llamadas": dict(self.llamadas),
+            "reintentos": self.reintentos,
+            "pico_en_vuelo": self.pico_en_vuelo,
+            **self.rate_limiter.resumen(),
+            **(cache.resumen() if cache else {}),
+        }
+
+
+def respuesta_cacheada(data: dict) -> anthropic.types.Message:
+    """Reconstruye un Message desde la caché con el uso en cero (no se pagó de nuevo)."""
+    data = {**data, "usage": {
+        **(data.get("usage") or {}),
+        "input_tokens": 0, "output_tokens": 0,
+        "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0,
+    }}
+    return anthropic.types.Message.model_validate(data)
+
+
+def registrar_uso(agente: Any, usage: Any):
+    """
+    Suma el uso de una respuesta a los contadores del agente. Las escrituras y
+    lecturas de prompt caching se llevan aparte porque tienen otro precio.
+    """
+    agente.tokens_input  += usage.input_tokens
+    agente.tokens_output += usage.output_tokens
+    agente.tokens_cache_write = getattr(agente, "tokens_cache_write", 0) + (usage.cache_creation_input_tokens or 0)
+    agente.tokens_cache_read  = getattr(agente, "tokens_cache_read", 0) + (usage.cache_read_input_tokens or 0)
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_llm_client: LLMClient | None = None
+
+
+def get_llm_client() -> LLMClient:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient()
+    return _llm_client
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    async def main():
+        if not config.ANTHROPIC_API_KEY:
+            print("ANTHROPIC_API_KEY no configurada. Saltando test.")
+            return
+
+        llm = get_llm_client()
+        inicio = time.monotonic()
+        msgs = await asyncio.gather(*[
+            llm.create(
+                "faq",
+                model=config.CLAUDE_MODEL,
+                max_tokens=20,
+                messages=[{"role": "user", "content": f"Di solo el número {i}"}],
+            )
+            for i in range(5)
+        ])
+        print(f"[OK] {len(msgs)} llamadas en {time.monotonic() - inicio:.1f}s")
+        print(f"  Resumen: {llm.resumen()}")
+
+    asyncio.run(main())
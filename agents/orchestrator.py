@@ -4,10 +4,13 @@ orchestrator.py — Orquestador del pipeline completo de generación de artícul
 Secuencia:
   1. Ingesta (noticias + candidatos)
   2. SEO Agent → 40 temas únicos
-  3. Writers en PARALELO por categoría
-  4. Verificación por artículo
-  5. Guardar en DB con estado "pending"
+  3-5. Pipeline por etapas con colas acotadas (pipeline.py):
+       escritura → verificación → guardado en DB por lotes (estado "pending")
+       o, con --batch, Message Batches API (batch_runner.py)
   6. LOG resumen + costos estimados
+
+Cada run tiene un run_id y un checkpoint por tema (run_state.py); con
+`run.py --resume <run_id>` se retoma solo lo que faltó.
 """
 
 import asyncio
@@ -24,104 +27,179 @@ logger = logging.getLogger(__name__)
 
 class Orchestrator:
 
-    def __init__(self, dry_run: bool = False, categoria_filtro: str | None = None):
+    def __init__(
+        self,
+        dry_run: bool = False,
+        categoria_filtro: str | None = None,
+        batch: bool = False,
+        resume_id: str | None = None,
+    ):
         self.dry_run = dry_run
         self.categoria_filtro = categoria_filtro
+        self.batch = batch
+        self.resume_id = resume_id
+        self.run_state = None
         self.tokens_input_total = 0
         self.tokens_output_total = 0
+        self.tokens_cache_write_total = 0
+        self.tokens_cache_read_total = 0
+        # Tokens procesados vía Message Batches API (se facturan con descuento)
+        self.tokens_input_batch = 0
+        self.tokens_output_batch = 0
+        self.tokens_cache_write_batch = 0
+        self.tokens_cache_read_batch = 0
+        self._pipeline_resumen: dict = {}
+        # Agentes del pipeline en curso (sus tokens aún no están acumulados)
+        self._writers: dict[str, Any] = {}
+        self._verificacion_agent: Any = None
 
     def _acumular_tokens(self, agente: Any):
         self.tokens_input_total  += getattr(agente, "tokens_input", 0)
         self.tokens_output_total += getattr(agente, "tokens_output", 0)
+        self.tokens_cache_write_total += getattr(agente, "tokens_cache_write", 0)
+        self.tokens_cache_read_total  += getattr(agente, "tokens_cache_read", 0)
+
+    _CAMPOS_TOKENS = (
+        "input_total", "output_total", "cache_write_total", "cache_read_total",
+        "input_batch", "output_batch", "cache_write_batch", "cache_read_batch",
+    )
+
+    def _checkpoint_tokens(self, agentes: list | None = None):
+        """Guarda en el run_state los tokens gastados hasta ahora (incluye agentes aún activos)."""
+        if self.run_state is None:
+            return
+        snap = {c: getattr(self, f"tokens_{c}") for c in self._CAMPOS_TOKENS}
+        for a in agentes or []:
+            snap["input_total"]       += getattr(a, "tokens_input", 0)
+            snap["output_total"]      += getattr(a, "tokens_output", 0)
+            snap["cache_write_total"] += getattr(a, "tokens_cache_write", 0)
+            snap["cache_read_total"]  += getattr(a, "tokens_cache_read", 0)
+        self.run_state.guardar_tokens(snap)
+
+    def _agentes_activos(self) -> list:
+        agentes = list(self._writers.values())
+        if self._verificacion_agent is not None:
+            agentes.append(self._verificacion_agent)
+        return agentes
 
     @property
     def costo_estimado(self) -> float:
         return (
             self.tokens_input_total  * config.PRICE_INPUT_PER_TOKEN +
-            self.tokens_output_total * config.PRICE_OUTPUT_PER_TOKEN
+            self.tokens_output_total * config.PRICE_OUTPUT_PER_TOKEN +
+            self.tokens_cache_write_total * config.PRICE_CACHE_WRITE_PER_TOKEN +
+            self.tokens_cache_read_total  * config.PRICE_CACHE_READ_PER_TOKEN +
+            (self.tokens_input_batch  * config.PRICE_INPUT_PER_TOKEN +
+             self.tokens_output_batch * config.PRICE_OUTPUT_PER_TOKEN +
+             self.tokens_cache_write_batch * config.PRICE_CACHE_WRITE_PER_TOKEN +
+             self.tokens_cache_read_batch  * config.PRICE_CACHE_READ_PER_TOKEN) * config.BATCH_PRICE_FACTOR
         )
 
     # ------------------------------------------------------------------
-    # Guardar artículo en DB
+    # Guardar artículos en DB (por lotes)
     # ------------------------------------------------------------------
 
-    def _guardar_en_db(self, articulo: dict, verificacion: dict) -> int | None:
-        """Guarda artículo en la cola. Retorna el ID asignado."""
-        slug = articulo.get("slug", "")
-        if not slug:
-            logger.warning("Artículo sin slug, omitiendo")
-            return None
-
-        existente_id = supabase_queue.existe_por_slug(slug)
-        if existente_id:
-            logger.debug(f"Slug ya existe en DB: {slug}")
-            return existente_id
-
+    def _fila_db(self, articulo: dict, verificacion: dict) -> dict:
         requiere_ext = articulo.get("requiere_revision_extendida", False)
         if verificacion.get("nivel_riesgo") in ("medio", "alto"):
             requiere_ext = True
 
-        return supabase_queue.guardar_articulo(
-            titulo=articulo.get("titulo", ""),
-            slug=slug,
-            contenido=articulo.get("contenido", ""),
-            keyword=articulo.get("keyword", ""),
-            categoria=articulo.get("categoria", "noticias"),
-            excerpt=articulo.get("excerpt"),
-            tiempo_lectura=articulo.get("tiempo_lectura"),
-            tipo=articulo.get("tipo", "nuevo"),
-            articulo_original_slug=articulo.get("articulo_original_slug") or None,
-            verificacion_json=json.dumps(verificacion, ensure_ascii=False),
-            requiere_revision_extendida=requiere_ext,
-        )
+        return {
+            "titulo":                 articulo.get("titulo", ""),
+            "slug":                   articulo.get("slug", ""),
+            "contenido":              articulo.get("contenido", ""),
+            "keyword":                articulo.get("keyword", ""),
+            "categoria":              articulo.get("categoria", "noticias"),
+            "excerpt":                articulo.get("excerpt"),
+            "tiempo_lectura":         articulo.get("tiempo_lectura"),
+            "tipo":                   articulo.get("tipo", "nuevo"),
+            "articulo_original_slug": articulo.get("articulo_original_slug") or None,
+            "verificacion_json":      json.dumps(verificacion, ensure_ascii=False),
+            "requiere_revision_extendida": requiere_ext,
+        }
 
-    # ------------------------------------------------------------------
-    # Pipeline de un artículo (write + verify)
-    # ------------------------------------------------------------------
+    def _guardar_lote_en_db(self, items: list[dict]) -> dict[str, int | None]:
+        """
+        Guarda un lote de artículos en la cola con una consulta de existencia
+        y un insert. Retorna {slug: id}.
+        """
+        con_slug = []
+        for item in items:
+            if item["articulo"].get("slug"):
+                con_slug.append(item)
+            else:
+                logger.warning("Artículo sin slug, omitiendo")
+
+        slugs = [i["articulo"]["slug"] for i in con_slug]
+        ids = supabase_queue.existen_slugs(slugs)
+        for slug in ids:
+            logger.debug(f"Slug ya existe en DB: {slug}")
 
-    async def _procesar_tema(
-        self,
-        tema: dict,
-        contexto_ingesta: dict,
-        writer,
-        verificacion_agent,
-    ) -> dict | None:
-        titulo = tema.get("titulo", "?")
-        try:
-            # 1. Escribir
-            articulo = await writer.write(tema, contexto_ingesta)
-            if not articulo:
-                logger.warning(f"Writer retornó vacío para: {titulo}")
-                return None
+        filas = []
+        vistos = set(ids)
+        for item in con_slug:
+            slug = item["articulo"]["slug"]
+            if slug in vistos:
+                continue
+            vistos.add(slug)
+            filas.append(self._fila_db(item["articulo"], item["verificacion"]))
 
-            # 2. Verificar
-            verificacion = await verificacion_agent.verify(articulo)
+        ids.update(supabase_queue.guardar_articulos(filas))
+        return ids
+
+    # ------------------------------------------------------------------
+    # Etapas del pipeline (write → verify → persist)
+    # ------------------------------------------------------------------
 
-            # 3. Guardar en DB
-            art_id = self._guardar_en_db(articulo, verificacion)
+    async def _etapa_escribir(self, item: dict) -> dict | None:
+        if item.get("estado") in ("written", "verified") and item.get("articulo"):
+            return item  # ya escrito en un intento anterior (--resume)
 
+        tema = item["tema"]
+        titulo = tema.get("titulo", "?")
+        writer = self._writers[tema.get("categoria", "noticias")]
+        articulo = await writer.write(tema, self._ingesta)
+        if not articulo:
+            logger.warning(f"Writer retornó vacío para: {titulo}")
+            self.run_state.marcar(item["tema_id"], "failed", error="writer vacío")
+            return None
+        item["articulo"] = articulo
+        self.run_state.marcar(item["tema_id"], "written", articulo=articulo)
+        return item
+
+    async def _etapa_verificar(self, item: dict) -> dict:
+        if item.get("estado") == "verified" and item.get("verificacion"):
+            return item
+
+        item["verificacion"] = await self._verificacion_agent.verify(item["articulo"])
+        self.run_state.marcar(item["tema_id"], "verified", verificacion=item["verificacion"])
+        return item
+
+    async def _etapa_persistir(self, lote: list[dict]) -> list[dict]:
+        ids = await asyncio.to_thread(self._guardar_lote_en_db, lote)
+        resultados = []
+        for item in lote:
+            articulo, verificacion = item["articulo"], item["verificacion"]
+            art_id = ids.get(articulo.get("slug", ""))
+            if art_id is None:
+                # Queda en "verified": --resume reintentará solo el guardado
+                self.run_state.marcar(item["tema_id"], "verified", error="no se pudo guardar en la cola")
+                continue
+            self.run_state.marcar(item["tema_id"], "queued", articulo_id=art_id)
             logger.info(
-                f"  [OK] [{articulo.get('categoria')}] {titulo[:60]} "
+                f"  [OK] [{articulo.get('categoria')}] {item['tema'].get('titulo', '?')[:60]} "
                 f"→ riesgo={verificacion.get('nivel_riesgo')} id={art_id}"
             )
-            return {"articulo": articulo, "verificacion": verificacion, "id": art_id}
-
-        except Exception as e:
-            logger.error(f"Error procesando tema '{titulo}': {e}")
-            return None
+            resultados.append({"articulo": articulo, "verificacion": verificacion, "id": art_id})
+        # Tokens gastados hasta ahora: un commit por lote, fuera del event loop
+        await asyncio.to_thread(self._checkpoint_tokens, self._agentes_activos())
+        return resultados
 
     # ------------------------------------------------------------------
-    # run_daily()
+    # Fases previas: ingesta y temas
     # ------------------------------------------------------------------
 
-    async def run_daily(self) -> dict:
-        inicio = datetime.utcnow()
-        logger.info(f"{'='*60}")
-        logger.info(f"Iniciando run diario {inicio.strftime('%Y-%m-%d %H:%M:%S UTC')}")
-        if self.dry_run:
-            logger.info("[DRY RUN activado — no se publicará nada]")
-        logger.info(f"{'='*60}")
-
+    async def _cargar_ingesta(self) -> dict:
         # ---- 1. INGESTA -----------------------------------------------
         from ingesta_agent import IngestaAgent
         ingesta_agente = IngestaAgent()
@@ -133,7 +211,6 @@ class Orchestrator:
 
         # ---- 1b. CARGAR ESTADÍSTICAS DE DEBATES (datos propios) -------
         # Son el diferencial de contenido de Observa Perú
-        import json as _json
         debate_stats_files = [
             "debate6_stats.json", "debate5_stats.json", "debate4_stats.json",
             "debate3_stats.json", "debate2_stats.json", "debate_stats.json",
@@ -143,7 +220,7 @@ class Orchestrator:
             fpath = config.CONTENT_DIR.parent / "public" / "data" / fname
             try:
                 with open(fpath, encoding="utf-8") as f:
-                    todos_debates.append(_json.load(f))
+                    todos_debates.append(json.load(f))
             except Exception:
                 pass
 
@@ -155,7 +232,29 @@ class Orchestrator:
         logger.info(f"Ingesta: {len(ingesta['noticias_hoy'])} noticias | "
                     f"fuentes OK: {ingesta['fuentes_exitosas']} | "
                     f"fuentes fallidas: {len(ingesta['fuentes_fallidas'])}")
+        return ingesta
+
+    async def _preparar(self) -> tuple[dict, list[dict]]:
+        """
+        Ingesta + temas del run, reutilizando los guardados en el run_state si
+        existen (--resume). Retorna (ingesta, items) con items {tema_id, tema, estado, ...}.
+        """
+        ingesta = self.run_state.ingesta()
+        if ingesta is None:
+            ingesta = await self._cargar_ingesta()
+            self.run_state.guardar_ingesta(ingesta)
+        else:
+            logger.info(f"Ingesta recuperada del run {self.run_state.run_id}")
 
+        items = self.run_state.items()
+        if not items:
+            items = self.run_state.guardar_temas(await self._generar_temas(ingesta))
+            self._checkpoint_tokens()
+        else:
+            logger.info(f"Temas recuperados: {len(items)} | estado: {self.run_state.conteo()}")
+        return ingesta, items
+
+    async def _generar_temas(self, ingesta: dict) -> list[dict]:
         # ---- 2. SEO → TEMAS -------------------------------------------
         from seo_agent import SEOAgent
         seo = SEOAgent()
@@ -179,49 +278,105 @@ class Orchestrator:
         nuevos = sum(1 for t in temas if t.get("tipo") == "nuevo")
         reformulados = sum(1 for t in temas if t.get("tipo") == "actualizacion")
         logger.info(f"Temas: {len(temas)} total | {nuevos} nuevos | {reformulados} reformulados")
+        return temas
 
-        # ---- 3. WRITERS EN PARALELO -----------------------------------
-        from writer_agents import get_writer, WRITERS
-        from verificacion_agent import VerificacionAgent
-
-        verificacion_agent = VerificacionAgent()
-
-        # Agrupar temas por categoría y crear writers
-        temas_por_cat: dict[str, list] = {}
-        for t in temas:
-            cat = t.get("categoria", "noticias")
-            temas_por_cat.setdefault(cat, []).append(t)
+    # ------------------------------------------------------------------
+    # Modo tiempo real: pipeline write → verify → persist
+    # ------------------------------------------------------------------
 
-        writers = {cat: get_writer(cat) for cat in temas_por_cat}
+    async def _run_pipeline(self, items: list[dict], ingesta: dict) -> list[dict]:
+        from writer_agents import get_writer
+        from verificacion_agent import VerificacionAgent
+        from pipeline import Etapa, Pipeline
 
-        # Crear todas las tareas
-        tareas = []
-        for cat, temas_cat in temas_por_cat.items():
-            writer = writers[cat]
-            for tema in temas_cat:
-                tareas.append(
-                    self._procesar_tema(tema, ingesta, writer, verificacion_agent)
-                )
+        self._ingesta = ingesta
+        self._verificacion_agent = verificacion_agent = VerificacionAgent()
+        self._writers = writers = {
+            cat: get_writer(cat) for cat in {i["tema"].get("categoria", "noticias") for i in items}
+        }
 
-        logger.info(f"Ejecutando {len(tareas)} tareas de escritura en paralelo...")
+        workers = config.PIPELINE_WORKERS
+        pipe = Pipeline([
+            Etapa("escritura",    self._etapa_escribir,  workers=workers["escritura"],
+                  cola_max=config.PIPELINE_COLA_MAX),
+            Etapa("verificacion", self._etapa_verificar, workers=workers["verificacion"],
+                  cola_max=config.PIPELINE_COLA_MAX),
+            Etapa("persistencia", self._etapa_persistir, workers=workers["persistencia"],
+                  cola_max=config.PIPELINE_COLA_MAX, lote=config.PIPELINE_LOTE_DB),
+        ])
 
         if config.ANTHROPIC_API_KEY:
-            resultados = await asyncio.gather(*tareas, return_exceptions=False)
+            logger.info(f"Procesando {len(items)} temas en pipeline por etapas...")
+            resultados = await pipe.run(items)
         else:
             logger.info("[SIN API KEY] Simulando escritura en dry-run")
-            # Cerrar coroutines sin ejecutarlas para evitar RuntimeWarning
-            for t in tareas:
-                t.close()
             resultados = []
 
         # Acumular tokens de writers y verificación
         for writer in writers.values():
             self._acumular_tokens(writer)
         self._acumular_tokens(verificacion_agent)
+        if verificacion_agent.omitidos_por_preverificacion:
+            logger.info(f"Verificaciones resueltas localmente (sin Claude): "
+                        f"{verificacion_agent.omitidos_por_preverificacion}")
+        self._writers, self._verificacion_agent = {}, None
+        self._checkpoint_tokens()
+
+        self._pipeline_resumen = pipe.resumen()
+        return resultados
+
+    # ------------------------------------------------------------------
+    # run_daily()
+    # ------------------------------------------------------------------
+
+    def _iniciar_run_state(self):
+        from run_state import RunState
+
+        if self.resume_id:
+            self.run_state = RunState.cargar(self.resume_id)
+            if self.run_state is None:
+                raise ValueError(f"Run no encontrado: {self.resume_id}")
+            # El modo y el filtro son los del run original
+            self.batch = self.run_state.modo == "batch"
+            self.categoria_filtro = self.run_state.categoria
+            for campo, valor in self.run_state.tokens().items():
+                setattr(self, f"tokens_{campo}", valor)
+        else:
+            self.run_state = RunState.crear(
+                "batch" if self.batch else "pipeline", self.categoria_filtro
+            )
+
+    async def run_daily(self) -> dict:
+        inicio = datetime.utcnow()
+        self._iniciar_run_state()
+        logger.info(f"{'='*60}")
+        logger.info(f"Iniciando run diario {inicio.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        logger.info(f"Run id: {self.run_state.run_id}" + (" (reanudado)" if self.resume_id else ""))
+        if self.dry_run:
+            logger.info("[DRY RUN activado — no se publicará nada]")
+        if self.batch:
+            logger.info("[MODO BATCH — Message Batches API, resultados asíncronos]")
+        logger.info(f"{'='*60}")
+
+        # ---- 1-3. INGESTA, TEMAS Y GENERACIÓN ---------------------------
+        if self.batch:
+            from batch_runner import BatchRunner
+            await BatchRunner(self).run()
+        else:
+            ingesta, items = await self._preparar()
+            pendientes = [i for i in items if i["estado"] != "queued"]
+            await self._run_pipeline(pendientes, ingesta)
+
+        # Resultados de todo el run (incluye lo encolado en intentos anteriores)
+        resultados = self.run_state.items(("queued",))
+        n_temas = len(self.run_state.items())
 
         # ---- 4. ESTADÍSTICAS ------------------------------------------
-        articulos_ok = [r for r in resultados if r is not None]
-        articulos_fail = len(resultados) - len(articulos_ok)
+        from llm_client import get_llm_client
+        llm_stats = get_llm_client().resumen()
+
+        articulos_ok = resultados
+        articulos_fail = n_temas - len(articulos_ok) if config.ANTHROPIC_API_KEY else 0
 
         riesgo_bajo  = sum(1 for r in articulos_ok if r["verificacion"].get("nivel_riesgo") == "bajo")
         riesgo_medio = sum(1 for r in articulos_ok if r["verificacion"].get("nivel_riesgo") == "medio")
@@ -238,10 +393,25 @@ class Orchestrator:
         logger.info(f"  Riesgo alto:       {riesgo_alto}")
         logger.info(f"  Tokens entrada:    {self.tokens_input_total:,}")
         logger.info(f"  Tokens salida:     {self.tokens_output_total:,}")
+        logger.info(f"  Caché escritura:   {self.tokens_cache_write_total:,}")
+        logger.info(f"  Caché lectura:     {self.tokens_cache_read_total:,}")
+        if self.tokens_input_batch or self.tokens_output_batch:
+            logger.info(f"  Tokens batch:      {self.tokens_input_batch:,} entrada / "
+                        f"{self.tokens_output_batch:,} salida / "
+                        f"{self.tokens_cache_write_batch:,} caché escr. / "
+                        f"{self.tokens_cache_read_batch:,} caché lect.")
         logger.info(f"  Costo estimado:    ${self.costo_estimado:.4f} USD")
+        logger.info(f"  Llamadas Claude:   {sum(llm_stats['llamadas'].values())} "
+                    f"(pico concurrente: {llm_stats['pico_en_vuelo']}, "
+                    f"reintentos: {llm_stats['reintentos']}, 429: {llm_stats['rechazos_429']})")
+        if "cache_hits" in llm_stats:
+            logger.info(f"  Caché respuestas:  {llm_stats['cache_hits']} hits / "
+                        f"{llm_stats['cache_misses']} misses "
+                        f"({llm_stats['cache_tokens_ahorrados']:,} tokens ahorrados)")
         logger.info(f"{'='*60}")
 
-        return {
+        resumen = {
+            "run_id":       self.run_state.run_id,
             "articulos_generados": len(articulos_ok),
             "articulos_fallidos":  articulos_fail,
             "riesgo_bajo":  riesgo_bajo,
@@ -249,9 +419,20 @@ class Orchestrator:
             "riesgo_alto":  riesgo_alto,
             "tokens_input":  self.tokens_input_total,
             "tokens_output": self.tokens_output_total,
+            "tokens_cache_write": self.tokens_cache_write_total,
+            "tokens_cache_read":  self.tokens_cache_read_total,
+            "tokens_input_batch":  self.tokens_input_batch,
+            "tokens_output_batch": self.tokens_output_batch,
+            "tokens_cache_write_batch": self.tokens_cache_write_batch,
+            "tokens_cache_read_batch":  self.tokens_cache_read_batch,
             "costo_usd":     round(self.costo_estimado, 4),
             "duracion_seg":  round(duracion, 1),
+            "llm":           llm_stats,
+            "pipeline":      self._pipeline_resumen,
         }
+        self._checkpoint_tokens()
+        self.run_state.finalizar(resumen)
+        return resumen
 
     # ------------------------------------------------------------------
     # Demo temas (sin API key)
@@ -269,32 +450,29 @@ class Orchestrator:
 # Audit de duplicados existentes
 # ---------------------------------------------------------------------------
 
-async def audit_duplicados():
-    """Detecta duplicados entre artículos ya publicados en content/."""
-    from dedup_service import DeduplicationService
-    from revision_queue import SessionLocal, TemaPublicado
+async def audit_duplicados(por_categoria: bool = True) -> list[dict]:
+    """
+    Detecta duplicados entre los temas ya publicados: top-k por bloques sobre
+    la matriz de embeddings (sin el modelo ni una consulta por tema) y reporte
+    ordenado en CSV/JSON.
+    """
+    from dedup_audit import auditar_duplicados, escribir_reporte
+    from embedding_index import get_embedding_index
 
     logger.info("Iniciando auditoría de duplicados...")
-    dedup = DeduplicationService()
-
-    db = SessionLocal()
-    try:
-        temas = db.query(TemaPublicado).all()
-    finally:
-        db.close()
-
-    if not temas:
+    index = get_embedding_index()
+    if index.n == 0:
         logger.info("No hay temas publicados registrados en la DB.")
-        return
-
-    duplicados_detectados = 0
-    for tema in temas:
-        resultado = dedup.check_duplicate(tema.titulo, tema.categoria)
-        if resultado["status"] == "duplicado" and resultado.get("articulo_similar", {}).get("slug") != tema.slug:
-            duplicados_detectados += 1
-            logger.warning(
-                f"DUPLICADO: '{tema.titulo}' ↔ '{resultado['articulo_similar']['titulo']}' "
-                f"(sim={resultado['similitud']})"
-            )
+        return []
 
-    logger.info(f"Auditoría completada: {duplicados_detectados} duplicados detectados en {len(temas)} temas")
+    pares = auditar_duplicados(index, por_categoria=por_categoria)
+    for par in pares[:20]:
+        logger.warning(
+            f"DUPLICADO: '{par['titulo_a']}' ↔ '{par['titulo_b']}' (sim={par['similitud']})"
+        )
+    ruta_csv, ruta_json = escribir_reporte(pares)
+    logger.info(
+        f"Auditoría completada: {len(pares)} pares duplicados en {index.n} temas "
+        f"(reporte: {ruta_csv}, {ruta_json})"
+    )
+    return pares
@@ -0,0 +1,240 @@
+"""
+pipeline.py — Pipeline por etapas con colas acotadas
+
+Cada etapa tiene su propio pool de workers y lee de una asyncio.Queue con
+tamaño máximo: si una etapa se atrasa, la anterior se bloquea al hacer put()
+(backpressure) en vez de acumular trabajo en memoria.
+
+  temas → [escritura] → cola → [verificacion] → cola → [persistencia] → resultados
+
+Una etapa puede trabajar por lotes (lote > 1): agrupa hasta `lote` elementos
+o espera como máximo `espera_lote` segundos antes de procesar lo acumulado.
+
+Cada etapa reporta profundidad de su cola de entrada y throughput.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()  # centinela de fin de stream
+
+
+class Etapa:
+
+    def __init__(
+        self,
+        nombre: str,
+        funcion: Callable[[Any], Awaitable[Any]],
+        workers: int = 1,
+        cola_max: int = 10,
+        lote: int = 1,
+        espera_lote: float = 0.5,
+    ):
+        """
+        funcion(item) → resultado | None     (lote == 1)
+        funcion(items) → list[resultado]     (lote > 1)
+
+        Un resultado None se descarta y no pasa a la siguiente etapa.
+        """
+        self.nombre = nombre
+        self.funcion = funcion
+        self.workers = max(1, workers)
+        self.cola_max = cola_max
+        self.lote = max(1, lote)
+        self.espera_lote = espera_lote
+
+        self.entrada: asyncio.Queue | None = None
+        self.procesados = 0
+        self.descartados = 0
+        self.errores = 0
+        self.profundidad_max = 0
+        self._inicio: float | None = None
+        self._fin: float | None = None
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    @property
+    def profundidad(self) -> int:
+        return self.entrada.qsize() if self.entrada is not None else 0
+
+    @property
+    def duracion(self) -> float:
+        if self._inicio is None:
+            return 0.0
+        return (self._fin or time.monotonic()) - self._inicio
+
+    @property
+    def throughput(self) -> float:
+        """Elementos procesados por minuto."""
+        return self.procesados / self.duracion * 60 if self.duracion > 0 else 0.0
+
+    def resumen(self) -> dict:
+        return {
+            "workers":         self.workers,
+            "procesados":      self.procesados,
+            "descartados":     self.descartados,
+            "errores":         self.errores,
+            "profundidad_max": self.profundidad_max,
+            "duracion_seg":    round(self.duracion, 1),
+            "por_minuto":      round(self.throughput, 1),
+        }
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _tomar_lote(self) -> tuple[list, bool]:
+        """Retorna (items, fin_del_stream)."""
+        item = await self.entrada.get()
+        if item is _FIN:
+            return [], True
+        items = [item]
+        if self.lote == 1:
+            return items, False
+
+        limite = time.monotonic() + self.espera_lote
+        while len(items) < self.lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.entrada.get(), timeout=restante)
+            except asyncio.TimeoutError:
+                break
+            if item is _FIN:
+                return items, True
+            items.append(item)
+        return items, False
+
+    async def _worker(self, salida: asyncio.Queue | None, resultados: list):
+        while True:
+            items, fin = await self._tomar_lote()
+            if items:
+                self.profundidad_max = max(self.profundidad_max, self.profundidad + len(items))
+                try:
+                    if self.lote == 1:
+                        salidas = [await self.funcion(items[0])]
+                    else:
+                        salidas = list(await self.funcion(items))
+                except Exception as e:
+                    self.errores += len(items)
+                    logger.error(f"Etapa {self.nombre}: error procesando {len(items)} elemento(s): {e}")
+                    salidas = []
+
+                for r in salidas:
+                    if r is None:
+                        self.descartados += 1
+                        continue
+                    self.procesados += 1
+                    if salida is not None:
+                        await salida.put(r)  # bloquea si la siguiente etapa va atrasada
+                    else:
+                        resultados.append(r)
+            if fin:
+                return
+
+
+class Pipeline:
+
+    def __init__(self, etapas: list[Etapa], intervalo_reporte: float = 15.0):
+        self.etapas = etapas
+        self.intervalo_reporte = intervalo_reporte
+
+    def _log_estado(self):
+        estado = " | ".join(
+            f"{e.nombre}: cola={e.profundidad}/{e.cola_max} ok={e.procesados}"
+            for e in self.etapas
+        )
+        logger.info(f"Pipeline → {estado}")
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.intervalo_reporte)
+            self._log_estado()
+
+    async def run(self, items: list) -> list:
+        """Procesa todos los items por las etapas y retorna la salida de la última."""
+        for etapa in self.etapas:
+            etapa.entrada = asyncio.Queue(maxsize=etapa.cola_max)
+
+        resultados: list = []
+
+        async def _alimentar():
+            primera = self.etapas[0]
+            for item in items:
+                await primera.entrada.put(item)
+            for _ in range(primera.workers):
+                await primera.entrada.put(_FIN)
+
+        async def _correr_etapa(i: int, etapa: Etapa):
+            siguiente = self.etapas[i + 1] if i + 1 < len(self.etapas) else None
+            salida = siguiente.entrada if siguiente else None
+            etapa._inicio = time.monotonic()
+            await asyncio.gather(*[
+                etapa._worker(salida, resultados) for _ in range(etapa.workers)
+            ])
+            etapa._fin = time.monotonic()
+            # Propagar fin del stream a la siguiente etapa
+            if siguiente is not None:
+                for _ in range(siguiente.workers):
+                    await siguiente.entrada.put(_FIN)
+
+        monitor = asyncio.create_task(self._monitor())
+        try:
+            await asyncio.gather(
+                _alimentar(),
+                *[_correr_etapa(i, e) for i, e in enumerate(self.etapas)],
+            )
+        finally:
+            monitor.cancel()
+
+        for etapa in self.etapas:
+            r = etapa.resumen()
+            logger.info(
+                f"  Etapa {etapa.nombre:<13}: {r['procesados']} ok, {r['descartados']} descartados, "
+                f"{r['errores']} errores | cola máx {r['profundidad_max']}/{etapa.cola_max} | "
+                f"{r['por_minuto']}/min en {r['duracion_seg']}s ({etapa.workers} workers)"
+            )
+        return resultados
+
+    def resumen(self) -> dict:
+        return {e.nombre: e.resumen() for e in self.etapas}
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import random
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    async def main():
+        async def escribir(n):
+            await asyncio.sleep(random.uniform(0.05, 0.2))
+            return {"n": n}
+
+        async def verificar(item):
+            await asyncio.sleep(random.uniform(0.02, 0.1))
+            return None if item["n"] % 7 == 0 else item
+
+        async def guardar(lote):
+            await asyncio.sleep(0.05)
+            return lote
+
+        pipe = Pipeline([
+            Etapa("escritura", escribir, workers=8, cola_max=5),
+            Etapa("verificacion", verificar, workers=3, cola_max=5),
+            Etapa("persistencia", guardar, workers=1, cola_max=10, lote=5),
+        ], intervalo_reporte=0.2)
+        inicio = time.monotonic()
+        res = await pipe.run(list(range(40)))
+        print(f"[OK] {len(res)} resultados en {time.monotonic() - inicio:.2f}s")
+
+    asyncio.run(main())
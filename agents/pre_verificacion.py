@@ -0,0 +1,313 @@
+"""
+pre_verificacion.py — Pre-verificador local por reglas (sin llamadas a Claude)
+
+Revisa en milisegundos lo que se puede comprobar contra los datos del repo:
+
+  1. Candidato ↔ partido   agents/data/candidatos.json y src/data/candidatos.ts
+                           ("Keiko Fujimori (Renovación Popular)" → observación)
+  2. Candidatos fallecidos src/data/candidatos.ts (fallecido: true)
+  3. Edades                public/data/candidatos_edades.json ("X, de 48 años")
+  4. Fechas electorales    config.CALENDARIO_ELECTORAL (primera vuelta 12/04/2026)
+  5. Cifras de encuestas   public/data/encuesta_*.json (intención de voto por candidato)
+
+Devuelve el mismo JSON que VerificacionAgent. VerificacionAgent lo usa así:
+  - categorías de bajo riesgo (FAQ) que pasan limpio → no se llama a Claude
+  - el resto → los hallazgos se envían a Claude como pistas en el prompt
+"""
+
+import json
+import logging
+import re
+from datetime import date
+from pathlib import Path
+
+import config
+from texto import plegar
+
+logger = logging.getLogger(__name__)
+
+CANDIDATOS_JSON = Path(__file__).parent / "data" / "candidatos.json"
+CANDIDATOS_TS   = config.PROJECT_ROOT / "src" / "data" / "candidatos.ts"
+PUBLIC_DATA_DIR = config.PROJECT_ROOT / "public" / "data"
+
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+
+# Frases que indican que una fecha se refiere al día de votación
+CLAVES_VOTACION = (
+    "primera vuelta", "segunda vuelta", "votar", "votacion", "jornada electoral",
+    "comicios", "dia de la eleccion", "dia de las elecciones", "elecciones generales",
+)
+
+CLAVES_ENCUESTA = ("encuesta", "ipsos", "intencion de voto", "simulacro", "sondeo")
+
+RE_FECHA = re.compile(
+    r"\b(\d{1,2})\s+de\s+(" + "|".join(MESES) + r")(?:\s+(?:de\s+|del\s+)?(\d{4}))?\b"
+)
+RE_CIFRA = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:%|por\s*ciento)")
+
+
+def _oraciones(texto: str) -> list[str]:
+    return [o.strip() for o in re.split(r"(?<=[.!?])\s+|\n+", texto) if o.strip()]
+
+
+def _observacion(frase: str, problema: str) -> dict:
+    return {"frase": frase[:200], "problema": problema}
+
+
+class PreVerificador:
+
+    def __init__(self):
+        self.partido_de: dict[str, str] = {}       # alias plegado → partido
+        self.nombre_de: dict[str, str] = {}        # alias plegado → nombre a mostrar
+        self.edad_de: dict[str, int] = {}          # nombre plegado → edad
+        self.fallecidos: dict[str, str] = {}       # nombre plegado → fecha
+        self.encuestas: dict[str, set[float]] = {} # nombre plegado → % publicados
+        self.partidos: set[str] = set()            # partidos plegados
+        self.fechas_validas = set(config.CALENDARIO_ELECTORAL.values())
+        self._cargar()
+
+        # Una sola regex con todos los aliases (los más largos primero)
+        aliases = sorted((a for a, p in self.partido_de.items() if p), key=len, reverse=True)
+        self._re_alias = re.compile(r"\b(" + "|".join(map(re.escape, aliases)) + r")\b") if aliases else None
+
+    # ------------------------------------------------------------------
+    # Datos de referencia
+    # ------------------------------------------------------------------
+
+    def _registrar_candidato(self, nombre: str, partido: str):
+        tokens = nombre.split()
+        aliases = {nombre}
+        if len(tokens) >= 3:
+            aliases.add(" ".join(tokens[:2]))        # "Alfonso López"
+            aliases.add(" ".join(tokens[1:3]))       # "López Chau"
+        for alias in aliases:
+            clave = plegar(alias)
+            previo = self.partido_de.get(clave)
+            if previo is not None and plegar(previo) != plegar(partido):
+                self.partido_de[clave] = ""          # alias ambiguo: no se usa
+                continue
+            self.partido_de[clave] = partido
+            self.nombre_de[clave] = nombre
+        self.partidos.add(plegar(partido))
+
+    def _cargar(self):
+        try:
+            with open(CANDIDATOS_JSON, encoding="utf-8") as f:
+                for c in json.load(f).get("candidatos", []):
+                    self._registrar_candidato(c["nombre"], c["partido"])
+                    if c.get("edad"):
+                        self.edad_de[plegar(c["nombre"])] = int(c["edad"])
+        except Exception as e:
+            logger.warning(f"Pre-verificación: no se pudo leer {CANDIDATOS_JSON.name}: {e}")
+
+        try:
+            ts = CANDIDATOS_TS.read_text(encoding="utf-8")
+            for bloque in re.split(r"\n\s*\{", ts):
+                nombre = re.search(r'name:\s*"([^"]+)"', bloque)
+                partido = re.search(r'party:\s*"([^"]+)"', bloque)
+                if not (nombre and partido):
+                    continue
+                self._registrar_candidato(nombre.group(1), partido.group(1))
+                if re.search(r"fallecido:\s*true", bloque):
+                    fecha = re.search(r'fechaFallecimiento:\s*"([^"]+)"', bloque)
+                    self.fallecidos[plegar(nombre.group(1))] = fecha.group(1) if fecha else "?"
+        except Exception as e:
+            logger.warning(f"Pre-verificación: no se pudo leer {CANDIDATOS_TS.name}: {e}")
+
+        try:
+            with open(PUBLIC_DATA_DIR / "candidatos_edades.json", encoding="utf-8") as f:
+                for c in json.load(f):
+                    self.edad_de.setdefault(plegar(c["nombre"]), int(c["edad"]))
+        except Exception as e:
+            logger.debug(f"Pre-verificación: sin edades ({e})")
+
+        for path in sorted(PUBLIC_DATA_DIR.glob("encuesta_*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                for fila in data.get("encuesta", {}).get("intencion_voto_actual", []):
+                    self.encuestas.setdefault(plegar(fila["candidato"]), set()).add(float(fila["total"]))
+            except Exception as e:
+                logger.debug(f"Pre-verificación: {path.name} ignorado ({e})")
+
+        for path in sorted(PUBLIC_DATA_DIR.glob("debate*_stats.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.fechas_validas.add(date.fromisoformat(json.load(f)["metadata"]["fecha"]))
+            except Exception:
+                pass
+
+    def _candidatos_en(self, oracion_plegada: str) -> list[str]:
+        """Aliases de candidatos mencionados en la oración (plegada)."""
+        if self._re_alias is None:
+            return []
+        return list(dict.fromkeys(m.group(1) for m in self._re_alias.finditer(oracion_plegada)))
+
+    def _mismo_partido(self, a: str, b: str) -> bool:
+        a, b = plegar(a).strip(), plegar(b).strip()
+        return a == b or (min(len(a), len(b)) >= 6 and (a in b or b in a))
+
+    def _partido_conocido(self, texto: str) -> bool:
+        return any(self._mismo_partido(texto, p) for p in self.partidos)
+
+    # ------------------------------------------------------------------
+    # Reglas
+    # ------------------------------------------------------------------
+
+    def _revisar_oracion(self, oracion: str) -> tuple[list[dict], int]:
+        """Retorna (observaciones, cifras sin comprobar) de una oración."""
+        obs: list[dict] = []
+        plegada = plegar(oracion)
+        aliases = self._candidatos_en(plegada)
+
+        for alias in aliases:
+            partido = self.partido_de[alias]
+            nombre = self.nombre_de[alias]
+
+            # "Nombre (Partido)" / "Nombre, de Partido" / "Nombre, candidato de Partido"
+            m = re.search(
+                rf"\b{re.escape(alias)}\b\s*(?:\(([^)]{{3,80}})\)|,?\s+(?:candidat[oa]\s+)?(?:de|por)\s+([^,.;]{{3,80}}))",
+                plegada,
+            )
+            mencionado = m and (m.group(1) or m.group(2))
+            if mencionado and self._partido_conocido(mencionado) and not self._mismo_partido(mencionado, partido):
+                obs.append(_observacion(
+                    oracion, f"{nombre} es candidato/a de {partido}, no de '{mencionado.strip()}'"
+                ))
+
+            clave_nombre = plegar(nombre)
+            if clave_nombre in self.fallecidos:
+                obs.append(_observacion(
+                    oracion, f"{nombre} figura como fallecido/a ({self.fallecidos[clave_nombre]}); revisar la referencia"
+                ))
+
+            edad = self.edad_de.get(clave_nombre)
+            m_edad = re.search(rf"\b{re.escape(alias)}\b[^.]{{0,40}}?\b(\d{{2}})\s+anos\b", plegada)
+            if edad and m_edad and abs(int(m_edad.group(1)) - edad) > 1:
+                obs.append(_observacion(oracion, f"Edad de {nombre}: {edad} años según datos JNE, no {m_edad.group(1)}"))
+
+        # Fechas de votación
+        if any(k in plegada for k in CLAVES_VOTACION):
+            for m in RE_FECHA.finditer(plegada):
+                anio = int(m.group(3)) if m.group(3) else config.CALENDARIO_ELECTORAL["primera_vuelta"].year
+                try:
+                    fecha = date(anio, MESES[m.group(2)], int(m.group(1)))
+                except ValueError:
+                    continue
+                if anio == config.CALENDARIO_ELECTORAL["primera_vuelta"].year and fecha not in self.fechas_validas:
+                    calendario = ", ".join(
+                        f"{k.replace('_', ' ')}: {v.strftime('%d/%m/%Y')}"
+                        for k, v in config.CALENDARIO_ELECTORAL.items()
+                    )
+                    obs.append(_observacion(oracion, f"Fecha {fecha.strftime('%d/%m/%Y')} no coincide con el calendario ({calendario})"))
+
+        # Cifras de encuestas
+        cifras = RE_CIFRA.findall(plegada)
+        sin_comprobar = len(cifras)
+        if cifras and aliases and any(k in plegada for k in CLAVES_ENCUESTA):
+            for alias in aliases:
+                publicados = self.encuestas.get(plegar(self.nombre_de[alias]))
+                if publicados is None:
+                    publicados = next((v for k, v in self.encuestas.items() if alias in k), None)
+                if not publicados:
+                    continue
+                m = re.search(rf"\b{re.escape(alias)}\b[^.%]{{0,60}}?(\d+(?:[.,]\d+)?)\s*(?:%|por\s*ciento)", plegada)
+                if not m:
+                    continue
+                valor = float(m.group(1).replace(",", "."))
+                if any(abs(valor - p) < 0.5 for p in publicados):
+                    sin_comprobar -= 1
+                else:
+                    obs.append(_observacion(
+                        oracion,
+                        f"{self.nombre_de[alias]}: {m.group(1)}% no coincide con las encuestas publicadas "
+                        f"({', '.join(f'{p:g}%' for p in sorted(publicados))})",
+                    ))
+                    sin_comprobar -= 1
+        return obs, max(0, sin_comprobar)
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    def verificar(self, articulo: dict) -> dict:
+        """
+        Mismo formato que VerificacionAgent.verify, más:
+          cifras_sin_verificar: porcentajes que las reglas no pudieron comprobar
+        """
+        texto = f"{articulo.get('titulo', '')}\n{articulo.get('contenido', '')}"
+        observaciones: list[dict] = []
+        cifras_sin_verificar = 0
+        for oracion in _oraciones(texto):
+            obs, n = self._revisar_oracion(oracion)
+            observaciones.extend(o for o in obs if o not in observaciones)
+            cifras_sin_verificar += n
+
+        nivel = "medio" if observaciones else "bajo"
+        return {
+            "aprobado":                  True,
+            "nivel_riesgo":              nivel,
+            "observaciones":             observaciones,
+            "requiere_revision_urgente": False,
+            "sugerencias":               ["Corregir los datos señalados según las fuentes oficiales"] if observaciones else [],
+            "cifras_sin_verificar":      cifras_sin_verificar,
+        }
+
+    def puede_omitir_claude(self, articulo: dict, resultado: dict) -> bool:
+        """
+        Solo las categorías de bajo riesgo (config.PREVERIFICACION_OMITIR_CATEGORIAS)
+        que pasan limpio, sin porcentajes que las reglas no pudieron comprobar, se
+        publican sin Claude: las reglas no detectan sesgo, difamación ni
+        afirmaciones sin respaldo.
+        """
+        if (resultado["observaciones"] or resultado.get("cifras_sin_verificar", 0) > 0
+                or articulo.get("requiere_revision_extendida")):
+            return False
+        return articulo.get("categoria") in config.PREVERIFICACION_OMITIR_CATEGORIAS
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_preverificador: PreVerificador | None = None
+
+
+def get_preverificador() -> PreVerificador:
+    global _preverificador
+    if _preverificador is None:
+        _preverificador = PreVerificador()
+    return _preverificador
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import time
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    inicio = time.perf_counter()
+    pre = get_preverificador()
+    print(f"  Datos cargados en {1000 * (time.perf_counter() - inicio):.1f} ms: "
+          f"{len(pre.partido_de)} aliases, {len(pre.encuestas)} candidatos en encuestas")
+
+    articulo = {
+        "titulo": "¿Se puede votar con DNI vencido en las Elecciones Perú 2026?",
+        "categoria": "faq",
+        "contenido": (
+            "El Reniec confirmó que el DNI vencido es válido para votar el 11 de abril de 2026.\n\n"
+            "Keiko Fujimori (Renovación Popular) lidera la encuesta de Ipsos con 13%.\n\n"
+            "Rafael López Aliaga obtiene 20% en la encuesta de intención de voto."
+        ),
+    }
+    inicio = time.perf_counter()
+    resultado = pre.verificar(articulo)
+    print(f"  Verificado en {1000 * (time.perf_counter() - inicio):.2f} ms")
+    for o in resultado["observaciones"]:
+        print(f"  - {o['problema']}")
+    print(f"[OK] nivel={resultado['nivel_riesgo']} omitir_claude={pre.puede_omitir_claude(articulo, resultado)}")
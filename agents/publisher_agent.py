@@ -92,8 +92,8 @@ class PublisherAgent:
     @property
     def dedup(self):
         if self._dedup is None:
-            from dedup_service import DeduplicationService
-            self._dedup = DeduplicationService()
+            from dedup_service import get_dedup_service
+            self._dedup = get_dedup_service()
         return self._dedup
 
     # ------------------------------------------------------------------
@@ -183,7 +183,7 @@ class PublisherAgent:
         if ok:
             # Registrar en antiduplicados
             try:
-                self.dedup.registrar_tema(
+                await self.dedup.registrar_tema_async(
                     titulo=articulo.get("titulo", ""),
                     slug=articulo.get("slug", ""),
                     keyword=articulo.get("keyword", ""),
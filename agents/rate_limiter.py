@@ -0,0 +1,177 @@
+"""
+rate_limiter.py — Limitador de tasa por tokens compartido por todos los agentes
+
+Dos token buckets (requests/minuto y tokens/minuto) compartidos por proceso.
+Cada llamada a Claude:
+  1. reserva 1 request + tokens estimados (entrada estimada + max_tokens)
+  2. tras la respuesta, reconcilia con msg.usage y devuelve lo no usado
+  3. si la API responde 429/529, respeta retry-after y reduce el ritmo
+     (factor adaptativo que se recupera poco a poco con cada éxito)
+
+Lo usa llm_client.LLMClient, así que cubre SEOAgent, todos los ArticleWriter,
+VerificacionAgent y DeduplicationService.sugerir_angulo_nuevo.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Any
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CHARS_POR_TOKEN = 3.5      # estimación conservadora para español
+FACTOR_MIN = 0.1           # ritmo mínimo tras varios 429 seguidos
+FACTOR_RECUPERACION = 0.05  # cuánto se recupera el ritmo por cada éxito
+
+
+def estimar_tokens_entrada(params: dict[str, Any]) -> int:
+    """Estimación barata de tokens de entrada a partir de system + messages."""
+    texto = json.dumps(
+        [params.get("system", ""), params.get("messages", [])], ensure_ascii=False
+    )
+    return int(len(texto) / CHARS_POR_TOKEN) + 1
+
+
+class TokenBucket:
+
+    def __init__(self, capacidad: float, por_segundo: float):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self.tokens = capacidad
+        self._ultimo = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.capacidad, self.tokens + (ahora - self._ultimo) * self.por_segundo)
+        self._ultimo = ahora
+
+    async def adquirir(self, n: float):
+        """Espera hasta poder descontar n tokens. El lock mantiene orden FIFO."""
+        # Una petición más grande que el bucket entero espera a tenerlo lleno
+        n_efectivo = min(n, self.capacidad)
+        async with self._lock:
+            while True:
+                self._recargar()
+                if self.tokens >= n_efectivo:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n_efectivo - self.tokens) / self.por_segundo)
+
+    def ajustar(self, delta: float):
+        """delta > 0 devuelve tokens; delta < 0 cobra tokens extra (puede quedar en negativo)."""
+        self._recargar()
+        self.tokens = min(self.capacidad, self.tokens + delta)
+
+
+class RateLimiter:
+
+    def __init__(self, rpm: int | None = None, tpm: int | None = None):
+        self.rpm = rpm or config.LLM_RPM
+        self.tpm = tpm or config.LLM_TPM
+        self.factor = 1.0
+        self._pausa_hasta = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._crear_buckets()
+
+        # Métricas
+        self.esperas_seg = 0.0
+        self.rechazos_429 = 0
+
+    def _crear_buckets(self):
+        self.requests = TokenBucket(self.rpm, self.rpm / 60 * self.factor)
+        self.tokens = TokenBucket(self.tpm, self.tpm / 60 * self.factor)
+
+    def _aplicar_factor(self):
+        self.requests.por_segundo = self.rpm / 60 * self.factor
+        self.tokens.por_segundo = self.tpm / 60 * self.factor
+
+    async def adquirir(self, tokens_estimados: int):
+        """Bloquea hasta que haya cupo para 1 request y tokens_estimados tokens."""
+        # Los locks de los buckets son por event loop
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._crear_buckets()
+
+        inicio = time.monotonic()
+        pausa = self._pausa_hasta - inicio
+        if pausa > 0:
+            await asyncio.sleep(pausa)
+        await self.requests.adquirir(1)
+        await self.tokens.adquirir(tokens_estimados)
+        self.esperas_seg += time.monotonic() - inicio
+
+    def reconciliar(self, tokens_estimados: int, tokens_reales: int):
+        """Devuelve (o cobra) la diferencia entre lo reservado y lo consumido."""
+        self.tokens.ajustar(tokens_estimados - tokens_reales)
+
+    def registrar_exito(self):
+        if self.factor < 1.0:
+            self.factor = min(1.0, self.factor + FACTOR_RECUPERACION)
+            self._aplicar_factor()
+
+    def registrar_rechazo(self, retry_after: float | None, intento: int) -> float:
+        """
+        Registra un 429/529: reduce el ritmo a la mitad y pausa a todos los
+        agentes. Retorna los segundos que debe esperar el llamador.
+        """
+        self.rechazos_429 += 1
+        self.factor = max(FACTOR_MIN, self.factor * 0.5)
+        self._aplicar_factor()
+
+        backoff = min(config.LLM_BACKOFF_MAX_SEG, config.LLM_BACKOFF_BASE_SEG * 2 ** intento)
+        espera = max(retry_after or 0.0, backoff) + random.uniform(0, 1)
+        self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + espera)
+        logger.warning(
+            f"Rate limit de Claude: esperando {espera:.1f}s "
+            f"(retry-after={retry_after}, ritmo al {self.factor:.0%})"
+        )
+        return espera
+
+    def resumen(self) -> dict:
+        return {
+            "rechazos_429": self.rechazos_429,
+            "espera_total_seg": round(self.esperas_seg, 1),
+            "factor_ritmo": round(self.factor, 2),
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instancia compartida por proceso
+# ---------------------------------------------------------------------------
+
+_rate_limiter: RateLimiter | None = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    async def main():
+        limiter = RateLimiter(rpm=120, tpm=6000)
+        inicio = time.monotonic()
+        # 6000 tokens de capacidad + 100 tokens/s: 10 llamadas de 1000 tokens ≈ 40s
+        # sin reconciliar; reconciliando a 200 reales por llamada, casi inmediato
+        for _ in range(10):
+            await limiter.adquirir(1000)
+            limiter.reconciliar(1000, 200)
+        print(f"[OK] 10 adquisiciones en {time.monotonic() - inicio:.2f}s")
+        espera = limiter.registrar_rechazo(retry_after=2.0, intento=0)
+        print(f"  Tras 429: espera {espera:.1f}s, ritmo {limiter.factor:.0%}")
+
+    asyncio.run(main())
@@ -7,12 +7,15 @@ Tablas:
 
 API endpoints:
   GET  /queue              → artículos pendientes
+  PUT  /queue/{id}         → editar (re-verifica solo los párrafos cambiados)
   POST /queue/{id}/approve → aprobar
   POST /queue/{id}/reject  → rechazar
   GET  /queue/stats        → conteos del día
+  POST /dedup/check        → estado de duplicado de títulos (vía servicio de embeddings)
   GET  /docs               → Swagger UI
 """
 
+import asyncio
 import json
 from datetime import date, datetime
 from pathlib import Path
@@ -67,7 +70,8 @@ class TemaPublicado(Base):
     slug            = Column(String, nullable=False)
     keyword         = Column(String, nullable=False)
     categoria       = Column(String, nullable=False)
-    embedding       = Column(LargeBinary, nullable=True)             # numpy vector serializado
+    embedding       = Column(LargeBinary, nullable=True)             # vector serializado (embedding_storage.py)
+    embedding_version = Column(Integer, nullable=True)               # formato del blob; NULL = np.save original
     publicado_en    = Column(DateTime, default=datetime.utcnow)
     actualizado_en  = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     veces_publicado = Column(Integer, default=1)
@@ -77,6 +81,20 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 
+def migrar_db():
+    """
+    Agrega a las tablas existentes las columnas nuevas (create_all no lo hace).
+    Es un paso explícito (run.py --migrar-db, y al arrancar el run diario y la
+    API), no un efecto de importar o de crear un DeduplicationService: así
+    leer la base no reescribe agents/articulos.db.
+    """
+    init_db()
+    with engine.begin() as conn:
+        columnas = {fila[1] for fila in conn.exec_driver_sql("PRAGMA table_info(temas_publicados)")}
+        if "embedding_version" not in columnas:
+            conn.exec_driver_sql("ALTER TABLE temas_publicados ADD COLUMN embedding_version INTEGER")
+
+
 # ---------------------------------------------------------------------------
 # FastAPI
 # ---------------------------------------------------------------------------
@@ -224,24 +242,67 @@ try:
         finally:
             db.close()
 
-    @app.put("/queue/{articulo_id}", summary="Editar artículo")
-    def update_articulo(articulo_id: int, body: dict):
+    async def _reverificar(articulo: dict, verificacion_json: str | None) -> dict | None:
+        """Verificación incremental del contenido editado (solo párrafos cambiados)."""
+        if not config.ANTHROPIC_API_KEY:
+            return None
+        from verificacion_agent import VerificacionAgent
+        previa = None
+        if verificacion_json:
+            try:
+                previa = json.loads(verificacion_json)
+            except Exception:
+                previa = None
+        return await VerificacionAgent().verify_incremental(articulo, previa)
+
+    def _cargar_para_editar(articulo_id: int) -> tuple[dict, str | None]:
+        db = _session()
+        try:
+            a = db.query(Articulo).filter(Articulo.id == articulo_id).first()
+            if not a:
+                raise HTTPException(status_code=404, detail="Artículo no encontrado")
+            return {"titulo": a.titulo, "categoria": a.categoria, "contenido": a.contenido}, a.verificacion_json
+        finally:
+            db.close()
+
+    def _guardar_edicion(articulo_id: int, cambios: dict, verificacion: dict | None):
         db = _session()
         try:
             a = db.query(Articulo).filter(Articulo.id == articulo_id).first()
             if not a:
                 raise HTTPException(status_code=404, detail="Artículo no encontrado")
-            if "titulo" in body:
-                a.titulo = body["titulo"]
-            if "contenido" in body:
-                a.contenido = body["contenido"]
-            if "excerpt" in body:
-                a.excerpt = body["excerpt"][:150]
+            for campo, valor in cambios.items():
+                setattr(a, campo, valor)
+            if verificacion is not None:
+                a.verificacion_json = json.dumps(verificacion, ensure_ascii=False)
+                # Una re-verificación limpia también quita la marca (análisis la lleva siempre, ver AnalisisWriter)
+                a.requiere_revision_extendida = (
+                    verificacion.get("nivel_riesgo") in ("medio", "alto") or a.categoria == "analisis"
+                )
             db.commit()
-            return {"ok": True, "id": articulo_id}
         finally:
             db.close()
 
+    @app.put("/queue/{articulo_id}", summary="Editar artículo")
+    async def update_articulo(articulo_id: int, body: dict):
+        # La base se lee y se escribe en el threadpool y con sesiones cortas:
+        # la sesión no queda abierta mientras Claude re-verifica
+        articulo, verificacion_json = await asyncio.to_thread(_cargar_para_editar, articulo_id)
+        contenido_cambio = "contenido" in body and body["contenido"] != articulo["contenido"]
+        cambios = {}
+        if "titulo" in body:
+            cambios["titulo"] = body["titulo"]
+        if "contenido" in body:
+            cambios["contenido"] = body["contenido"]
+        if "excerpt" in body:
+            cambios["excerpt"] = body["excerpt"][:150]
+
+        verificacion = None
+        if contenido_cambio:
+            verificacion = await _reverificar({**articulo, **cambios}, verificacion_json)
+        await asyncio.to_thread(_guardar_edicion, articulo_id, cambios, verificacion)
+        return {"ok": True, "id": articulo_id, "verificacion": verificacion}
+
     @app.post("/queue/{articulo_id}/approve", summary="Aprobar artículo")
     def approve(articulo_id: int):
         db = _session()
@@ -269,6 +330,17 @@ try:
         finally:
             db.close()
 
+    @app.post("/dedup/check", summary="Chequear duplicados de uno o varios títulos")
+    async def dedup_check(body: dict):
+        from dedup_service import get_dedup_service
+        titulos = body.get("titulos") or [body.get("titulo", "")]
+        categorias = body.get("categorias") or [body.get("categoria", "noticias")] * len(titulos)
+        if len(categorias) != len(titulos) or not all(titulos):
+            raise HTTPException(status_code=422, detail="Se requieren títulos y una categoría por título")
+        dedup = get_dedup_service()
+        vecs = await dedup.get_embeddings_async(titulos)
+        return {"resultados": dedup.check_duplicates_batch(titulos, categorias, vecs=vecs)}
+
     @app.get("/queue/stats", summary="Estadísticas del día")
     def stats():
         db = _session()
@@ -299,7 +371,7 @@ except ImportError:
 # ---------------------------------------------------------------------------
 
 if __name__ == "__main__":
-    init_db()
+    migrar_db()
     print(f"[OK] Base de datos inicializada en: {config.DB_PATH}")
 
     if app is not None:
@@ -4,9 +4,17 @@ run.py — Punto de entrada CLI del sistema de generación de artículos
 Uso:
   python run.py                          # run completo
   python run.py --dry-run                # genera pero no publica
+  python run.py --batch                  # run nocturno vía Message Batches API (50% costo)
+  python run.py --no-cache               # ignora la caché de respuestas de Claude
+  python run.py --runs                   # lista los últimos runs y su avance
+  python run.py --resume <run_id>        # retoma un run interrumpido
   python run.py --categoria perfiles     # solo ese writer
   python run.py --api                    # levanta FastAPI de revisión (puerto 8001)
+  python run.py --embeddings-server      # servicio de embeddings (socket Unix)
   python run.py --audit                  # detecta duplicados existentes
+  python run.py --eval-ann               # recall del índice ANN vs búsqueda exacta
+  python run.py --migrar-embeddings float16   # compacta los embeddings guardados
+  python run.py --migrar-db              # agrega las columnas nuevas a articulos.db
   python run.py --publish-approved       # publica artículos aprobados en cola
 
 Cron:
@@ -52,23 +60,44 @@ def setup_logging(verbose: bool = False):
 # Comandos
 # ---------------------------------------------------------------------------
 
-async def cmd_run(dry_run: bool, categoria: str | None, verbose: bool):
+async def cmd_run(dry_run: bool, categoria: str | None, verbose: bool, batch: bool = False,
+                  no_cache: bool = False, resume_id: str | None = None):
     setup_logging(verbose)
     logger = logging.getLogger("run")
 
     import config
+    if no_cache:
+        config.LLM_CACHE_ACTIVO = False
     logger.info(f"Observa Perú — Sistema de Generación Automática de Artículos")
     logger.info(f"API Key:     {'configurada' if config.ANTHROPIC_API_KEY else 'NO CONFIGURADA'}")
     logger.info(f"CMS Type:    {config.CMS_TYPE}")
     logger.info(f"Content dir: {config.CONTENT_DIR}")
     logger.info(f"Dry run:     {dry_run}")
+    logger.info(f"Batch:       {batch}")
+    if resume_id:
+        logger.info(f"Reanudando:  {resume_id}")
+    logger.info(f"Caché LLM:   {'activada' if config.LLM_CACHE_ACTIVO else 'desactivada'}")
+
+    from revision_queue import migrar_db
+    migrar_db()
 
     from orchestrator import Orchestrator
-    orch = Orchestrator(dry_run=dry_run, categoria_filtro=categoria)
+    orch = Orchestrator(dry_run=dry_run, categoria_filtro=categoria, batch=batch, resume_id=resume_id)
     stats = await orch.run_daily()
     return stats
 
 
+def cmd_runs():
+    from run_state import listar_runs
+    runs = listar_runs()
+    if not runs:
+        print("No hay runs registrados.")
+        return
+    for r in runs:
+        print(f"  {r['run_id']}  {r['creado_en'][:19]}  {r['modo']:<8} {r['estado']:<11} "
+              f"{r['en_cola']}/{r['temas']} en cola")
+
+
 async def cmd_publish_approved(dry_run: bool):
     setup_logging()
     logger = logging.getLogger("publish")
@@ -84,12 +113,48 @@ async def cmd_audit():
     await audit_duplicados()
 
 
+def cmd_eval_ann():
+    setup_logging()
+    from ann_backend import evaluar_recall
+    from embedding_index import get_embedding_index
+    resultado = evaluar_recall(get_embedding_index())
+    for clave, valor in resultado.items():
+        print(f"  {clave:<24} {valor}")
+
+
+def cmd_migrar_embeddings(formato: str):
+    setup_logging()
+    from embedding_storage import migrar_embeddings
+    resultado = migrar_embeddings(formato)
+    print(f"  filas migradas: {resultado['filas']} en {resultado['segundos']}s")
+    print(f"  tamaño: {resultado['bytes_antes'] / 1e6:.2f} MB → {resultado['bytes_despues'] / 1e6:.2f} MB")
+    for nivel, metricas in resultado["precision"].items():
+        print(f"  {nivel:<8} {metricas}")
+
+
+def cmd_migrar_db():
+    setup_logging()
+    from revision_queue import migrar_db
+    import config
+    migrar_db()
+    print(f"  base de datos al día: {config.DB_PATH}")
+
+
+def cmd_embeddings_server():
+    setup_logging()
+    from embedding_service import ServidorEmbeddings
+    try:
+        asyncio.run(ServidorEmbeddings().servir())
+    except KeyboardInterrupt:
+        pass
+
+
 def cmd_api():
     setup_logging()
     try:
-        from revision_queue import app, init_db
+        from revision_queue import app, migrar_db
         import uvicorn
-        init_db()
+        migrar_db()
         print("Levantando API de revisión en http://localhost:8001")
         print("Swagger UI: http://localhost:8001/docs")
         uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -111,6 +176,8 @@ def main():
 Ejemplos:
   python run.py                          # run completo del día
   python run.py --dry-run                # simula sin publicar
+  python run.py --batch                  # envía writers y verificación como batch
+  python run.py --resume 20260412-060000-a1b2   # retoma solo los temas pendientes
   python run.py --categoria faq          # solo artículos FAQ
   python run.py --api                    # levanta API REST de revisión
   python run.py --audit                  # detecta duplicados
@@ -127,13 +194,45 @@ Ejemplos:
         choices=["perfiles", "debates", "noticias", "analisis", "faq"],
         help="Ejecutar solo el writer de esta categoría",
     )
+    parser.add_argument(
+        "--batch", action="store_true",
+        help="Usar Message Batches API (asíncrono, mitad de costo; retoma si se interrumpe)",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="No leer ni escribir la caché persistente de respuestas de Claude",
+    )
+    parser.add_argument(
+        "--resume", metavar="RUN_ID",
+        help="Retomar un run interrumpido (reutiliza su ingesta, temas y artículos ya generados)",
+    )
+    parser.add_argument(
+        "--runs", action="store_true",
+        help="Listar los últimos runs con su run_id y avance",
+    )
     parser.add_argument(
         "--api", action="store_true",
         help="Levantar servidor FastAPI de cola de revisión (puerto 8001)",
     )
+    parser.add_argument(
+        "--embeddings-server", action="store_true",
+        help="Levantar el servicio de embeddings (socket Unix) compartido por el orquestador y la API",
+    )
     parser.add_argument(
         "--audit", action="store_true",
-        help="Detectar duplicados entre artículos ya publicados",
+        help="Detectar duplicados entre artículos ya publicados (reporte CSV/JSON en agents/auditorias)",
+    )
+    parser.add_argument(
+        "--eval-ann", action="store_true",
+        help="Medir recall@k y latencia del índice ANN de duplicados contra la búsqueda exacta",
+    )
+    parser.add_argument(
+        "--migrar-embeddings", metavar="FORMATO", choices=["float32", "float16", "int8"],
+        help="Convertir los embeddings guardados a float32|float16|int8 y medir la precisión de cada nivel",
+    )
+    parser.add_argument(
+        "--migrar-db", action="store_true",
+        help="Agregar a articulos.db las columnas que faltan (también se hace al iniciar el run y la API)",
     )
     parser.add_argument(
         "--publish-approved", action="store_true",
@@ -149,9 +248,24 @@ Ejemplos:
     if args.api:
         cmd_api()
 
+    elif args.embeddings_server:
+        cmd_embeddings_server()
+
+    elif args.runs:
+        cmd_runs()
+
     elif args.audit:
         asyncio.run(cmd_audit())
 
+    elif args.eval_ann:
+        cmd_eval_ann()
+
+    elif args.migrar_embeddings:
+        cmd_migrar_embeddings(args.migrar_embeddings)
+
+    elif args.migrar_db:
+        cmd_migrar_db()
+
     elif args.publish_approved:
         asyncio.run(cmd_publish_approved(dry_run=args.dry_run))
 
@@ -161,6 +275,9 @@ Ejemplos:
             dry_run=args.dry_run,
             categoria=args.categoria,
             verbose=args.verbose,
+            batch=args.batch,
+            no_cache=args.no_cache,
+            resume_id=args.resume,
         ))
         # Exit code 0 siempre (errores parciales son normales)
         sys.exit(0)
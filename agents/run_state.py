@@ -0,0 +1,259 @@
+"""
+run_state.py — Estado durable de cada run diario (checkpoints para --resume)
+
+Cada run tiene un run_id y se guarda en SQLite local (config.RUNS_DB_PATH):
+
+  runs      : run_id, modo (pipeline|batch), categoría, ingesta, tokens, resumen
+  run_temas : una fila por tema con su máquina de estados
+
+      planned → written → verified → queued
+         └──────┴──────────┴──→ failed   (se reintenta al reanudar)
+
+Los artículos escritos y verificados se guardan con el tema, así que si el
+proceso muere en el artículo 30 de 40, `run.py --resume <run_id>` reutiliza
+la ingesta, los temas del SEO y todo lo ya generado, y solo procesa lo que
+falta, sin volver a llamar a Claude por lo terminado.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import config
+
+logger = logging.getLogger(__name__)
+
+ESTADOS = ("planned", "written", "verified", "queued", "failed")
+
+
+class RunState:
+
+    def __init__(self, run_id: str, path: str | None = None):
+        self.run_id = run_id
+        self.path = path or config.RUNS_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id       TEXT PRIMARY KEY,
+                creado_en    TEXT NOT NULL,
+                modo         TEXT NOT NULL,
+                categoria    TEXT,
+                estado       TEXT NOT NULL DEFAULT 'en_curso',
+                ingesta_json TEXT,
+                tokens_json  TEXT,
+                resumen_json TEXT
+            );
+            CREATE TABLE IF NOT EXISTS run_temas (
+                run_id            TEXT NOT NULL,
+                tema_id           TEXT NOT NULL,
+                orden             INTEGER NOT NULL,
+                tema_json         TEXT NOT NULL,
+                estado            TEXT NOT NULL DEFAULT 'planned',
+                articulo_json     TEXT,
+                verificacion_json TEXT,
+                articulo_id       INTEGER,
+                error             TEXT,
+                actualizado_en    TEXT NOT NULL,
+                PRIMARY KEY (run_id, tema_id)
+            );
+        """)
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Creación / carga
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def crear(cls, modo: str, categoria: str | None = None) -> "RunState":
+        run_id = f"{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+        estado = cls(run_id)
+        with estado._lock:
+            estado._conn.execute(
+                "INSERT INTO runs (run_id, creado_en, modo, categoria) VALUES (?, ?, ?, ?)",
+                (run_id, datetime.utcnow().isoformat(), modo, categoria),
+            )
+            estado._conn.commit()
+        return estado
+
+    @classmethod
+    def cargar(cls, run_id: str) -> "RunState | None":
+        estado = cls(run_id)
+        if estado._run() is None:
+            return None
+        return estado
+
+    def _run(self) -> sqlite3.Row | None:
+        with self._lock:
+            cur = self._conn.execute(
+                "SELECT modo, categoria, estado, ingesta_json, tokens_json FROM runs WHERE run_id = ?",
+                (self.run_id,),
+            )
+            return cur.fetchone()
+
+    @property
+    def modo(self) -> str:
+        return self._run()[0]
+
+    @property
+    def categoria(self) -> str | None:
+        return self._run()[1]
+
+    # ------------------------------------------------------------------
+    # Ingesta, tokens y resumen del run
+    # ------------------------------------------------------------------
+
+    def _set_run(self, columna: str, valor: dict):
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE runs SET {columna} = ? WHERE run_id = ?",
+                (json.dumps(valor, ensure_ascii=False), self.run_id),
+            )
+            self._conn.commit()
+
+    def guardar_ingesta(self, ingesta: dict):
+        self._set_run("ingesta_json", ingesta)
+
+    def ingesta(self) -> dict | None:
+        raw = self._run()[3]
+        return json.loads(raw) if raw else None
+
+    def guardar_tokens(self, tokens: dict):
+        self._set_run("tokens_json", tokens)
+
+    def tokens(self) -> dict:
+        raw = self._run()[4]
+        return json.loads(raw) if raw else {}
+
+    def finalizar(self, resumen: dict):
+        self._set_run("resumen_json", resumen)
+        with self._lock:
+            self._conn.execute("UPDATE runs SET estado = 'completado' WHERE run_id = ?", (self.run_id,))
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Temas
+    # ------------------------------------------------------------------
+
+    def guardar_temas(self, temas: list[dict]) -> list[dict]:
+        """Registra los temas como 'planned'. Retorna items {tema_id, tema, estado}."""
+        ahora = datetime.utcnow().isoformat()
+        items = [{"tema_id": f"tema-{i:03d}", "tema": t, "estado": "planned"} for i, t in enumerate(temas)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO run_temas (run_id, tema_id, orden, tema_json, actualizado_en) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.run_id, it["tema_id"], i, json.dumps(it["tema"], ensure_ascii=False), ahora)
+                 for i, it in enumerate(items)],
+            )
+            self._conn.commit()
+        return items
+
+    def items(self, estados: tuple[str, ...] | None = None) -> list[dict]:
+        """
+        Retorna los temas del run como items del pipeline:
+        {tema_id, tema, estado, articulo?, verificacion?, id?}
+        """
+        sql = ("SELECT tema_id, tema_json, estado, articulo_json, verificacion_json, articulo_id "
+               "FROM run_temas WHERE run_id = ?")
+        args: list = [self.run_id]
+        if estados:
+            sql += f" AND estado IN ({','.join('?' * len(estados))})"
+            args.extend(estados)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY orden", args).fetchall()
+
+        items = []
+        for tema_id, tema_json, estado, art_json, ver_json, art_id in rows:
+            item = {"tema_id": tema_id, "tema": json.loads(tema_json), "estado": estado}
+            if art_json:
+                item["articulo"] = json.loads(art_json)
+            if ver_json:
+                item["verificacion"] = json.loads(ver_json)
+            if estado == "queued":
+                item["id"] = art_id
+            items.append(item)
+        return items
+
+    def pendientes(self) -> list[dict]:
+        """Temas aún no encolados (incluye los fallidos, que se reintentan)."""
+        return self.items(("planned", "written", "verified", "failed"))
+
+    def marcar(
+        self,
+        tema_id: str,
+        estado: str,
+        articulo: dict | None = None,
+        verificacion: dict | None = None,
+        articulo_id: int | None = None,
+        error: str | None = None,
+    ):
+        assert estado in ESTADOS, estado
+        sets = ["estado = ?", "actualizado_en = ?", "error = ?"]
+        args: list = [estado, datetime.utcnow().isoformat(), error]
+        if articulo is not None:
+            sets.append("articulo_json = ?")
+            args.append(json.dumps(articulo, ensure_ascii=False))
+        if verificacion is not None:
+            sets.append("verificacion_json = ?")
+            args.append(json.dumps(verificacion, ensure_ascii=False))
+        if articulo_id is not None:
+            sets.append("articulo_id = ?")
+            args.append(articulo_id)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE run_temas SET {', '.join(sets)} WHERE run_id = ? AND tema_id = ?",
+                [*args, self.run_id, tema_id],
+            )
+            self._conn.commit()
+
+    def conteo(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT estado, COUNT(*) FROM run_temas WHERE run_id = ? GROUP BY estado",
+                (self.run_id,),
+            ).fetchall()
+        return dict(rows)
+
+
+def listar_runs(limite: int = 10) -> list[dict]:
+    """Últimos runs con su estado, para elegir cuál reanudar."""
+    estado = RunState("")
+    with estado._lock:
+        rows = estado._conn.execute(
+            "SELECT r.run_id, r.creado_en, r.modo, r.estado, "
+            "       SUM(t.estado = 'queued'), COUNT(t.tema_id) "
+            "FROM runs r LEFT JOIN run_temas t ON t.run_id = r.run_id "
+            "GROUP BY r.run_id ORDER BY r.creado_en DESC LIMIT ?",
+            (limite,),
+        ).fetchall()
+    return [
+        {"run_id": r[0], "creado_en": r[1], "modo": r[2], "estado": r[3],
+         "en_cola": r[4] or 0, "temas": r[5]}
+        for r in rows
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.RUNS_DB_PATH = f"{tmp}/runs.db"
+        run = RunState.crear("pipeline")
+        run.guardar_ingesta({"noticias_hoy": [], "candidatos": []})
+        items = run.guardar_temas([{"titulo": "A"}, {"titulo": "B"}, {"titulo": "C"}])
+        run.marcar(items[0]["tema_id"], "written", articulo={"slug": "a"})
+        run.marcar(items[1]["tema_id"], "queued", articulo={"slug": "b"}, verificacion={}, articulo_id=7)
+
+        reanudado = RunState.cargar(run.run_id)
+        print(f"  Run {run.run_id}: {reanudado.conteo()}")
+        print(f"  Pendientes: {[i['tema_id'] + ':' + i['estado'] for i in reanudado.pendientes()]}")
+        print(f"[OK] {listar_runs()}")
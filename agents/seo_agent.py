@@ -3,7 +3,9 @@ seo_agent.py — Agente SEO: genera 40 temas únicos por día usando Claude
 
 Proceso:
   1. Llama a Claude con contexto de ingesta → 70 títulos candidatos en JSON
-  2. Chequea duplicados con DeduplicationService
+  2. Descarta casi-duplicados dentro de la misma tanda (se queda con el de
+     mayor prioridad_seo de cada grupo) y chequea el resto contra lo
+     publicado, toda la tanda a la vez (check_duplicates_batch)
   3. Reformula los "actualizables" con sugerir_angulo_nuevo()
   4. Si aprobados < 40, pide 30 temas adicionales y repite
   5. Retorna lista de exactamente MAX_ARTICULOS_DIA temas
@@ -16,10 +18,12 @@ import re
 from pathlib import Path
 from typing import Any
 
-import anthropic
+import numpy as np
 
 import config
-from dedup_service import DeduplicationService
+from dedup_service import UMBRALES, get_dedup_service
+from embedding_index import normalizar
+from llm_client import get_llm_client, registrar_uso
 
 logger = logging.getLogger(__name__)
 
@@ -107,24 +111,66 @@ def _parse_json_response(text: str) -> list[dict]:
 class SEOAgent:
 
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
-        self.dedup = DeduplicationService()
+        self.llm = get_llm_client()
+        self.dedup = get_dedup_service()
         self.system_prompt = _load_system_prompt()
         self.tokens_input = 0
         self.tokens_output = 0
+        self.tokens_cache_write = 0
+        self.tokens_cache_read = 0
 
-    def _call_claude(self, user_prompt: str) -> list[dict]:
+    async def _call_claude(self, user_prompt: str) -> list[dict]:
         """Llama a Claude y retorna lista de temas parseados."""
-        msg = self.client.messages.create(
+        msg = await self.llm.create(
+            "seo",
             model=config.CLAUDE_MODEL,
             max_tokens=8000,
             system=self.system_prompt,
             messages=[{"role": "user", "content": user_prompt}],
         )
-        self.tokens_input += msg.usage.input_tokens
-        self.tokens_output += msg.usage.output_tokens
+        registrar_uso(self, msg.usage)
         return _parse_json_response(msg.content[0].text)
 
+    async def _dedup_tanda(self, temas: list[dict], fijos: list[dict]) -> tuple[list[tuple[dict, dict]], int]:
+        """
+        Dedup dentro de la tanda: matriz de similitud entre todos los títulos
+        (más los ya aprobados en `fijos`, que siempre se conservan). Recorre
+        por prioridad_seo descendente y descarta un tema si se parece a uno ya
+        conservado por encima del umbral "duplicado" de su categoría (el más
+        estricto de los dos). Retorna (temas conservados en su orden original
+        con el estado de duplicado contra lo publicado, cantidad descartada).
+        """
+        if not temas:
+            return [], 0
+        todos = fijos + temas
+        titulos = [t.get("titulo", "") for t in todos]
+        categorias = [t.get("categoria", "noticias") for t in todos]
+        vecs = await self.dedup.get_embeddings_async(titulos)
+        normados = normalizar(vecs)
+        sims = normados @ normados.T
+        umbral = np.array([UMBRALES.get(c, UMBRALES["noticias"])["duplicado"] for c in categorias])
+        umbral_par = np.maximum.outer(umbral, umbral)
+
+        conservados = np.zeros(len(todos), dtype=bool)
+        conservados[:len(fijos)] = True
+        orden = sorted(
+            range(len(fijos), len(todos)),
+            key=lambda i: -float(todos[i].get("prioridad_seo") or 0),
+        )
+        descartados = 0
+        for i in orden:
+            if np.any(conservados & (sims[i] >= umbral_par[i])):
+                descartados += 1
+                logger.debug(f"Descartado (duplicado en la tanda): {titulos[i]}")
+                continue
+            conservados[i] = True
+
+        idx = [i for i in range(len(fijos), len(todos)) if conservados[i]]
+        estados = self.dedup.check_duplicates_batch(
+            [titulos[i] for i in idx], [categorias[i] for i in idx], vecs=vecs[idx]
+        )
+        return [(todos[i], e) for i, e in zip(idx, estados)], descartados
+
     async def run(self, datos_ingesta: dict) -> list[dict]:
         """
         Genera lista final de MAX_ARTICULOS_DIA temas únicos.
@@ -133,56 +179,82 @@ class SEOAgent:
         descartados = 0
         reformulados = 0
 
-        async def _procesar_tema(tema: dict) -> dict | None:
+        async def _aceptar_tanda(tanda: list[tuple[dict, dict]]):
+            """
+            Toma de la tanda los temas no duplicados hasta completar el día.
+            Los "actualizable" se reformulan todos juntos y los títulos nuevos
+            pasan por el mismo dedup que la tanda (_dedup_tanda): entre sí,
+            contra los ya aprobados y contra el índice. Si uno sigue siendo
+            duplicado el tema se descarta y su lugar pasa al siguiente candidato.
+            """
             nonlocal descartados, reformulados
-            titulo    = tema.get("titulo", "")
-            categoria = tema.get("categoria", "noticias")
-
-            resultado = self.dedup.check_duplicate(titulo, categoria)
-
-            if resultado["status"] == "duplicado":
-                descartados += 1
-                logger.debug(f"Descartado (dup): {titulo}")
-                return None
-
-            if resultado["status"] == "actualizable":
-                articulo_similar = resultado.get("articulo_similar") or {}
-                articulo_similar["dias"] = resultado.get("dias_desde_publicacion", 0)
-                nuevo_titulo = self.dedup.sugerir_angulo_nuevo(titulo, articulo_similar)
-                tema = {**tema, "titulo": nuevo_titulo, "tipo": "actualizacion",
-                        "articulo_original_slug": articulo_similar.get("slug", "")}
-                reformulados += 1
-                logger.debug(f"Reformulado: {titulo} → {nuevo_titulo}")
-            else:
-                tema = {**tema, "tipo": "nuevo", "articulo_original_slug": ""}
-
-            return tema
+            candidatos = []
+            for tema, dup in tanda:
+                if dup["status"] == "duplicado":
+                    descartados += 1
+                    logger.debug(f"Descartado (dup): {tema.get('titulo', '')}")
+                else:
+                    candidatos.append((tema, dup))
+
+            while candidatos and len(aprobados) < config.MAX_ARTICULOS_DIA:
+                cupo = config.MAX_ARTICULOS_DIA - len(aprobados)
+                elegidos, candidatos = candidatos[:cupo], candidatos[cupo:]
+
+                actualizables = [(t, d) for t, d in elegidos if d["status"] == "actualizable"]
+                pedidos = []
+                for tema, dup in actualizables:
+                    similar = {**(dup.get("articulo_similar") or {}), "dias": dup.get("dias_desde_publicacion", 0)}
+                    pedidos.append((tema.get("titulo", ""), similar))
+                nuevos_titulos = await self.dedup.sugerir_angulos_lote(pedidos) if pedidos else []
+
+                # Reformulados contra sí mismos, los aprobados, los nuevos de esta vuelta y el índice
+                reformulados_tanda = [
+                    ({**tema, "titulo": nuevo_titulo}, tema)
+                    for (tema, _), nuevo_titulo in zip(actualizables, nuevos_titulos) if nuevo_titulo
+                ]
+                original_de = {id(r): tema for r, tema in reformulados_tanda}
+                fijos = aprobados + [t for t, d in elegidos if d["status"] != "actualizable"]
+                revisados, _ = await self._dedup_tanda([r for r, _ in reformulados_tanda], fijos)
+                reformulacion = {
+                    id(original_de[id(r)]): r["titulo"]
+                    for r, estado in revisados if estado["status"] != "duplicado"
+                }
+
+                for tema, dup in elegidos:
+                    titulo = tema.get("titulo", "")
+                    if dup["status"] != "actualizable":
+                        aprobados.append({**tema, "tipo": "nuevo", "articulo_original_slug": ""})
+                        continue
+                    nuevo_titulo = reformulacion.get(id(tema))
+                    if nuevo_titulo is None:
+                        descartados += 1
+                        logger.debug(f"Descartado (reformulación duplicada o fallida): {titulo}")
+                        continue
+                    similar = dup.get("articulo_similar") or {}
+                    aprobados.append({**tema, "titulo": nuevo_titulo, "tipo": "actualizacion",
+                                      "articulo_original_slug": similar.get("slug", "")})
+                    reformulados += 1
+                    logger.debug(f"Reformulado: {titulo} → {nuevo_titulo}")
 
         # Primera ronda: 70 temas
         logger.info("Generando primera tanda de temas (70)...")
         prompt1 = _build_user_prompt(datos_ingesta, 70)
-        temas_raw = self._call_claude(prompt1)
+        temas_raw = await self._call_claude(prompt1)
         logger.info(f"Claude generó {len(temas_raw)} temas en primera ronda")
 
-        for tema in temas_raw:
-            if len(aprobados) >= config.MAX_ARTICULOS_DIA:
-                break
-            resultado = await _procesar_tema(tema)
-            if resultado:
-                aprobados.append(resultado)
+        tanda, descartados_tanda = await self._dedup_tanda(temas_raw, aprobados)
+        descartados += descartados_tanda
+        await _aceptar_tanda(tanda)
 
         # Segunda ronda si hacen falta
         if len(aprobados) < config.MAX_ARTICULOS_DIA:
             faltan = config.MAX_ARTICULOS_DIA - len(aprobados)
             logger.info(f"Faltan {faltan} temas. Generando segunda tanda (30)...")
             prompt2 = _build_user_prompt(datos_ingesta, 30)
-            temas_raw2 = self._call_claude(prompt2)
-            for tema in temas_raw2:
-                if len(aprobados) >= config.MAX_ARTICULOS_DIA:
-                    break
-                resultado = await _procesar_tema(tema)
-                if resultado:
-                    aprobados.append(resultado)
+            temas_raw2 = await self._call_claude(prompt2)
+            tanda, descartados_tanda = await self._dedup_tanda(temas_raw2, aprobados)
+            descartados += descartados_tanda
+            await _aceptar_tanda(tanda)
 
         # Rellenar con FAQs genéricos si aún faltan
         if len(aprobados) < config.MAX_ARTICULOS_DIA:
@@ -209,7 +281,9 @@ class SEOAgent:
     def costo_estimado(self) -> float:
         return (
             self.tokens_input * config.PRICE_INPUT_PER_TOKEN +
-            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN
+            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN +
+            self.tokens_cache_write * config.PRICE_CACHE_WRITE_PER_TOKEN +
+            self.tokens_cache_read * config.PRICE_CACHE_READ_PER_TOKEN
         )
 
 
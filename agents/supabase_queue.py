@@ -78,6 +78,44 @@ def guardar_articulo(
         return None
 
 
+def existen_slugs(slugs: list[str]) -> dict[str, int]:
+    """Retorna {slug: id} para los slugs que ya existen en la cola (una sola consulta)."""
+    if not slugs:
+        return {}
+    try:
+        res = get_client().table("articulos").select("id,slug").in_("slug", slugs).execute()
+        return {r["slug"]: r["id"] for r in (res.data or [])}
+    except Exception as e:
+        logger.error(f"Error consultando {len(slugs)} slugs: {e}")
+        return {}
+
+
+def guardar_articulos(filas: list[dict]) -> dict[str, Optional[int]]:
+    """
+    Inserta varios artículos en un solo request. Cada fila lleva los mismos
+    campos que guardar_articulo(). Retorna {slug: id}.
+
+    Si el insert en lote falla (p. ej. un slug duplicado), reintenta fila por fila
+    para no perder el resto del lote.
+    """
+    if not filas:
+        return {}
+    payload = [
+        {
+            **f,
+            "excerpt": f["excerpt"][:150] if f.get("excerpt") else None,
+            "estado": "pending",
+        }
+        for f in filas
+    ]
+    try:
+        res = get_client().table("articulos").insert(payload).execute()
+        return {r["slug"]: r["id"] for r in (res.data or [])}
+    except Exception as e:
+        logger.warning(f"Insert en lote de {len(filas)} artículos falló ({e}); reintentando uno a uno")
+        return {f["slug"]: guardar_articulo(**f) for f in filas}
+
+
 def get_approved_articles() -> list[dict]:
     """Retorna todos los artículos en estado 'approved'."""
     try:
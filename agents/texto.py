@@ -0,0 +1,16 @@
+"""
+texto.py — Helpers de texto compartidos
+
+plegar() deja el texto en minúsculas y sin tildes para comparar nombres y
+palabras clave escritos con o sin acentos ("Acuña" / "acuna"). Lo usan la
+pre-verificación (pre_verificacion.py) y el filtro electoral de la ingesta
+(filtro_electoral.py).
+"""
+
+import unicodedata
+
+
+def plegar(texto: str) -> str:
+    """Minúsculas sin tildes, para comparar nombres escritos con o sin acentos."""
+    sin_tildes = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in sin_tildes if not unicodedata.combining(c)).lower()
@@ -0,0 +1,107 @@
+"""
+url_store.py — Registro persistente de artículos ya descargados (SQLite)
+
+Guarda por URL el contenido_completo extraído, un hash del contenido y las
+fechas de primera vez vista y de última descarga. La ingesta solo descarga
+las URLs que no están, o cuya descarga tiene más de config.URL_STORE_TTL_HORAS;
+el resto sale del registro sin tocar la red.
+
+Las filas no vistas en config.URL_STORE_RETENCION_DIAS se purgan al abrir.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def hash_contenido(texto: str) -> str:
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+class URLStore:
+
+    def __init__(self, path: str | None = None, ttl_horas: float | None = None):
+        self.path = path or config.URL_STORE_PATH
+        self.ttl_seg = (ttl_horas if ttl_horas is not None else config.URL_STORE_TTL_HORAS) * 3600
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS articulos (
+                url            TEXT PRIMARY KEY,
+                contenido      TEXT NOT NULL,
+                hash           TEXT NOT NULL,
+                primera_vez    REAL NOT NULL,
+                ultimo_fetch   REAL NOT NULL,
+                ultima_vista   REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._purgar()
+
+    def _purgar(self):
+        limite = time.time() - config.URL_STORE_RETENCION_DIAS * 86400
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM articulos WHERE ultima_vista < ?", (limite,))
+            self._conn.commit()
+        if cur.rowcount:
+            logger.debug(f"Registro de URLs: {cur.rowcount} artículos purgados")
+
+    def vigentes(self, urls: list[str]) -> dict[str, str]:
+        """{url: contenido} de las URLs ya descargadas dentro del TTL (marca la vista)."""
+        if not urls:
+            return {}
+        ahora = time.time()
+        encontrados = {}
+        with self._lock:
+            for i in range(0, len(urls), 500):   # límite de parámetros de SQLite
+                parte = urls[i:i + 500]
+                for url, contenido, ultimo in self._conn.execute(
+                    f"SELECT url, contenido, ultimo_fetch FROM articulos "
+                    f"WHERE url IN ({','.join('?' * len(parte))})", parte,
+                ):
+                    if contenido and ahora - ultimo <= self.ttl_seg:   # vacíos guardados antes: se re-descargan
+                        encontrados[url] = contenido
+            self._conn.executemany(
+                "UPDATE articulos SET ultima_vista = ? WHERE url = ?", [(ahora, u) for u in encontrados]
+            )
+            self._conn.commit()
+        return encontrados
+
+    def guardar(self, url: str, contenido: str) -> bool:
+        """Guarda el contenido descargado. Retorna True si cambió respecto a la versión anterior."""
+        ahora = time.time()
+        nuevo_hash = hash_contenido(contenido)
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM articulos WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT INTO articulos (url, contenido, hash, primera_vez, ultimo_fetch, ultima_vista) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET contenido = excluded.contenido, hash = excluded.hash, "
+                "ultimo_fetch = excluded.ultimo_fetch, ultima_vista = excluded.ultima_vista",
+                (url, contenido, nuevo_hash, ahora, ahora, ahora),
+            )
+            self._conn.commit()
+        return row is None or row[0] != nuevo_hash
+
+
+# ---------------------------------------------------------------------------
+# Test
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = URLStore(path=f"{tmp}/urls.db")
+        urls = ["https://rpp.pe/a", "https://rpp.pe/b"]
+        print(f"  Vacío: {store.vigentes(urls)}")
+        print(f"  Guardar a (nuevo): {store.guardar(urls[0], 'El JNE inscribió...')}")
+        print(f"  Guardar a (igual): {store.guardar(urls[0], 'El JNE inscribió...')}")
+        print(f"[OK] Vigentes: {store.vigentes(urls)}")
@@ -7,16 +7,36 @@ Analiza cada artículo generado y detecta:
   3. Fechas o números sin respaldo
   4. Afirmaciones categóricas sobre temas disputados
   5. Posible sesgo marcado en una dirección política
+
+Cada verificación guarda una huella por párrafo (huellas_parrafos). Cuando un
+editor modifica el contenido (PUT /queue/{id}), verify_incremental vuelve a
+verificar solo los párrafos cambiados más su contexto y combina el resultado
+con las observaciones previas que siguen vigentes. Cada observación guarda las
+huellas de los párrafos de donde sale; si alguno cambia o se elimina, la
+observación (y su nivel de riesgo) se descarta. Las que no se pueden ubicar
+en un párrafo concreto quedan ligadas a todo su fragmento, y un cambio en él
+hace re-verificar el fragmento completo.
+
+Los artículos largos se dividen en fragmentos por secciones H2 (hasta
+config.VERIFICACION_MAX_CHARS_FRAGMENTO caracteres cada uno) que se verifican
+en paralelo y se combinan en un solo resultado. Cada fragmento es un request
+independiente, así que también se cachea por separado.
+
+Antes de llamar a Claude se pasa el pre-verificador local (pre_verificacion.py):
+los artículos de categorías de bajo riesgo (FAQ) que pasan limpio no gastan
+tokens; en el resto, sus hallazgos van en el prompt como pistas.
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import re
 from typing import Any
 
-import anthropic
-
 import config
+from llm_client import get_llm_client, registrar_uso
+from pre_verificacion import get_preverificador
 
 logger = logging.getLogger(__name__)
 
@@ -27,11 +47,16 @@ Analiza el artículo y responde SOLO con un JSON válido con esta estructura exa
 {
   "aprobado": true,
   "nivel_riesgo": "bajo",
-  "observaciones": [],
+  "observaciones": [
+    {"frase": "cita textual exacta del artículo", "problema": "qué está mal y por qué", "nivel": "medio"}
+  ],
   "requiere_revision_urgente": false,
   "sugerencias": []
 }
 
+Cada observación es un objeto: "frase" copia literalmente el fragmento problemático
+(sin parafrasear) y "nivel" es el riesgo de esa observación ("bajo", "medio" o "alto").
+
 Niveles de riesgo:
 - "bajo":  sin problemas graves, puede publicarse
 - "medio": hay observaciones menores, revisar antes de publicar
@@ -39,29 +64,165 @@ Niveles de riesgo:
 
 Para nivel_riesgo "alto": requiere_revision_urgente = true
 
-Sé específico en las observaciones: indica exactamente qué frase es problemática y por qué."""
+Sé específico en las observaciones: cita exactamente qué frase es problemática y explica por qué."""
+
+NIVELES_RIESGO = ("bajo", "medio", "alto")
+
+
+# ---------------------------------------------------------------------------
+# Huellas por párrafo (verificación incremental)
+# ---------------------------------------------------------------------------
+
+def dividir_parrafos(contenido: str) -> list[str]:
+    """Párrafos del markdown (bloques separados por línea en blanco)."""
+    return [p.strip() for p in re.split(r"\n\s*\n", contenido or "") if p.strip()]
+
+
+def huella_parrafo(parrafo: str) -> str:
+    normalizado = " ".join(parrafo.split())
+    return hashlib.sha1(normalizado.encode("utf-8")).hexdigest()[:16]
+
+
+def huellas_parrafos(contenido: str) -> list[str]:
+    return [huella_parrafo(p) for p in dividir_parrafos(contenido)]
+
+
+def peor_nivel(*niveles: str | None) -> str:
+    """El nivel de riesgo más alto entre los dados (desconocidos cuentan como 'medio')."""
+    indices = [NIVELES_RIESGO.index(n) if n in NIVELES_RIESGO else 1 for n in niveles if n]
+    return NIVELES_RIESGO[max(indices)] if indices else "bajo"
+
+
+def dividir_fragmentos(contenido: str, max_chars: int | None = None) -> list[str]:
+    """
+    Divide el markdown en fragmentos por secciones H2, agrupando secciones
+    consecutivas mientras quepan en max_chars. Una sección más larga que el
+    límite se parte por párrafos.
+    """
+    max_chars = max_chars or config.VERIFICACION_MAX_CHARS_FRAGMENTO
+    if len(contenido) <= max_chars:
+        return [contenido]
+
+    piezas: list[str] = []
+    for seccion in re.split(r"(?m)^(?=## )", contenido):
+        if not seccion.strip():
+            continue
+        if len(seccion) <= max_chars:
+            piezas.append(seccion.strip())
+        else:
+            piezas.extend(dividir_parrafos(seccion))
+
+    fragmentos: list[str] = []
+    actual = ""
+    for pieza in piezas:
+        if actual and len(actual) + len(pieza) + 2 > max_chars:
+            fragmentos.append(actual)
+            actual = ""
+        actual = f"{actual}\n\n{pieza}" if actual else pieza
+    if actual:
+        fragmentos.append(actual)
+    return fragmentos
+
+
+def combinar_verificaciones(resultados: list[dict]) -> dict:
+    """Une varias verificaciones parciales: observaciones y sugerencias sumadas, peor nivel."""
+    nivel = peor_nivel(*(r.get("nivel_riesgo") for r in resultados))
+    sugerencias: list = []
+    for r in resultados:
+        sugerencias.extend(s for s in r.get("sugerencias", []) if s not in sugerencias)
+    return {
+        "aprobado":                  all(r.get("aprobado", True) for r in resultados) and nivel != "alto",
+        "nivel_riesgo":              nivel,
+        "observaciones":             [o for r in resultados for o in r.get("observaciones", [])],
+        "requiere_revision_urgente": any(r.get("requiere_revision_urgente") for r in resultados) or nivel == "alto",
+        "sugerencias":               sugerencias,
+    }
+
+
+def _plano(texto: str) -> str:
+    """Texto sin markdown, comillas ni mayúsculas, para ubicar una frase citada en su párrafo."""
+    texto = re.sub(r"!?\[([^\]]*)\]\([^)]*\)", r"\1", texto or "")   # [texto](url) → texto
+    texto = re.sub(r"[*_`#>~\"“”«»‘’]|(?<!\w)'|'(?!\w)", "", texto)  # apóstrofos dentro de palabra quedan
+    texto = texto.replace("|", " ")
+    return " ".join(texto.split()).strip(" .,;:…-").casefold()
+
+
+def normalizar_observaciones(observaciones: list, parrafos: list[str], nivel: str) -> list[dict]:
+    """
+    Observaciones como {frase, problema, nivel, parrafos, ubicada}. `parrafos`
+    son las huellas de los párrafos de donde sale cada una: los que contienen
+    la frase citada (comparadas sin markdown ni comillas) o, si no se puede
+    ubicar (paráfrasis, texto libre, errores), todos los párrafos revisados en
+    esa verificación, con ubicada=False. Sin nivel propio hereda el del resultado.
+    """
+    planos = [_plano(p) for p in parrafos]
+    alcance = [huella_parrafo(p) for p in parrafos]
+    normalizadas = []
+    for obs in observaciones:
+        if isinstance(obs, dict):
+            frase = " ".join((obs.get("frase") or "").split())
+            problema = obs.get("problema") or ""
+            nivel_obs = obs.get("nivel") if obs.get("nivel") in NIVELES_RIESGO else nivel
+        else:
+            frase, problema, nivel_obs = "", str(obs), nivel
+        buscada = _plano(frase)
+        ubicados = [h for p, h in zip(planos, alcance) if buscada and buscada in p]
+        normalizadas.append({
+            "frase": frase, "problema": problema, "nivel": nivel_obs,
+            "parrafos": ubicados or alcance, "ubicada": bool(ubicados),
+        })
+    return normalizadas
+
+
+def _observaciones_ligadas(verificacion: dict) -> bool:
+    """True si todas las observaciones guardan las huellas de los párrafos de donde salen."""
+    return all(isinstance(o, dict) and o.get("parrafos") for o in verificacion.get("observaciones", []))
 
 
 class VerificacionAgent:
 
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
+        self.llm = get_llm_client()
         self.tokens_input = 0
         self.tokens_output = 0
-
-    def _build_prompt(self, articulo: dict) -> str:
+        self.tokens_cache_write = 0
+        self.tokens_cache_read = 0
+        self.omitidos_por_preverificacion = 0
+
+    def _build_prompt(
+        self,
+        articulo: dict,
+        fragmento: str | None = None,
+        parte: tuple[int, int] | None = None,
+        pistas: list[dict] | None = None,
+    ) -> str:
         titulo    = articulo.get("titulo", "")
         categoria = articulo.get("categoria", "")
-        contenido = articulo.get("contenido", "")
-
-        # Limitar contenido a 3000 tokens aprox para no superar contexto
-        contenido_truncado = contenido[:6000] if len(contenido) > 6000 else contenido
+        contenido = fragmento if fragmento is not None else articulo.get("contenido", "")
+
+        if pistas:
+            # Solo las pistas que caen en este fragmento
+            pistas = [p for p in pistas if p.get("frase", "")[:60] in contenido] if parte else pistas
+        if pistas:
+            contenido += (
+                "\n\nHallazgos de la pre-verificación automática contra los datos oficiales "
+                "(confírmalos o descártalos):\n"
+                + "\n".join(f"- \"{p['frase']}\": {p['problema']}" for p in pistas)
+            )
 
+        if parte:
+            return (
+                f"Parte {parte[0]} de {parte[1]} de un artículo largo:\n"
+                f"Título: {titulo}\n"
+                f"Categoría: {categoria}\n\n"
+                f"Contenido (solo esta parte):\n{contenido}\n\n"
+                f"Revisa solo esta parte y responde con el JSON de verificación."
+            )
         return (
             f"Artículo a verificar:\n"
             f"Título: {titulo}\n"
             f"Categoría: {categoria}\n\n"
-            f"Contenido:\n{contenido_truncado}\n\n"
+            f"Contenido:\n{contenido}\n\n"
             f"Revisa el artículo y responde con el JSON de verificación."
         )
 
@@ -91,6 +252,172 @@ class VerificacionAgent:
             "sugerencias": ["Revisar manualmente antes de publicar"],
         }
 
+    def preverificar(self, articulo: dict) -> tuple[dict | None, bool]:
+        """
+        Pre-verificación local. Retorna (resultado, omitir_claude); resultado es
+        None si está desactivada (config.PREVERIFICACION_ACTIVA).
+        """
+        if not config.PREVERIFICACION_ACTIVA:
+            return None, False
+        pre = get_preverificador()
+        resultado = pre.verificar(articulo)
+        return resultado, pre.puede_omitir_claude(articulo, resultado)
+
+    def resultado_preverificacion(self, pre: dict, articulo: dict) -> dict:
+        """Resultado final cuando la pre-verificación basta (sin llamada a Claude)."""
+        resultado = {k: v for k, v in pre.items() if k != "cifras_sin_verificar"}
+        resultado["observaciones"] = normalizar_observaciones(
+            resultado.get("observaciones", []), dividir_parrafos(articulo.get("contenido", "")),
+            resultado.get("nivel_riesgo", "bajo"),
+        )
+        resultado["huellas_parrafos"] = huellas_parrafos(articulo.get("contenido", ""))
+        self.omitidos_por_preverificacion += 1
+        logger.info(f"Verificación '{articulo.get('titulo', '')[:50]}': pre-verificación limpia, sin Claude")
+        return resultado
+
+    def build_requests(self, articulo: dict, pre: dict | None = None) -> list[dict]:
+        """
+        Parámetros de messages.create para este artículo, uno por fragmento
+        (también se usan en modo batch). Con `pre`, sus observaciones van como pistas.
+        """
+        pistas = pre["observaciones"] if pre else None
+        fragmentos = dividir_fragmentos(articulo.get("contenido", ""))
+        n = len(fragmentos)
+        return [
+            {
+                "model":      config.CLAUDE_MODEL,
+                "max_tokens": 1500,
+                "system":     [{"type": "text", "text": SYSTEM_VERIFICACION, "cache_control": {"type": "ephemeral"}}],
+                "messages":   [{"role": "user", "content": self._build_prompt(
+                    articulo, fragmento, (k + 1, n) if n > 1 else None, pistas)}],
+            }
+            for k, fragmento in enumerate(fragmentos)
+        ]
+
+    def _resultado_desde_texto(self, raw: str | list[str], articulo: dict) -> dict:
+        """Resultado final desde la respuesta (o las respuestas de cada fragmento)."""
+        textos = [raw] if isinstance(raw, str) else raw
+        parciales = [self._parse_verificacion(t) for t in textos]
+        # Ligar cada observación a los párrafos de su fragmento (o del artículo completo)
+        contenido = articulo.get("contenido", "")
+        fragmentos = dividir_fragmentos(contenido)
+        if len(fragmentos) != len(parciales):
+            fragmentos = [contenido] * len(parciales)
+        for parcial, fragmento in zip(parciales, fragmentos):
+            parcial["observaciones"] = normalizar_observaciones(
+                parcial.get("observaciones", []), dividir_parrafos(fragmento), parcial.get("nivel_riesgo", "medio")
+            )
+        resultado = parciales[0] if len(parciales) == 1 else combinar_verificaciones(parciales)
+
+        # Asegurar que nivel "alto" → requiere_revision_urgente = True
+        if resultado.get("nivel_riesgo") == "alto":
+            resultado["requiere_revision_urgente"] = True
+            resultado["aprobado"] = False
+        resultado["huellas_parrafos"] = huellas_parrafos(articulo.get("contenido", ""))
+
+        logger.info(
+            f"Verificación '{articulo.get('titulo', '')[:50]}': "
+            f"nivel={resultado.get('nivel_riesgo')} "
+            f"observaciones={len(resultado.get('observaciones', []))}"
+            + (f" fragmentos={len(textos)}" if len(textos) > 1 else "")
+        )
+        return resultado
+
+    def _build_prompt_parcial(self, articulo: dict, parrafos: list[str], editados: set[int], contexto: set[int]) -> str:
+        bloques = []
+        for i in sorted(editados | contexto):
+            marca = "REVISAR" if i in editados else "CONTEXTO"
+            bloques.append(f"[{marca} §{i + 1}]\n{parrafos[i]}")
+        return (
+            f"Fragmento editado de un artículo ya verificado:\n"
+            f"Título: {articulo.get('titulo', '')}\n"
+            f"Categoría: {articulo.get('categoria', '')}\n\n"
+            + "\n\n".join(bloques)
+            + "\n\nVerifica SOLO los párrafos marcados [REVISAR]; los de [CONTEXTO] ya fueron "
+              "revisados y se incluyen para entender el sentido. Responde con el JSON de verificación."
+        )
+
+    async def verify_incremental(self, articulo: dict, previa: dict | None) -> dict:
+        """
+        Re-verifica solo los párrafos cuyo hash cambió respecto a la verificación
+        previa (más config.VERIFICACION_VENTANA_CONTEXTO párrafos a cada lado) y
+        combina el resultado con las observaciones previas que siguen vigentes.
+        Sin huellas previas, o con observaciones que no se pueden ligar a sus
+        párrafos (verificaciones anteriores a este formato), hace una
+        verificación completa.
+        """
+        if not previa or not previa.get("huellas_parrafos") or not _observaciones_ligadas(previa):
+            return await self.verify(articulo)
+
+        parrafos = dividir_parrafos(articulo.get("contenido", ""))
+        huellas = [huella_parrafo(p) for p in parrafos]
+        anteriores = set(previa["huellas_parrafos"])
+        editados = {i for i, h in enumerate(huellas) if h not in anteriores}
+
+        # Observaciones previas: siguen las que salen de párrafos que no cambiaron ni se eliminaron.
+        # Una observación que no se pudo ubicar en un párrafo está ligada a todo su fragmento:
+        # si algo del fragmento cambió, se re-verifica el fragmento completo en vez de descartarla
+        vigentes = set(huellas)
+        conservadas = []
+        for obs in previa.get("observaciones", []):
+            if set(obs["parrafos"]) <= vigentes:
+                conservadas.append(obs)
+            elif not obs.get("ubicada", False):
+                alcance = set(obs["parrafos"])
+                editados |= {i for i, h in enumerate(huellas) if h in alcance}
+
+        nuevo: dict = {"nivel_riesgo": "bajo", "observaciones": [], "sugerencias": []}
+        if editados:
+            ventana = config.VERIFICACION_VENTANA_CONTEXTO
+            contexto = {
+                j for i in editados for j in range(i - ventana, i + ventana + 1)
+                if 0 <= j < len(parrafos) and j not in editados
+            }
+            try:
+                msg = await self.llm.create(
+                    "verificacion",
+                    model=config.CLAUDE_MODEL,
+                    max_tokens=800,
+                    system=[{"type": "text", "text": SYSTEM_VERIFICACION, "cache_control": {"type": "ephemeral"}}],
+                    messages=[{"role": "user", "content": self._build_prompt_parcial(articulo, parrafos, editados, contexto)}],
+                )
+                registrar_uso(self, msg.usage)
+                nuevo = self._parse_verificacion(msg.content[0].text)
+            except Exception as e:
+                logger.error(f"Error en verificación incremental: {e}")
+                nuevo = {
+                    "nivel_riesgo": "medio",
+                    "observaciones": [f"Error en verificación automática: {str(e)[:100]}"],
+                    "sugerencias": ["Revisar manualmente los párrafos editados"],
+                }
+            # Las observaciones nuevas quedan ligadas a los párrafos re-verificados
+            nuevo["observaciones"] = normalizar_observaciones(
+                nuevo.get("observaciones", []), [parrafos[i] for i in sorted(editados)],
+                nuevo.get("nivel_riesgo", "medio"),
+            )
+
+        observaciones = conservadas + [o for o in nuevo.get("observaciones", []) if o not in conservadas]
+        sugerencias = list(nuevo.get("sugerencias", []))
+        if conservadas:
+            sugerencias = [s for s in previa.get("sugerencias", []) if s not in sugerencias] + sugerencias
+        # El riesgo previo solo cuenta a través de las observaciones que siguen vigentes
+        nivel = peor_nivel(nuevo.get("nivel_riesgo"), *(o["nivel"] for o in conservadas))
+
+        resultado = {
+            "aprobado":                  nivel != "alto",
+            "nivel_riesgo":              nivel,
+            "observaciones":             observaciones,
+            "requiere_revision_urgente": nivel == "alto",
+            "sugerencias":               sugerencias,
+            "huellas_parrafos":          huellas,
+            "parrafos_reverificados":    len(editados),
+        }
+        logger.info(
+            f"Verificación incremental '{articulo.get('titulo', '')[:50]}': "
+            f"{len(editados)}/{len(parrafos)} párrafos re-verificados, nivel={nivel}"
+        )
+        return resultado
+
     async def verify(self, articulo: dict) -> dict:
         """
         Verifica un artículo.
@@ -113,30 +440,33 @@ class VerificacionAgent:
                 "sugerencias": ["Regenerar el artículo"],
             }
 
-        try:
-            prompt = self._build_prompt(articulo)
-            msg = self.client.messages.create(
-                model=config.CLAUDE_MODEL,
-                max_tokens=1500,
-                system=SYSTEM_VERIFICACION,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            self.tokens_input += msg.usage.input_tokens
-            self.tokens_output += msg.usage.output_tokens
-
-            resultado = self._parse_verificacion(msg.content[0].text)
+        pre, omitir = self.preverificar(articulo)
+        if omitir:
+            return self.resultado_preverificacion(pre, articulo)
 
-            # Asegurar que nivel "alto" → requiere_revision_urgente = True
-            if resultado.get("nivel_riesgo") == "alto":
-                resultado["requiere_revision_urgente"] = True
-                resultado["aprobado"] = False
-
-            logger.info(
-                f"Verificación '{articulo.get('titulo', '')[:50]}': "
-                f"nivel={resultado.get('nivel_riesgo')} "
-                f"observaciones={len(resultado.get('observaciones', []))}"
+        try:
+            requests = self.build_requests(articulo, pre)
+            respuestas = await asyncio.gather(
+                *[self.llm.create("verificacion", **r) for r in requests],
+                return_exceptions=len(requests) > 1,
             )
-            return resultado
+            textos = []
+            for k, msg in enumerate(respuestas):
+                if isinstance(msg, Exception):
+                    # Un fragmento fallido no invalida el resto
+                    logger.error(f"Error verificando fragmento {k + 1}/{len(requests)}: {msg}")
+                    textos.append(json.dumps({
+                        "aprobado": True,
+                        "nivel_riesgo": "medio",
+                        "observaciones": [f"Parte {k + 1} sin verificación automática: {str(msg)[:100]}"],
+                        "requiere_revision_urgente": False,
+                        "sugerencias": [f"Revisar manualmente la parte {k + 1}"],
+                    }, ensure_ascii=False))
+                    continue
+                registrar_uso(self, msg.usage)
+                textos.append(msg.content[0].text)
+
+            return self._resultado_desde_texto(textos, articulo)
 
         except Exception as e:
             logger.error(f"Error en verificación: {e}")
@@ -152,7 +482,9 @@ class VerificacionAgent:
     def costo_estimado(self) -> float:
         return (
             self.tokens_input * config.PRICE_INPUT_PER_TOKEN +
-            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN
+            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN +
+            self.tokens_cache_write * config.PRICE_CACHE_WRITE_PER_TOKEN +
+            self.tokens_cache_read * config.PRICE_CACHE_READ_PER_TOKEN
         )
 
 
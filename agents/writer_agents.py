@@ -20,10 +20,10 @@ from datetime import date
 from pathlib import Path
 from typing import Any
 
-import anthropic
 from slugify import slugify
 
 import config
+from llm_client import get_llm_client, registrar_uso
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +39,75 @@ CATEGORIAS_ANALISIS = {"analisis"}
 CATEGORIAS_NOTICIAS = {"noticias", "perfiles", "debates", "faq"}
 
 
+# ---------------------------------------------------------------------------
+# Contexto compartido del run (prefijo cacheable)
+# ---------------------------------------------------------------------------
+
+def _menciona(titulo: str, nombre: str) -> bool:
+    return any(p in titulo.lower() for p in nombre.lower().split()[:2])
+
+
+def build_contexto_compartido(contexto_ingesta: dict) -> str:
+    """
+    Bloque con las estadísticas de debate y los datos de TODOS los candidatos.
+    Es idéntico para todos los temas del run (mismo orden, mismo formato), de
+    modo que junto al system prompt forma un prefijo que Claude cachea: solo
+    la primera llamada de cada categoría lo paga completo.
+
+    Se calcula una vez y se memoiza en contexto_ingesta["contexto_compartido"].
+    """
+    if "contexto_compartido" in contexto_ingesta:
+        return contexto_ingesta["contexto_compartido"]
+
+    contexto_str = ""
+
+    # 1. DATOS ESTADÍSTICOS DE DEBATES (fuente propia — diferencial legal)
+    stats_debates = contexto_ingesta.get("debate_stats", {})
+    grupo = stats_debates.get("candidatos", []) if stats_debates else []
+    if grupo:
+        contexto_str += "=== DATOS ESTADÍSTICOS PROPIOS DE OBSERVA PERÚ (úsalos como base del análisis) ===\n"
+        prom_tiempo = sum(c.get("tiempoSegundos", 0) for c in grupo) / max(len(grupo), 1)
+        prom_interv = sum(c.get("intervenciones", 0) for c in grupo) / max(len(grupo), 1)
+
+        for c in grupo:
+            temas_top = sorted(
+                c.get("temas", {}).items(), key=lambda x: x[1], reverse=True
+            )[:3]
+            contexto_str += (
+                f"\nCandidato: {c['nombre']} ({c.get('partido', '')})\n"
+                f"  Tiempo total de habla : {c.get('tiempoLabel', '')} "
+                f"({'por encima' if c.get('tiempoSegundos',0) > prom_tiempo else 'por debajo'} del promedio)\n"
+                f"  Intervenciones        : {c.get('intervenciones', 0)} "
+                f"(promedio del grupo: {prom_interv:.0f})\n"
+                f"  Promedio por interv.  : {c.get('promSegPorInterv', 0)}s\n"
+                f"  Palabras totales      : {c.get('palabrasTotales', 0):,}\n"
+                f"  % Ataque              : {c.get('porcentajeAtaque', 0)}%\n"
+                f"  % Propuesta           : {c.get('porcentajePropuesta', 0)}%\n"
+                f"  % Neutro              : {c.get('porcentajeNeutro', 0)}%\n"
+                f"  Temas predominantes   : {', '.join(f'{t}={round(v*100)}%' for t,v in temas_top)}\n"
+            )
+
+        contexto_str += f"\nDebate: {stats_debates.get('metadata', {}).get('jornada', '')} — {stats_debates.get('metadata', {}).get('fecha', '')}\n"
+        contexto_str += "=== FIN DATOS ESTADÍSTICOS ===\n"
+
+    # 2. DATOS ESTRUCTURADOS DE LOS CANDIDATOS (fuente propia)
+    candidatos = contexto_ingesta.get("candidatos", [])
+    if candidatos:
+        contexto_str += "\n=== DATOS DEL CANDIDATO (fuente: base de datos Observa Perú) ===\n"
+        for c in candidatos:
+            contexto_str += (
+                f"Nombre     : {c['nombre']}\n"
+                f"Partido    : {c['partido']}\n"
+                f"Edad       : {c.get('edad', 'N/D')} años\n"
+                f"Cargo previo: {c.get('cargo_previo', 'N/D')}\n"
+                f"Región     : {c.get('region_nacimiento', 'N/D')}\n\n"
+            )
+        contexto_str += "=== FIN DATOS CANDIDATO ===\n"
+
+    contexto_ingesta["contexto_compartido"] = contexto_str
+    return contexto_str
+
+
 # ---------------------------------------------------------------------------
 # Base
 # ---------------------------------------------------------------------------
@@ -49,9 +118,11 @@ class ArticleWriter:
     system_prompt_file: str = "system_noticias.md"
 
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
+        self.llm = get_llm_client()
         self.tokens_input = 0
         self.tokens_output = 0
+        self.tokens_cache_write = 0
+        self.tokens_cache_read = 0
         self._system_prompt: str | None = None
 
     @property
@@ -64,6 +135,20 @@ class ArticleWriter:
                 self._system_prompt = f"Eres un redactor de artículos sobre {self.categoria} para Observa Perú."
         return self._system_prompt
 
+    def _system_blocks(self, contexto_ingesta: dict) -> list[dict]:
+        """
+        System prompt de la categoría + contexto compartido del run, como
+        prefijo estable marcado para prompt caching. Todo lo que varía por
+        tema va en el mensaje de usuario.
+        """
+        compartido = build_contexto_compartido(contexto_ingesta)
+        if not compartido:
+            return [{"type": "text", "text": self.system_prompt, "cache_control": {"type": "ephemeral"}}]
+        return [
+            {"type": "text", "text": self.system_prompt},
+            {"type": "text", "text": compartido, "cache_control": {"type": "ephemeral"}},
+        ]
+
     def _build_user_prompt(self, tema: dict, contexto_ingesta: dict) -> str:
         titulo    = tema.get("titulo", "")
         keyword   = tema.get("keyword", "")
@@ -75,57 +160,19 @@ class ArticleWriter:
 
         contexto_str = ""
 
-        # 1. DATOS ESTADÍSTICOS DE DEBATES (fuente propia — diferencial legal)
-        stats_debates = contexto_ingesta.get("debate_stats", {})
-        if stats_debates:
-            candidatos_en_titulo = [
-                c for c in stats_debates.get("candidatos", [])
-                if any(p in titulo.lower() for p in c.get("nombre", "").lower().split()[:2])
-            ][:3]
-
-            if candidatos_en_titulo:
-                contexto_str += "\n\n=== DATOS ESTADÍSTICOS PROPIOS DE OBSERVA PERÚ (úsalos como base del análisis) ===\n"
-                grupo = stats_debates.get("candidatos", [])
-                prom_tiempo = sum(c.get("tiempoSegundos", 0) for c in grupo) / max(len(grupo), 1)
-                prom_interv = sum(c.get("intervenciones", 0) for c in grupo) / max(len(grupo), 1)
-
-                for c in candidatos_en_titulo:
-                    temas_top = sorted(
-                        c.get("temas", {}).items(), key=lambda x: x[1], reverse=True
-                    )[:3]
-                    contexto_str += (
-                        f"\nCandidato: {c['nombre']} ({c.get('partido', '')})\n"
-                        f"  Tiempo total de habla : {c.get('tiempoLabel', '')} "
-                        f"({'por encima' if c.get('tiempoSegundos',0) > prom_tiempo else 'por debajo'} del promedio)\n"
-                        f"  Intervenciones        : {c.get('intervenciones', 0)} "
-                        f"(promedio del grupo: {prom_interv:.0f})\n"
-                        f"  Promedio por interv.  : {c.get('promSegPorInterv', 0)}s\n"
-                        f"  Palabras totales      : {c.get('palabrasTotales', 0):,}\n"
-                        f"  % Ataque              : {c.get('porcentajeAtaque', 0)}%\n"
-                        f"  % Propuesta           : {c.get('porcentajePropuesta', 0)}%\n"
-                        f"  % Neutro              : {c.get('porcentajeNeutro', 0)}%\n"
-                        f"  Temas predominantes   : {', '.join(f'{t}={round(v*100)}%' for t,v in temas_top)}\n"
-                    )
-
-                contexto_str += f"\nDebate: {stats_debates.get('metadata', {}).get('jornada', '')} — {stats_debates.get('metadata', {}).get('fecha', '')}\n"
-                contexto_str += "=== FIN DATOS ESTADÍSTICOS ===\n"
-
-        # 2. DATOS ESTRUCTURADOS DEL CANDIDATO (fuente propia)
-        candidatos_mencionados = [
-            c for c in contexto_ingesta.get("candidatos", [])
-            if any(p in titulo.lower() for p in c.get("nombre", "").lower().split()[:2])
-        ][:2]
-        if candidatos_mencionados:
-            contexto_str += "\n\n=== DATOS DEL CANDIDATO (fuente: base de datos Observa Perú) ===\n"
-            for c in candidatos_mencionados:
-                contexto_str += (
-                    f"Nombre     : {c['nombre']}\n"
-                    f"Partido    : {c['partido']}\n"
-                    f"Edad       : {c.get('edad', 'N/D')} años\n"
-                    f"Cargo previo: {c.get('cargo_previo', 'N/D')}\n"
-                    f"Región     : {c.get('region_nacimiento', 'N/D')}\n"
-                )
-            contexto_str += "=== FIN DATOS CANDIDATO ===\n"
+        # 1-2. Los datos estadísticos y de candidatos están en el contexto
+        # compartido (system); aquí solo se indica cuáles aplican al tema
+        nombres = []
+        for c in (contexto_ingesta.get("debate_stats", {}).get("candidatos", [])
+                  + contexto_ingesta.get("candidatos", [])):
+            nombre = c.get("nombre", "")
+            if nombre not in nombres and _menciona(titulo, nombre):
+                nombres.append(nombre)
+        if nombres:
+            contexto_str += (
+                "\n\nCandidatos del tema (usa sus DATOS ESTADÍSTICOS PROPIOS y DATOS DEL "
+                f"CANDIDATO del contexto compartido como base del análisis): {', '.join(nombres[:3])}\n"
+            )
 
         # 3. HECHOS RECIENTES (solo títulos como referencia del tema — NO copiar texto)
         noticias_ref = [
@@ -154,7 +201,7 @@ class ArticleWriter:
             f"Fecha     : {hoy}\n"
             f"Tipo      : {tipo}{actualizacion_note}"
             f"{contexto_str}\n\n"
-            f"IMPORTANTE: Basa el artículo en los datos estadísticos propios proporcionados arriba. "
+            f"IMPORTANTE: Basa el artículo en los datos estadísticos propios del contexto compartido. "
             f"No copies texto de otros medios. Los hechos son públicos, la redacción debe ser 100% original.\n"
             f"Genera el artículo COMPLETO con frontmatter YAML al inicio."
         )
@@ -237,18 +284,20 @@ class ArticleWriter:
             "author":                  "Observa Perú",
         }
 
+    def build_request(self, tema: dict, contexto_ingesta: dict) -> dict:
+        """Parámetros de messages.create para este tema (también se usan en modo batch)."""
+        return {
+            "model":      config.CLAUDE_MODEL,
+            "max_tokens": 4000,
+            "system":     self._system_blocks(contexto_ingesta),
+            "messages":   [{"role": "user", "content": self._build_user_prompt(tema, contexto_ingesta)}],
+        }
+
     async def write(self, tema: dict, contexto_ingesta: dict) -> dict:
         """Genera un artículo completo. Retorna dict con todos los campos."""
-        user_prompt = self._build_user_prompt(tema, contexto_ingesta)
         try:
-            msg = self.client.messages.create(
-                model=config.CLAUDE_MODEL,
-                max_tokens=4000,
-                system=self.system_prompt,
-                messages=[{"role": "user", "content": user_prompt}],
-            )
-            self.tokens_input += msg.usage.input_tokens
-            self.tokens_output += msg.usage.output_tokens
+            msg = await self.llm.create(self.categoria, **self.build_request(tema, contexto_ingesta))
+            registrar_uso(self, msg.usage)
             raw = msg.content[0].text
             return self._parse_article(raw, tema)
         except Exception as e:
@@ -259,7 +308,9 @@ class ArticleWriter:
     def costo_estimado(self) -> float:
         return (
             self.tokens_input * config.PRICE_INPUT_PER_TOKEN +
-            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN
+            self.tokens_output * config.PRICE_OUTPUT_PER_TOKEN +
+            self.tokens_cache_write * config.PRICE_CACHE_WRITE_PER_TOKEN +
+            self.tokens_cache_read * config.PRICE_CACHE_READ_PER_TOKEN
         )
 
 